@@ -0,0 +1,216 @@
+# ==============================================
+# audio_envelope.py — RMS/peak 엔벨로프 + 발화 구간 테이블 (사전 계산)
+# ==============================================
+"""
+audio_envelope.py
+-----------------
+✅ 브라우저의 decodeAudioData + calculateRMS 폴링을 대체하는 서버 측 사전 계산
+   - mmap된 PCM을 블록 단위 numpy 연산으로 처리 (파일 전체를 메모리에 올리지 않음)
+   - 다중 해상도(기본 100ms / 500ms / 2000ms) RMS·peak 엔벨로프
+   - 발화 구간 테이블: vad.py 적응형 잡음 바닥 분할 (20ms 프레임, 최소/최대 길이, 짧은 구간 병합)
+     → 프런트는 재생 위치가 구간 끝을 지날 때 그 구간을 /stt-range로 전송
+   - 결과 JSON은 디스크에 캐시 (파일 경로 + mtime + size 키)
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from wav_slicer import get_wav_source, WavInfo
+from vad import VadConfig, DEFAULT_CONFIG, frame_size, segment_rms
+
+
+ENVELOPE_VERSION = 2
+DEFAULT_LEVELS_MS = (100, 500, 2000)
+
+# 한 번에 float로 변환할 최대 프레임 수 (메모리 상한)
+_BLOCK_FRAMES = 1 << 20
+
+
+# ==============================
+# PCM → float32 (채널 0)
+# ==============================
+def pcm_to_float(pcm: memoryview, info: WavInfo) -> np.ndarray:
+    """
+    PCM 바이트 → 채널 0의 float32 [-1, 1] (Web Audio getChannelData(0)와 동일 스케일)
+    """
+    bits = info.bits_per_sample
+    ch = max(1, info.channels)
+    n = len(pcm) // info.block_align
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    if info.sample_format == 3 and bits == 32:
+        raw = np.frombuffer(pcm, dtype="<f4", count=n * ch)
+        return raw[::ch].astype(np.float32)
+    if bits == 16:
+        raw = np.frombuffer(pcm, dtype="<i2", count=n * ch)
+        return raw[::ch].astype(np.float32) / 32768.0
+    if bits == 32:
+        raw = np.frombuffer(pcm, dtype="<i4", count=n * ch)
+        return raw[::ch].astype(np.float32) / 2147483648.0
+    if bits == 8:
+        raw = np.frombuffer(pcm, dtype=np.uint8, count=n * ch)
+        return (raw[::ch].astype(np.float32) - 128.0) / 128.0
+    if bits == 24:
+        raw = np.frombuffer(pcm, dtype=np.uint8, count=n * info.block_align).reshape(n, info.block_align)[:, :3]
+        val = raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16)
+        val = np.where(val & 0x800000, val - 0x1000000, val)
+        return val.astype(np.float32) / 8388608.0
+    raise ValueError(f"unsupported bits_per_sample: {bits}")
+
+
+def iter_float_blocks(pcm: memoryview, info: WavInfo, block_frames: int = _BLOCK_FRAMES):
+    """PCM을 block_frames 프레임씩 float32로 변환하며 순회"""
+    step = block_frames * info.block_align
+    for off in range(0, len(pcm), step):
+        yield pcm_to_float(pcm[off:off + step], info)
+
+
+# ==============================
+# 엔벨로프
+# ==============================
+def window_stats(pcm: memoryview, info: WavInfo, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    window 프레임 단위 (RMS, peak). 블록 경계는 window 배수로 맞춰 잘린 창이 없게 한다.
+    마지막 불완전 창도 포함.
+    """
+    block = max(window, (_BLOCK_FRAMES // window) * window)
+    rms_parts: List[np.ndarray] = []
+    peak_parts: List[np.ndarray] = []
+    for x in iter_float_blocks(pcm, info, block):
+        full = (len(x) // window) * window
+        if full:
+            w = x[:full].reshape(-1, window)
+            rms_parts.append(np.sqrt(np.mean(w * w, axis=1, dtype=np.float64)).astype(np.float32))
+            peak_parts.append(np.max(np.abs(w), axis=1))
+        if full < len(x):
+            tail = x[full:]
+            rms_parts.append(np.array([np.sqrt(np.mean(tail * tail, dtype=np.float64))], dtype=np.float32))
+            peak_parts.append(np.array([np.max(np.abs(tail))], dtype=np.float32))
+    if not rms_parts:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(rms_parts), np.concatenate(peak_parts)
+
+
+def downsample(rms: np.ndarray, peak: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    상위 해상도에서 하위 해상도 유도 (RMS는 제곱평균, peak는 max).
+    마지막 불완전 그룹은 0으로 채워 계산하므로 꼬리 RMS가 약간 작게 나올 수 있음.
+    """
+    n = -(-len(rms) // factor)
+    pad = n * factor - len(rms)
+    r = np.pad(rms.astype(np.float64) ** 2, (0, pad)).reshape(n, factor)
+    p = np.pad(peak, (0, pad)).reshape(n, factor)
+    return np.sqrt(r.mean(axis=1)).astype(np.float32), p.max(axis=1)
+
+
+def encode_u16(values: np.ndarray) -> str:
+    """[0,1] float → uint16 little-endian → base64 (클라이언트: Uint16Array / 65535)"""
+    q = np.clip(np.round(values * 65535.0), 0, 65535).astype("<u2")
+    return base64.b64encode(q.tobytes()).decode("ascii")
+
+
+# ==============================
+# 빌드 + 디스크 캐시
+# ==============================
+def build_envelope(
+    path: Path,
+    levels_ms=DEFAULT_LEVELS_MS,
+    vad: VadConfig = DEFAULT_CONFIG,
+) -> Dict[str, Any]:
+    src = get_wav_source(path)
+    info = src.info()
+    pcm = src.slice(0.0, info.duration + 1.0).pcm
+
+    levels_ms = sorted(int(ms) for ms in levels_ms)
+    base_ms = levels_ms[0]
+    window = max(1, int(round(info.sample_rate * base_ms / 1000.0)))
+    rms, peak = window_stats(pcm, info, window)
+    base_s = window / float(info.sample_rate)
+
+    levels = []
+    for ms in levels_ms:
+        factor = max(1, int(round(ms / base_ms)))
+        r, p = (rms, peak) if factor == 1 else downsample(rms, peak, factor)
+        levels.append({
+            "window_s": round(base_s * factor, 6),
+            "count": int(len(r)),
+            "encoding": "u16b64",
+            "rms": encode_u16(r),
+            "peak": encode_u16(p),
+        })
+
+    # VAD는 엔벨로프보다 촘촘한 프레임으로 따로 한 번 더 훑음
+    frame = frame_size(info.sample_rate, vad)
+    vad_rms, _ = window_stats(pcm, info, frame)
+    segments = segment_rms(vad_rms, frame / float(info.sample_rate), vad)
+    return {
+        "version": ENVELOPE_VERSION,
+        "duration": round(info.duration, 6),
+        "sample_rate": info.sample_rate,
+        "channels": info.channels,
+        "levels": levels,
+        "segments": {
+            "method": "adaptive",
+            "floor": segments["floor"],
+            "on_threshold": segments["on_threshold"],
+            "off_threshold": segments["off_threshold"],
+            "config": vad.to_dict(),
+            "items": [{"start": s, "end": e} for s, e in segments["items"]],
+        },
+    }
+
+
+_MEM: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_LOCK = threading.Lock()
+
+
+def _cache_name(path: Path, st: os.stat_result) -> Tuple[str, str]:
+    tag = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:12]
+    return f"envelope-{tag}-", f"envelope-{tag}-{st.st_mtime_ns:x}-{st.st_size:x}-v{ENVELOPE_VERSION}.json"
+
+
+def get_envelope(path: Path, cache_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    메모리 → 디스크 → 새로 계산 순으로 조회. 파일이 바뀌면(mtime/size) 다시 계산하고
+    같은 원본의 이전 캐시 파일은 정리한다.
+    """
+    path = Path(path).resolve()
+    st = path.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    with _LOCK:
+        hit = _MEM.get(str(path))
+        if hit is not None and hit[0] == key:
+            return hit[1]
+
+        prefix, name = _cache_name(path, st)
+        target = cache_dir / name if cache_dir is not None else None
+        env = None
+        if target is not None and target.exists():
+            try:
+                env = json.loads(target.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                env = None
+
+        if env is None:
+            env = build_envelope(path)
+            if cache_dir is not None:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_suffix(".tmp")
+                tmp.write_text(json.dumps(env, separators=(",", ":")), encoding="utf-8")
+                os.replace(tmp, target)
+                for old in cache_dir.glob(prefix + "*.json"):
+                    if old.name != name:
+                        try:
+                            old.unlink()
+                        except OSError:
+                            pass
+
+        _MEM[str(path)] = (key, env)
+        return env
@@ -0,0 +1,226 @@
+# ==============================================
+# image_cache.py — 씬 배경 이미지 파생본 캐시 (폭별 리사이즈 + WebP/AVIF)
+# ==============================================
+"""
+image_cache.py
+--------------
+✅ static/bg/scene*.jpg (각 2~3MB)를 무대에서 바로 바꿔 끼울 수 있게
+   - 요청 폭(w)을 허용 폭 목록으로 올림 → 폭별 재압축 파생본을 첫 요청 때 생성
+   - 형식은 Accept 헤더(q 값 포함)로 협상: AVIF(가능 시) > WebP > JPEG
+   - 파생본은 CACHE_DIR/img 에 "원본 mtime/size" 키로 저장 → 원본이 바뀌면 자연히 새 파일
+   - 매니페스트(버전 포함 URL)로 불변 캐시 헤더 사용 + 프런트가 다음 씬 이미지를 미리 로드
+   - Pillow는 requirements.txt 포함. 없으면 원본 그대로 제공 (헤더/매니페스트는 동일) + 기동 시 경고
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from media_server import parse_qvalues
+
+try:
+    from PIL import Image  # requirements.txt (없으면 원본 제공)
+    try:
+        import pillow_avif  # noqa: F401 — AVIF 플러그인 (있으면 등록)
+    except ImportError:
+        pass
+    Image.init()
+    _HAS_PIL = True
+except ImportError:  # pragma: no cover
+    Image = None
+    _HAS_PIL = False
+
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+DEFAULT_WIDTHS = (640, 1280, 1920)
+
+# 형식별 (MIME, 확장자, 저장 옵션)
+_FORMATS: Dict[str, Tuple[str, str, Dict[str, Any]]] = {
+    "avif": ("image/avif", ".avif", {"quality": 55}),
+    "webp": ("image/webp", ".webp", {"quality": 78, "method": 5}),
+    "jpeg": ("image/jpeg", ".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+def supported_formats() -> List[str]:
+    """선호 순서대로, 현재 Pillow로 저장 가능한 형식"""
+    if not _HAS_PIL:
+        return []
+    return [f for f in ("avif", "webp", "jpeg") if f.upper() in Image.SAVE]
+
+
+def missing_pillow_warning() -> Optional[str]:
+    """Pillow가 없어 파생본을 만들 수 없으면 경고 문구 (앱 기동 시 출력)"""
+    if _HAS_PIL:
+        return None
+    return ("[image_cache] ⚠️ Pillow 미설치 — /img 가 리사이즈/재압축 없이 원본(수 MB)을 그대로 보냄. "
+            "pip install -r requirements.txt")
+
+
+class ImageCache:
+    def __init__(self, root: Path, cache_dir: Path, widths=DEFAULT_WIDTHS):
+        self.root = Path(root).resolve()
+        self.cache_dir = Path(cache_dir) / "img"
+        self.widths = tuple(sorted(int(w) for w in widths))
+        self.formats = supported_formats()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._sizes: Dict[str, Tuple[Tuple[int, int], Tuple[int, int]]] = {}
+
+        self.generated = 0
+        self.hits = 0
+
+    # ---------------------------
+    # 경로 / 협상
+    # ---------------------------
+    def source(self, rel: str) -> Path:
+        """static 루트 안의 이미지 파일만 허용 (경로 탈출 / 기타 확장자 → FileNotFoundError)"""
+        path = (self.root / rel).resolve()
+        if self.root not in path.parents or path.suffix.lower() not in IMAGE_EXTS or not path.is_file():
+            raise FileNotFoundError(rel)
+        return path
+
+    def snap_width(self, w: Optional[int]) -> int:
+        """요청 폭 → 허용 폭 중 같거나 큰 첫 값 (없으면 최대)"""
+        if not w or w <= 0:
+            return self.widths[-1]
+        for allowed in self.widths:
+            if w <= allowed:
+                return allowed
+        return self.widths[-1]
+
+    def negotiate(self, accept: Optional[str]) -> Optional[str]:
+        """
+        Accept → 형식 (Pillow 없으면 None = 원본).
+        AVIF/WebP는 미디어 타입을 q>0으로 명시했을 때만 (image/*, */* 만 보내는 클라이언트는 JPEG),
+        명시한 형식끼리는 q가 높은 쪽, 같으면 선호 순서(AVIF > WebP). 나머지는 JPEG
+        """
+        if not self.formats:
+            return None
+        qvalues = parse_qvalues(accept)
+        best, best_q = "jpeg", 0.0
+        for fmt in self.formats:
+            q = qvalues.get(_FORMATS[fmt][0], 0.0)
+            if fmt != "jpeg" and q > best_q:
+                best, best_q = fmt, q
+        return best if best in self.formats else self.formats[-1]
+
+    @staticmethod
+    def version(path: Path) -> str:
+        st = path.stat()
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    # ---------------------------
+    # 파생본
+    # ---------------------------
+    def _target(self, src: Path, width: int, fmt: str) -> Path:
+        tag = hashlib.sha1(str(src.relative_to(self.root)).encode("utf-8")).hexdigest()[:12]
+        return self.cache_dir / f"{src.stem}-{tag}-{self.version(src)}-w{width}{_FORMATS[fmt][1]}"
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def derivative(self, rel: str, width: Optional[int], accept: Optional[str]) -> Path:
+        """
+        제공할 파일 경로. 없으면 생성 (동기 — 라우트는 threadpool에서 실행).
+        MIME은 확장자로 결정 (.webp / .avif 등록)
+        """
+        src = self.source(rel)
+        fmt = self.negotiate(accept)
+        if fmt is None:
+            return src
+
+        width = self.snap_width(width)
+        target = self._target(src, width, fmt)
+        if target.exists():
+            self.hits += 1
+            return target
+
+        with self._lock_for(str(target)):
+            if not target.exists():
+                try:
+                    self._render(src, target, width, fmt)
+                except (OSError, ValueError):
+                    # 디코딩/인코딩 실패 → 원본 제공 (다음 요청 때 다시 시도)
+                    return src
+                self._cleanup(src, target)
+                self.generated += 1
+        return target
+
+    def _render(self, src: Path, target: Path, width: int, fmt: str):
+        with Image.open(src) as im:
+            im.load()
+            if im.width > width:
+                height = max(1, round(im.height * width / im.width))
+                im = im.resize((width, height), Image.LANCZOS)
+            if fmt == "jpeg" and im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+            im.save(tmp, format=fmt.upper(), **_FORMATS[fmt][2])
+        os.replace(tmp, target)
+
+    def _cleanup(self, src: Path, current: Path):
+        """같은 원본의 이전 버전(mtime/size 다른) 파생본 정리"""
+        head = current.name.rsplit("-", 3)[0]  # "<stem>-<tag>"
+        keep = f"{head}-{self.version(src)}-"
+        for old in self.cache_dir.glob(head + "-*"):
+            if not old.name.startswith(keep):
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+
+    # ---------------------------
+    # 매니페스트
+    # ---------------------------
+    def _dimensions(self, src: Path) -> Optional[Tuple[int, int]]:
+        if not _HAS_PIL:
+            return None
+        key = str(src)
+        st = src.stat()
+        ver = (st.st_mtime_ns, st.st_size)
+        hit = self._sizes.get(key)
+        if hit is not None and hit[0] == ver:
+            return hit[1]
+        with Image.open(src) as im:
+            dims = (im.width, im.height)
+        self._sizes[key] = (ver, dims)
+        return dims
+
+    def manifest(self, subdir: str, url_prefix: str) -> Dict[str, Any]:
+        """
+        subdir 안 이미지 목록 → {"widths", "formats", "images": {name: {"v", "url", "width", "height"}}}
+        url의 {w}를 원하는 폭으로 치환해서 사용. v가 들어간 URL은 불변 캐시 대상.
+        """
+        base = (self.root / subdir).resolve()
+        images = {}
+        if base.is_dir() and self.root in base.parents:
+            for p in sorted(base.iterdir()):
+                if p.suffix.lower() not in IMAGE_EXTS or not p.is_file():
+                    continue
+                rel = p.relative_to(self.root).as_posix()
+                v = self.version(p)
+                dims = self._dimensions(p)
+                images[p.stem] = {
+                    "v": v,
+                    "url": f"{url_prefix}/{rel}?w={{w}}&v={v}",
+                    "width": dims[0] if dims else None,
+                    "height": dims[1] if dims else None,
+                }
+        return {"widths": list(self.widths), "formats": self.formats, "images": images}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pillow": _HAS_PIL,
+            "formats": self.formats,
+            "widths": list(self.widths),
+            "generated": self.generated,
+            "hits": self.hits,
+        }
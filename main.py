@@ -1,36 +1,42 @@
 # ==============================================
 # main.py — Scene-aware API + STT Proxy + Similarity
 # ==============================================
+import asyncio
 import os
-import mimetypes
+import sys
 import time
 import traceback
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
-import requests
-from fastapi import FastAPI, Request, Header, HTTPException, UploadFile, File, Body
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Header, HTTPException, Body, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
 # ---------------------------
-# Similarity (rapidfuzz preferred, difflib fallback)
+# Script catalog (scene-aware)
 # ---------------------------
-try:
-    from rapidfuzz import process, fuzz  # pip install rapidfuzz
-    _HAS_RAPIDFUZZ = True
-except Exception:
-    _HAS_RAPIDFUZZ = False
-    from difflib import SequenceMatcher
-
-# ---------------------------
-# Script loader (scene-aware)
-# ---------------------------
-# script_loader.py 내부에 아래 2개가 있어야 함:
-# - load_script_lines()              -> ["문장1", ...]
-# - load_script_with_scenes()        -> {"lines":[...], "scenes":[{"scene":n,"line":"..."},...], "scene_count":N}
-from script_loader import load_script_lines, load_script_with_scenes
+# script_loader.load_script_with_scenes() 결과를 대본 id별로 컴파일/캐시
+# -> {"lines":[...], "scenes":[n,...], "scene_count":N} + ScriptIndex + SessionTracker
+from script_catalog import ScriptCatalog, ScriptNotFound, CompiledScript, DEFAULT_SCRIPT_ID
+from whisper_client import WhisperClient, WhisperTimeout, WhisperRequestFailed, WhisperUnavailable, ClientDisconnected
+from wav_slicer import get_wav_source, WavFormatError
+from stt_stream import SttStreamSession, VadStreamSession
+from script_aligner import get_alignment
+from media_server import serve_media, get_media_file
+from audio_envelope import get_envelope, ENVELOPE_VERSION
+from stt_cache import SttCache, payload_key, payload_key_from_digest, range_key
+from stt_dispatcher import SttDispatcher
+from image_cache import ImageCache, missing_pillow_warning
+from scoring_pool import ScoringPool
+from upload_stream import receive_wav_upload, upload_content, UploadRejected
+from metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS, LOOP_LAG_BUCKETS,
+    ServerTimingMiddleware, monitor_loop_lag, WorkerExposition, publish_loop,
+)
 
 
 # ==============================
@@ -41,69 +47,260 @@ APP_PORT = int(os.getenv("PORT", "8000"))
 DEFAULT_AUDIO_PATH = Path("media/sample.wav")
 AUDIO_FILE = Path(os.getenv("AUDIO_FILE", str(DEFAULT_AUDIO_PATH))).resolve()
 
+# 사전 계산 결과(엔벨로프 등) 디스크 캐시 위치
+CACHE_DIR = Path(os.getenv("CACHE_DIR", ".cache")).resolve()
+
 # Whisper 서버 HTTP 엔드포인트 (GPU 서버)
 WHISPER_HTTP_URL = os.getenv("WHISPER_HTTP_URL", "http://114.110.135.253:5001/stt")
 
+# 다중 STT 백엔드 (쉼표 구분, 비어 있으면 WHISPER_HTTP_URL 하나)
+WHISPER_HTTP_URLS = [u for u in os.getenv("WHISPER_HTTP_URLS", "").split(",") if u.strip()] or [WHISPER_HTTP_URL]
+
+# 분산 정책(least_outstanding | latency), 헬스 체크, 서킷 브레이커, 헤지 요청
+WHISPER_LB_POLICY = os.getenv("WHISPER_LB_POLICY", "least_outstanding")
+WHISPER_HEALTH_PATH = os.getenv("WHISPER_HEALTH_PATH", "")           # 비면 STT URL에 GET
+WHISPER_HEALTH_INTERVAL_S = float(os.getenv("WHISPER_HEALTH_INTERVAL_S", "5"))
+WHISPER_FAILURE_THRESHOLD = int(os.getenv("WHISPER_FAILURE_THRESHOLD", "3"))
+WHISPER_COOLDOWN_S = float(os.getenv("WHISPER_COOLDOWN_S", "10"))
+WHISPER_HEDGE = os.getenv("WHISPER_HEDGE", "0") in ("1", "true", "yes")
+
+# Whisper 서버 WebSocket 엔드포인트 (스트리밍 STT)
+WHISPER_WS_URL = os.getenv("WHISPER_WS_URL", "ws://114.110.135.253:5001/ws")
+
+# 전사 캐시: 메모리 LRU 상한(bytes), 디스크 캐시 사용 여부 (CACHE_DIR/stt)
+STT_CACHE_MAX_BYTES = int(os.getenv("STT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+STT_CACHE_DISK = os.getenv("STT_CACHE_DISK", "1") not in ("0", "false", "no", "")
+
+# 디스패처: 배치 최대 크기 / 수집 대기(ms) / 배치 엔드포인트 경로(선택, 각 백엔드 기준 — 없으면 개별 요청 동시 전송)
+STT_BATCH_MAX_SIZE = int(os.getenv("STT_BATCH_MAX_SIZE", "8"))
+STT_BATCH_MAX_WAIT_MS = float(os.getenv("STT_BATCH_MAX_WAIT_MS", "10"))
+WHISPER_BATCH_PATH = os.getenv("WHISPER_BATCH_PATH", "")
+
+# 하이라이트/씬 진행 기준 유사도 (프런트 MATCH_THRESHOLD와 동일)
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", "90"))
+
+# 대본 카탈로그: 기본 대본(id="default") / 추가 대본 디렉터리(<id>.txt) / 메모리에 둘 최대 대본 수 / 변경 확인 간격(초)
+SCRIPT_FILE = Path(os.getenv("SCRIPT_FILE", "media/scripts.txt"))
+SCRIPTS_DIR = Path(os.getenv("SCRIPTS_DIR", "media/scripts"))
+SCRIPT_CACHE_MAX = int(os.getenv("SCRIPT_CACHE_MAX", "8"))
+SCRIPT_CHECK_INTERVAL_S = float(os.getenv("SCRIPT_CHECK_INTERVAL_S", "2"))
+# /script 응답 캐시 정책 (대본이 핫 리로드되므로 기본은 ETag 재검증)
+SCRIPT_CACHE_CONTROL = os.getenv("SCRIPT_CACHE_CONTROL", "no-cache")
+
+# 배경 이미지 파생본: 허용 폭 목록 (쉼표 구분)
+IMAGE_WIDTHS = [int(w) for w in os.getenv("IMAGE_WIDTHS", "640,1280,1920").split(",") if w.strip()]
+
+# 서버 측 진행 세션: 유휴 축출(초) / 최대 세션 수 / 창 확장 상한
+SESSION_IDLE_S = float(os.getenv("SESSION_IDLE_S", "1800"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_MAX_AHEAD = int(os.getenv("SESSION_MAX_AHEAD", "24"))
+
 # 업로드 제한 및 타임아웃
 MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50_000_000)))  # 50MB
 WHISPER_HTTP_TIMEOUT = int(os.getenv("WHISPER_HTTP_TIMEOUT", "90"))     # seconds
 
+# Whisper 커넥션 풀 / 동시 호출 제한
+WHISPER_MAX_CONCURRENCY = int(os.getenv("WHISPER_MAX_CONCURRENCY", "8"))
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", "16"))
 
-# ==============================
-# FastAPI 초기화
-# ==============================
-app = FastAPI(title="Wave Player + RMS Chunking + Whisper (HTTP) + Similarity + Scene API")
-templates = Jinja2Templates(directory="templates")
+# 응답에 Server-Timing 헤더(app/stt/net/score 단계별 ms) 추가 여부
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0") in ("1", "true", "yes")
 
-# 정적/미디어
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/media", StaticFiles(directory="media"), name="media")
+# 이벤트 루프 지연 측정 주기(초, 0이면 끔) → /metrics event_loop_lag_seconds
+LOOP_LAG_INTERVAL_S = float(os.getenv("LOOP_LAG_INTERVAL_S", "0.25"))
+
+# 멀티 워커: uvicorn 워커 수 / 워커 간 공유 상태(세션 SQLite + 전사 캐시 lease — 워커 2개 이상이면 기본 켬)
+# fuzzy 스코어링 프로세스 수 (워커당, 0이면 요청 처리 중 직접 계산)
+WORKERS = int(os.getenv("WORKERS", "1"))
+SHARED_STATE = os.getenv("SHARED_STATE", "1" if WORKERS > 1 else "0") in ("1", "true", "yes")
+SESSION_DB = Path(os.getenv("SESSION_DB", str(CACHE_DIR / "sessions.sqlite3"))).resolve()
+SCORING_PROCESSES = int(os.getenv("SCORING_PROCESSES", "0"))
+
+# 워커 2개 이상이면 /metrics는 워커별 스냅샷(CACHE_DIR/metrics)을 합쳐 worker="<pid>" 라벨로 노출
+# (어느 워커가 스크레이프를 받아도 전 워커 시계열이 보임 — 다른 워커 값은 최대 이 주기만큼 늦음)
+METRICS_PUBLISH_INTERVAL_S = float(os.getenv("METRICS_PUBLISH_INTERVAL_S", "5"))
 
 
 # ==============================
-# 스크립트 로드 (서버 기동 시)
+# Whisper 클라이언트 (앱 기동 시 커넥션 풀 생성)
 # ==============================
-# 호환성: 기존 lines 전용도 유지하면서, scene-aware 구조도 함께 보유
-SCRIPT_DATA: Dict[str, Any] = load_script_with_scenes()
-SCRIPT_LINES_LIST: List[str] = SCRIPT_DATA.get("lines") or load_script_lines()
-SCENE_MAPPED: List[Dict[str, Any]] = SCRIPT_DATA.get("scenes", [])
-SCENE_COUNT: int = int(SCRIPT_DATA.get("scene_count", 0))
+WHISPER = WhisperClient(
+    WHISPER_HTTP_URLS,
+    timeout=WHISPER_HTTP_TIMEOUT,
+    max_concurrency=WHISPER_MAX_CONCURRENCY,
+    pool_size=WHISPER_POOL_SIZE,
+    policy=WHISPER_LB_POLICY,
+    batch_path=WHISPER_BATCH_PATH or None,
+    health_path=WHISPER_HEALTH_PATH or None,
+    health_interval_s=WHISPER_HEALTH_INTERVAL_S,
+    failure_threshold=WHISPER_FAILURE_THRESHOLD,
+    cooldown_s=WHISPER_COOLDOWN_S,
+    hedge=WHISPER_HEDGE,
+)
+
+IMAGES = ImageCache(Path("static"), CACHE_DIR, widths=IMAGE_WIDTHS)
+
+# 공유 상태 모드에서는 디스크 캐시가 워커 간 공유 계층이므로 항상 사용
+STT_CACHE = SttCache(
+    STT_CACHE_MAX_BYTES,
+    disk_dir=(CACHE_DIR / "stt") if STT_CACHE_DISK or SHARED_STATE else None,
+    shared=SHARED_STATE,
+)
+DISPATCHER = SttDispatcher(
+    WHISPER,
+    STT_CACHE,
+    max_batch=STT_BATCH_MAX_SIZE,
+    max_wait_ms=STT_BATCH_MAX_WAIT_MS,
+    use_batch=bool(WHISPER_BATCH_PATH),
+)
 
-# 내부 인덱스 → 스크립트 줄 텍스트 매핑 (유사도 대상)
-# (기존 로직과 호환: 단순 리스트 형태)
-SCRIPT_LINES = SCRIPT_LINES_LIST[:]  # shallow copy
+
+# ==============================
+# 메트릭 (/metrics)
+# ==============================
+UPLOAD_BYTES = REGISTRY.histogram(
+    "stt_upload_bytes", "WAV payload bytes per STT request", ["route"], buckets=SIZE_BUCKETS)
+STT_TOTAL_SECONDS = REGISTRY.histogram(
+    "stt_total_seconds", "End-to-end STT request time", ["route", "source"])
+STT_UPSTREAM_SECONDS = REGISTRY.histogram(
+    "stt_upstream_seconds", "Whisper-reported transcription time (stt_s)", ["route"])
+STT_NET_SECONDS = REGISTRY.histogram(
+    "stt_net_seconds", "Network/proxy overhead (total_s - stt_s)", ["route"])
+STT_ERRORS = REGISTRY.counter(
+    "stt_errors_total", "STT request failures by error class", ["route", "error"])
+SIMILAR_SECONDS = REGISTRY.histogram(
+    "similar_score_seconds", "Similarity scoring time per /similar call", ["mode"])
+AUDIO_BYTES = REGISTRY.histogram(
+    "audio_response_bytes", "Bytes served per /audio response", ["status"], buckets=SIZE_BUCKETS)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Event loop wake-up delay beyond the scheduled interval", buckets=LOOP_LAG_BUCKETS)
+
+REGISTRY.gauge("whisper_in_flight", "Upstream Whisper HTTP calls in flight", callback=lambda: WHISPER.in_flight)
+REGISTRY.gauge(
+    "whisper_backend_outstanding", "In-flight calls per Whisper backend", ["backend"],
+    callback=lambda: {(b.url,): b.outstanding for b in WHISPER.backends})
+REGISTRY.gauge(
+    "whisper_backend_up", "1 if the backend circuit is not open", ["backend"],
+    callback=lambda: {(b.url,): 0 if b.state(time.monotonic()) == "open" else 1 for b in WHISPER.backends})
+REGISTRY.gauge("stt_dispatcher_queued", "Jobs waiting for a batch", callback=lambda: DISPATCHER.stats()["queued"])
+REGISTRY.gauge("stt_dispatcher_in_flight_keys", "Distinct keys being transcribed", callback=lambda: DISPATCHER.stats()["in_flight_keys"])
+REGISTRY.counter("stt_dispatcher_coalesced_total", "Requests joined to an in-flight key", callback=lambda: DISPATCHER.coalesced)
+REGISTRY.counter("stt_dispatcher_batches_total", "Upstream batches dispatched", callback=lambda: DISPATCHER.batches)
+REGISTRY.counter(
+    "stt_cache_lookups_total", "Transcription cache lookups by result", ["result"],
+    callback=lambda: {("hit",): STT_CACHE.hits, ("disk_hit",): STT_CACHE.disk_hits, ("miss",): STT_CACHE.misses})
+REGISTRY.gauge("stt_cache_bytes", "Memory LRU size of the transcription cache", callback=lambda: STT_CACHE.stats()["bytes"])
+REGISTRY.gauge(
+    "script_sessions", "Live server-side script sessions", ["script"],
+    callback=lambda: {(sc.id,): sc.sessions.stats()["sessions"] for sc in CATALOG.loaded()})
+REGISTRY.gauge("scripts_loaded", "Compiled scripts held in memory", callback=lambda: len(CATALOG.loaded()))
+
+# 멀티 워커: 레지스트리는 프로세스별 → 공유 디렉터리로 합본 (단일 워커면 라벨 없이 그대로)
+EXPOSITION = WorkerExposition(
+    REGISTRY, CACHE_DIR / "metrics", stale_s=max(30.0, METRICS_PUBLISH_INTERVAL_S * 3),
+) if WORKERS > 1 else None
+
+# 상태코드 → 오류 분류 (라벨 값)
+_ERROR_CLASS = {
+    400: "bad_request",
+    404: "not_found",
+    413: "payload_too_large",
+    415: "unsupported_media",
+    499: "client_disconnected",
+    500: "internal",
+    502: "whisper_http_request_failed",
+    503: "whisper_unavailable",
+    504: "whisper_http_timeout",
+}
+
+
+def _stt_error(route: str, status: int, error: str) -> JSONResponse:
+    """오류 응답 + 분류별 카운터 증가"""
+    STT_ERRORS.labels(route=route, error=_ERROR_CLASS.get(status, str(status))).inc()
+    return JSONResponse({"ok": False, "error": error}, status_code=status)
+
+
+def _timing_headers(**stages_s: Optional[float]) -> Optional[Dict[str, str]]:
+    """TIMING_HEADERS=1 이면 단계별 시간(초)을 Server-Timing 헤더로"""
+    if not TIMING_HEADERS:
+        return None
+    parts = [f"{k};dur={v * 1000.0:.1f}" for k, v in stages_s.items() if v is not None]
+    return {"Server-Timing": ", ".join(parts)} if parts else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warning = missing_pillow_warning()
+    if warning:
+        print(warning, file=sys.stderr, flush=True)
+    await WHISPER.start()
+    await DISPATCHER.start()
+    lag_task = asyncio.ensure_future(monitor_loop_lag(LOOP_LAG_SECONDS, LOOP_LAG_INTERVAL_S)) if LOOP_LAG_INTERVAL_S > 0 else None
+    publish_task = asyncio.ensure_future(publish_loop(EXPOSITION, METRICS_PUBLISH_INTERVAL_S)) if EXPOSITION is not None else None
+    try:
+        yield
+    finally:
+        if lag_task is not None:
+            lag_task.cancel()
+        if publish_task is not None:
+            publish_task.cancel()
+            EXPOSITION.remove()
+        await DISPATCHER.close()
+        await WHISPER.close()
+        if SCORING_POOL is not None:
+            SCORING_POOL.shutdown()
 
 
 # ==============================
-# 오디오 RANGE 스트리밍
+# FastAPI 초기화
 # ==============================
-def open_range_file(path: Path, range_header: Optional[str], chunk_size: int = 1024 * 1024):
-    file_size = path.stat().st_size
-    start = 0
-    end = file_size - 1
+app = FastAPI(title="Wave Player + RMS Chunking + Whisper (HTTP) + Similarity + Scene API", lifespan=lifespan)
+templates = Jinja2Templates(directory="templates")
+if TIMING_HEADERS:
+    app.add_middleware(ServerTimingMiddleware)
 
-    if range_header:
-        units, _, range_val = range_header.partition("=")
-        if units == "bytes":
-            start_str, _, end_str = range_val.partition("-")
-            if start_str.isdigit():
-                start = int(start_str)
-            if end_str.isdigit():
-                end = int(end_str)
+# 정적/미디어
+app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/media", StaticFiles(directory="media"), name="media")
 
-    def file_generator():
-        with path.open("rb") as f:
-            f.seek(start)
-            remaining = file_size - start
-            while remaining > 0:
-                read_size = min(chunk_size, remaining)
-                data = f.read(read_size)
-                if not data:
-                    break
-                remaining -= len(data)
-                yield data
 
-    return start, end, file_size, file_generator()
+# ==============================
+# 대본 카탈로그 (id별 지연 로드 + 핫 리로드)
+# ==============================
+SCORING_POOL = ScoringPool(SCORING_PROCESSES) if SCORING_PROCESSES > 0 else None
+
+CATALOG = ScriptCatalog(
+    SCRIPT_FILE,
+    scripts_dir=SCRIPTS_DIR,
+    cache_dir=CACHE_DIR,
+    max_loaded=SCRIPT_CACHE_MAX,
+    check_interval_s=SCRIPT_CHECK_INTERVAL_S,
+    tracker_kwargs={
+        "match_threshold": MATCH_THRESHOLD,
+        "max_ahead": SESSION_MAX_AHEAD,
+        "idle_s": SESSION_IDLE_S,
+        "max_sessions": SESSION_MAX,
+    },
+    session_db=SESSION_DB if SHARED_STATE else None,
+    scoring_pool=SCORING_POOL,
+)
+
+# 스코어링이 다른 프로세스 / SQLite를 기다리는 구성이면 이벤트 루프 대신 threadpool에서
+OFFLOAD_SCORING = SCORING_POOL is not None or SHARED_STATE
+
+
+async def _scoring(fn, *args, **kwargs):
+    if OFFLOAD_SCORING:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def _script(script_id: Optional[str]) -> CompiledScript:
+    """요청의 대본 id → 컴파일된 대본 (없으면 404)"""
+    try:
+        return CATALOG.get(script_id if isinstance(script_id, str) and script_id else DEFAULT_SCRIPT_ID)
+    except ScriptNotFound:
+        raise HTTPException(status_code=404, detail=f"script not found: {script_id}")
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -111,76 +308,234 @@ def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.get("/audio")
-def get_audio(range: Optional[str] = Header(None)):
-    if not AUDIO_FILE.exists():
+# ==============================
+# 오디오 RANGE 스트리밍 (200/206/416 + ETag + zero-copy)
+# ==============================
+@app.api_route("/audio", methods=["GET", "HEAD"])
+def get_audio(
+    request: Request,
+    range: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    try:
+        response = serve_media(AUDIO_FILE, range, if_range, if_none_match)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Audio file not found.")
+    if request.method == "GET" and response.status_code in (200, 206):
+        AUDIO_BYTES.labels(status=response.status_code).observe(int(response.headers.get("content-length", 0)))
+    return response
 
-    start, end, size, gen = open_range_file(AUDIO_FILE, range)
-    mime_type, _ = mimetypes.guess_type(str(AUDIO_FILE))
-    mime_type = mime_type or "audio/wav"
 
-    headers = {
-        "Content-Range": f"bytes {start}-{end}/{size}",
-        "Accept-Ranges": "bytes",
-        "Content-Length": str(end - start + 1),
-    }
-    return StreamingResponse(gen, status_code=206, headers=headers, media_type=mime_type)
+@app.get("/audio/envelope")
+def get_audio_envelope(if_none_match: Optional[str] = Header(None)):
+    """
+    AUDIO_FILE의 다중 해상도 RMS/peak 엔벨로프 + 발화 구간 테이블.
+    최초 1회 계산 후 CACHE_DIR에 저장 (mtime 바뀌면 재계산).
+    """
+    try:
+        etag = get_media_file(AUDIO_FILE).etag[:-1] + f'-env{ENVELOPE_VERSION}"'
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio file not found.")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(get_envelope(AUDIO_FILE, CACHE_DIR), headers=headers)
+
+
+# ==============================
+# 배경 이미지 파생본 (폭별 리사이즈 + WebP/AVIF, 불변 캐시)
+# ==============================
+@app.get("/img-manifest")
+def image_manifest(dir: str = "bg"):
+    """
+    static/<dir> 이미지 목록 + 버전 URL ({w} 치환). 매니페스트 자체는 재검증(no-cache).
+    """
+    return JSONResponse({"ok": True, **IMAGES.manifest(dir, "/img")}, headers={"Cache-Control": "no-cache"})
+
+
+@app.api_route("/img/{rel:path}", methods=["GET", "HEAD"])
+def get_image(
+    rel: str,
+    w: Optional[int] = None,
+    v: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    static/<rel> 의 폭 w 파생본. v(원본 버전)가 현재와 같으면 1년 immutable, 아니면 no-cache.
+    """
+    try:
+        path = IMAGES.derivative(rel, w, accept)
+        current = IMAGES.version(IMAGES.source(rel))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    cache_control = "public, max-age=31536000, immutable" if v == current else "no-cache"
+    response = serve_media(path, range, None, if_none_match, cache_control=cache_control)
+    response.headers["vary"] = "Accept"
+    return response
 
 
 # ==============================
 # HTTP STT 프록시: WAV → Whisper HTTP
 # ==============================
+async def _transcribe_response(request: Request, route: str, content, total_start: float, cache_key: str) -> JSONResponse:
+    """
+    Whisper 호출 + 오류 매핑 + 타이밍(total_s/stt_s/net_s) 응답 생성.
+    같은 cache_key는 캐시(또는 진행 중인 동일 호출) 결과를 재사용 → 응답에 "cached": true, stt_s=0
+    업스트림 호출은 디스패처가 합치기/배치 처리
+    """
+    UPLOAD_BYTES.labels(route=route).observe(len(content))
+    try:
+        result, source = await DISPATCHER.submit(cache_key, content, is_disconnected=request.is_disconnected)
+    except WhisperTimeout:
+        return _stt_error(route, 504, "whisper_http_timeout")
+    except WhisperUnavailable as e:
+        # 모든 백엔드 서킷 open / 헬스 체크 실패 → 쿨다운 동안 빠르게 실패
+        return _stt_error(route, 503, f"whisper_unavailable: {e}")
+    except WhisperRequestFailed as e:
+        return _stt_error(route, 502, f"whisper_http_request_failed: {e}")
+    except ClientDisconnected:
+        # 브라우저가 이미 떠남 — 응답은 전달되지 않지만 로그/상태코드용
+        return _stt_error(route, 499, "client_disconnected")
+
+    total_time = round(time.time() - total_start, 3)
+    STT_TOTAL_SECONDS.labels(route=route, source=source).observe(total_time)
+
+    if source != "upstream":
+        return JSONResponse(
+            {"ok": True, "text": result["text"], "total_s": total_time, "stt_s": 0.0, "net_s": total_time, "cached": True},
+            status_code=200,
+            headers=_timing_headers(total=total_time),
+        )
+
+    stt_time = result["stt_s"]
+    if stt_time is None:
+        return JSONResponse(
+            {"ok": True, "text": result["text"], "total_s": total_time},
+            status_code=200,
+            headers=_timing_headers(total=total_time),
+        )
+    net_time = round(total_time - stt_time, 3)
+    STT_UPSTREAM_SECONDS.labels(route=route).observe(stt_time)
+    STT_NET_SECONDS.labels(route=route).observe(max(0.0, net_time))
+
+    return JSONResponse(
+        {"ok": True, "text": result["text"], "total_s": total_time, "stt_s": stt_time, "net_s": net_time},
+        status_code=200,
+        headers=_timing_headers(total=total_time, stt=stt_time, net=net_time),
+    )
+
+
 @app.post("/stt-proxy")
-async def stt_proxy(file: UploadFile = File(...)):
+async def stt_proxy(request: Request):
+    """
+    multipart "file" WAV를 청크 단위로 수신 (크기 한도/헤더 검증/해시를 수신 중에 처리).
+    본문은 스풀 파일에서 청크 단위로 Whisper에 전달
+    """
     total_start = time.time()
+    upload = None
     try:
-        data = await file.read()
-        if not data:
-            return JSONResponse({"ok": False, "error": "empty file"}, status_code=400)
+        try:
+            upload, received = await receive_wav_upload(request, MAX_UPLOAD_BYTES)
+        except UploadRejected as e:
+            return _stt_error("stt-proxy", e.status, e.message)
 
-        if len(data) > MAX_UPLOAD_BYTES:
-            return JSONResponse(
-                {"ok": False, "error": f"payload too large (> {MAX_UPLOAD_BYTES} bytes)"},
-                status_code=413,
-            )
+        content = await upload_content(upload, received.size)
+        key = payload_key_from_digest(received.digest)
+        return await _transcribe_response(request, "stt-proxy", content, total_start, key)
 
-        if len(data) < 44:  # WAV header length guard
-            return JSONResponse({"ok": False, "error": "invalid wav"}, status_code=400)
+    except Exception:
+        traceback.print_exc()
+        return _stt_error("stt-proxy", 500, "internal server error")
+    finally:
+        if upload is not None:
+            await upload.close()
 
-        try:
-            whisper_start = time.time()
-            resp = requests.post(
-                WHISPER_HTTP_URL,
-                files={"file": ("chunk.wav", data, "audio/wav")},
-                timeout=WHISPER_HTTP_TIMEOUT,
-            )
-            whisper_end = time.time()
-        except requests.Timeout:
-            return JSONResponse({"ok": False, "error": "whisper_http_timeout"}, status_code=504)
-        except requests.RequestException as e:
-            return JSONResponse({"ok": False, "error": f"whisper_http_request_failed: {e}"}, status_code=502)
-
-        total_time = round(time.time() - total_start, 3)
+
+# ==============================
+# 구간 STT: {start, end} 초 → AUDIO_FILE에서 직접 잘라 Whisper로
+# ==============================
+@app.post("/stt-range")
+async def stt_range(request: Request, payload: dict = Body(...)):
+    """
+    클라이언트가 WAV를 다시 인코딩해 올리는 대신 구간(초)만 전달.
+    서버는 mmap된 AUDIO_FILE에서 PCM 프레임을 잘라 그대로 전달한다.
+    """
+    total_start = time.time()
+    try:
+        start = payload.get("start")
+        end = payload.get("end")
+        if not isinstance(start, (int, float)) or not isinstance(end, (int, float)):
+            return _stt_error("stt-range", 400, "start/end (seconds) required")
+        if start < 0 or end <= start:
+            return _stt_error("stt-range", 400, "invalid range")
+
+        if not AUDIO_FILE.exists():
+            return _stt_error("stt-range", 404, "audio file not found")
 
         try:
-            payload = resp.json()
-        except ValueError:
-            return JSONResponse({"ok": True, "text": resp.text, "total_s": total_time}, status_code=200)
+            chunk = get_wav_source(AUDIO_FILE).slice(float(start), float(end))
+        except WavFormatError as e:
+            return _stt_error("stt-range", 415, f"invalid wav: {e}")
 
-        stt_time = payload.get("elapsed_s")
-        if stt_time is None:
-            stt_time = round(whisper_end - whisper_start, 3)
-        net_time = round(total_time - float(stt_time), 3)
+        if len(chunk.pcm) == 0:
+            return _stt_error("stt-range", 400, "empty range")
 
-        return JSONResponse(
-            {"ok": True, "text": payload.get("text", ""), "total_s": total_time, "stt_s": float(stt_time), "net_s": net_time},
-            status_code=200,
-        )
+        if len(chunk) > MAX_UPLOAD_BYTES:
+            return _stt_error("stt-range", 413, f"payload too large (> {MAX_UPLOAD_BYTES} bytes)")
+
+        key = range_key(AUDIO_FILE, chunk.version[0], chunk.version[1], *chunk.frames)
+        return await _transcribe_response(request, "stt-range", chunk, total_start, key)
 
     except Exception:
         traceback.print_exc()
-        return JSONResponse({"ok": False, "error": "internal server error"}, status_code=500)
+        return _stt_error("stt-range", 500, "internal server error")
+
+
+# ==============================
+# 스트리밍 STT: 브라우저 ↔ Whisper /ws (세션당 업스트림 소켓 1개)
+# ==============================
+@app.websocket("/ws/stt")
+async def ws_stt(websocket: WebSocket):
+    """
+    오디오 프레임을 재생과 동시에 흘려보내고,
+    전사 결과마다 {"type":"transcript","text","partial","score_pct","best_idx","scene"}를 돌려준다.
+    - ?mode=vad&rate=16000: PCM s16le 모노를 서버 VAD가 구간으로 잘라 HTTP STT(디스패처/캐시)로 전사
+      → 결과에 "start", "end", "cached" 추가
+    """
+    params = websocket.query_params
+    try:
+        script = CATALOG.get(params.get("script") or DEFAULT_SCRIPT_ID)
+    except ScriptNotFound:
+        await websocket.close(code=1008)
+        return
+    common = dict(
+        match=lambda text, cand: script.scorer.query(text, cand),
+        n_lines=len(script.lines),
+        match_threshold=MATCH_THRESHOLD,
+        tracker=script.sessions,
+        session_id=_session_id(params.get("session")),
+    )
+    if params.get("mode") == "vad":
+        rate = params.get("rate", "16000")
+        if not rate.isdigit() or not 8000 <= int(rate) <= 192000:
+            await websocket.close(code=1008)
+            return
+        session = VadStreamSession(websocket, _ws_transcribe, int(rate), **common)
+    else:
+        session = SttStreamSession(websocket, WHISPER_WS_URL, **common)
+    await session.run()
+
+
+async def _ws_transcribe(content: bytes):
+    """VAD 스트리밍 구간 → 디스패처 (HTTP 경로와 같은 캐시/합치기/배치)"""
+    UPLOAD_BYTES.labels(route="ws-vad").observe(len(content))
+    total_start = time.time()
+    result, source = await DISPATCHER.submit(payload_key(content), content)
+    STT_TOTAL_SECONDS.labels(route="ws-vad", source=source).observe(time.time() - total_start)
+    return result, source
 
 
 # ==============================
@@ -190,93 +545,158 @@ async def stt_proxy(file: UploadFile = File(...)):
 async def similar(payload: dict = Body(...)):
     """
     입력 텍스트와 스크립트 비교.
-    - 기본: 전체 SCRIPT_LINES 대상
+    - 기본: 기본 대본 전체 줄 대상
+    - 선택: payload["script"] = 대본 id (없으면 "default")
     - 선택: payload["candidates"] = [idx...] 가 있으면 해당 인덱스만 비교
-    반환: 최고 유사도(%)와 해당 줄 인덱스(best_idx)
+    - 선택: payload["top_k"] = k 이면 상위 k개를 "top"으로 함께 반환
+    - 선택: payload["texts"] = [...] 이면 배치 질의 → "results" 배열
+    - 선택: payload["session"] = id 이면 서버 세션의 후보 창 사용 (candidates 불필요)
+      → 응답에 "session", "fallback", "scene_completed" 추가
+    반환: 최고 유사도(%)와 해당 줄 인덱스(best_idx), scene
     """
-    text = (payload.get("text") or "").strip()
-    if not text or not SCRIPT_LINES:
-        return {"ok": True, "score_pct": 0.0, "best_idx": None}
+    script = _script(payload.get("script"))
+    top_k = payload.get("top_k", 1)
+    top_k = max(1, min(int(top_k), 50)) if isinstance(top_k, (int, float)) else 1
 
     # 후보 제한: [정수 인덱스]가 넘어오면 그 집합만 대상으로 검색
     cand = payload.get("candidates")
+    cand_idx: Optional[List[int]] = None
     if isinstance(cand, list) and len(cand) > 0:
-        # 범위 정리 + 중복 제거 + 정수 변환
-        cand_idx = sorted({int(i) for i in cand if isinstance(i, (int, float)) and 0 <= int(i) < len(SCRIPT_LINES)})
-        if not cand_idx:
-            return {"ok": True, "score_pct": 0.0, "best_idx": None}
-        choices = [SCRIPT_LINES[i] for i in cand_idx]
-        if _HAS_RAPIDFUZZ:
-            from rapidfuzz import process, fuzz
-            best = process.extractOne(text, choices, scorer=fuzz.token_set_ratio)
-            if best is None:
-                return {"ok": True, "score_pct": 0.0, "best_idx": None}
-            _, score, local_idx = best
-            return {"ok": True, "score_pct": round(float(score), 2), "best_idx": int(cand_idx[local_idx])}
+        cand_idx = script.index.clean_candidates(cand)
+
+    texts = payload.get("texts")
+    if isinstance(texts, list):
+        texts = [(t or "").strip() if isinstance(t, str) else "" for t in texts]
+        if cand_idx == [] or not script.lines:
+            matches = [[] for _ in texts]
         else:
-            from difflib import SequenceMatcher
-            def _ratio(a, b): return SequenceMatcher(None, a, b).ratio() * 100.0
-            best_score, best_idx = 0.0, None
-            for j, s_idx in enumerate(cand_idx):
-                s = _ratio(text, SCRIPT_LINES[s_idx])
-                if s > best_score:
-                    best_score, best_idx = s, s_idx
-            return {"ok": True, "score_pct": round(best_score, 2), "best_idx": best_idx}
-
-    # 후보 미지정: 전체 대상
-    if _HAS_RAPIDFUZZ:
-        from rapidfuzz import process, fuzz
-        best = process.extractOne(text, SCRIPT_LINES, scorer=fuzz.token_set_ratio)
-        if best is None:
-            return {"ok": True, "score_pct": 0.0, "best_idx": None}
-        _, score, best_idx = best
-        return {"ok": True, "score_pct": round(float(score), 2), "best_idx": int(best_idx)}
-
-    # fallback: difflib
-    from difflib import SequenceMatcher
-    def _ratio(a, b): return SequenceMatcher(None, a, b).ratio() * 100.0
-    best_score, best_idx = 0.0, None
-    for i, line in enumerate(SCRIPT_LINES):
-        s = _ratio(text, line)
-        if s > best_score:
-            best_score, best_idx = s, i
-    return {"ok": True, "score_pct": round(best_score, 2), "best_idx": best_idx}
+            t0 = time.perf_counter()
+            matches = await _scoring(script.scorer.query_batch, texts, cand_idx, top_k)
+            SIMILAR_SECONDS.labels(mode="batch").observe(time.perf_counter() - t0)
+        return {"ok": True, "results": [_similar_result(m, top_k) for m in matches]}
+
+    text = (payload.get("text") or "").strip()
+    sid = _session_id(payload.get("session"))
+    if sid is not None and cand_idx is None:
+        if not text or not script.lines:
+            return {**_similar_result([], top_k), "session": sid, "fallback": False, "scene_completed": None}
+        t0 = time.perf_counter()
+        res = await _scoring(
+            script.sessions.observe, sid, text, commit=payload.get("commit", True) is not False, top_k=top_k)
+        score_s = time.perf_counter() - t0
+        SIMILAR_SECONDS.labels(mode="session").observe(score_s)
+        result = {
+            **_similar_result(res["matches"], top_k),
+            "session": sid,
+            "fallback": res["fallback"],
+            "scene_completed": res["scene_completed"],
+        }
+        headers = _timing_headers(score=score_s)
+        return JSONResponse(result, headers=headers) if headers else result
+
+    if not text or not script.lines or cand_idx == []:
+        return _similar_result([], top_k)
+    t0 = time.perf_counter()
+    matches = await _scoring(script.scorer.query, text, cand_idx, top_k)
+    score_s = time.perf_counter() - t0
+    SIMILAR_SECONDS.labels(mode="single").observe(score_s)
+    result = _similar_result(matches, top_k)
+    headers = _timing_headers(score=score_s)
+    return JSONResponse(result, headers=headers) if headers else result
+
+
+def _similar_result(matches: List[Dict[str, Any]], top_k: int) -> Dict[str, Any]:
+    if not matches:
+        out = {"ok": True, "score_pct": 0.0, "best_idx": None, "scene": None}
+    else:
+        best = matches[0]
+        out = {"ok": True, "score_pct": best["score_pct"], "best_idx": best["idx"], "scene": best["scene"]}
+    if top_k > 1:
+        out["top"] = matches
+    return out
+
+
+def _session_id(value) -> Optional[str]:
+    """클라이언트가 만든 세션 id (짧은 문자열만 허용)"""
+    if isinstance(value, str) and 0 < len(value) <= 64:
+        return value
+    return None
+
+
+# ==============================
+# 오프라인 정렬 타임라인 (알려진 음원 → 라이브 STT 없이 시각 → 줄/씬)
+# ==============================
+@app.get("/alignment")
+def get_alignment_timeline(script: Optional[str] = None):
+    """현재 AUDIO_FILE + 대본에 맞는 (start, end, line_idx, scene, score) 타임라인 전체"""
+    timeline = get_alignment(AUDIO_FILE, _script(script).digest, CACHE_DIR)
+    if timeline is None:
+        return JSONResponse({"ok": False, "error": "no alignment for current audio/script"}, status_code=404)
+    return {"ok": True, "count": len(timeline), **timeline.to_json()}
+
+
+@app.get("/alignment/at")
+def alignment_at(t: float, end: Optional[float] = None, session: Optional[str] = None, script: Optional[str] = None):
+    """
+    t초의 줄/씬 (bisect, O(log n)).
+    - end가 있으면 [t, end) 와 겹치는 모든 구간을 "entries"로
+    - session이 있으면 해당 구간들을 세션 진행도에 기록 → "scene_completed"
+    """
+    sc = _script(script)
+    timeline = get_alignment(AUDIO_FILE, sc.digest, CACHE_DIR)
+    if timeline is None:
+        return JSONResponse({"ok": False, "error": "no alignment for current audio/script"}, status_code=404)
+    out: Dict[str, Any] = {"ok": True, "t": t, "entry": timeline.at(t), "prev": timeline.last_before(t)}
+    hits = [out["entry"]] if out["entry"] else []
+    if end is not None and end > t:
+        hits = out["entries"] = timeline.overlapping(t, end)
+
+    sid = _session_id(session)
+    if sid is not None:
+        completed = [sc.sessions.mark(sid, e["line_idx"], e["score"]) for e in hits]
+        out["scene_completed"] = [c for c in completed if c is not None]
+    return out
+
+
+# ==============================
+# 진행 세션 조회 / 초기화 (재접속 복원용)
+# ==============================
+@app.get("/session/{sid}")
+def get_session(sid: str, script: Optional[str] = None):
+    snap = _script(script).sessions.snapshot(sid) if _session_id(sid) else None
+    if snap is None:
+        return JSONResponse({"ok": False, "error": "session not found"}, status_code=404)
+    return {"ok": True, **snap}
+
+
+@app.delete("/session/{sid}")
+def reset_session(sid: str, script: Optional[str] = None):
+    return {"ok": True, "reset": _script(script).sessions.reset(sid)}
 
 
 # ==============================
 # 스크립트 제공 (Scene-aware)
 # ==============================
 @app.get("/script")
-def get_script():
+def get_script(
+    script: Optional[str] = None,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Scene-aware 구조를 프런트로 전달.
     기존 호환을 위해 lines 배열은 [{idx, text}] 형태로 제공.
-    또한 각 줄의 scene 번호를 함께 실어 보낸다.
+    또한 각 줄의 scene 번호와 씬별 줄 묶음(lines_by_scene)을 함께 실어 보낸다.
+    ?script=<id> 로 카탈로그의 다른 대본 선택 (기본 "default")
+    본문은 대본 버전당 1회 직렬화/압축 → ETag 일치 시 304
     """
-    lines_payload = []
-    if SCENE_MAPPED and len(SCENE_MAPPED) == len(SCRIPT_LINES):
-        # scene 정보를 각 줄에 매핑
-        for idx, (txt, scene_obj) in enumerate(zip(SCRIPT_LINES, SCENE_MAPPED)):
-            lines_payload.append({
-                "idx": idx,
-                "text": txt,
-                "scene": int(scene_obj.get("scene", 1))
-            })
-    else:
-        # scene 정보가 없는 경우(혹은 길이 불일치) — scene=1로 기본화
-        for idx, txt in enumerate(SCRIPT_LINES):
-            lines_payload.append({
-                "idx": idx,
-                "text": txt,
-                "scene": 1
-            })
+    return _script(script).payload.respond(accept_encoding, if_none_match, SCRIPT_CACHE_CONTROL)
 
-    return {
-        "ok": True,
-        "count": len(lines_payload),
-        "scene_count": SCENE_COUNT if SCENE_COUNT > 0 else len(set(i["scene"] for i in lines_payload)),
-        "lines": lines_payload
-    }
+
+@app.get("/scripts")
+def list_scripts():
+    """카탈로그에 있는 대본 id 목록"""
+    return {"ok": True, "scripts": CATALOG.ids()}
 
 
 # ==============================
@@ -284,17 +704,43 @@ def get_script():
 # ==============================
 @app.get("/health")
 def health():
+    default = _script(DEFAULT_SCRIPT_ID)
     return {
         "ok": True,
         "whisper_http_url": WHISPER_HTTP_URL,
-        "script_lines": len(SCRIPT_LINES),
-        "scene_count": SCENE_COUNT,
+        "whisper_http_urls": WHISPER_HTTP_URLS,
+        "whisper_ws_url": WHISPER_WS_URL,
+        "whisper": WHISPER.stats(),
+        "stt_cache": STT_CACHE.stats(),
+        "stt_dispatcher": DISPATCHER.stats(),
+        "scripts": CATALOG.stats(),
+        "script_lines": len(default.lines),
+        "scene_count": default.scene_count,
+        "alignment": get_alignment(AUDIO_FILE, default.digest, CACHE_DIR) is not None,
+        "images": IMAGES.stats(),
+        "worker": {
+            "pid": os.getpid(),
+            "workers": WORKERS,
+            "shared_state": SHARED_STATE,
+            "scoring_processes": SCORING_PROCESSES,
+        },
     }
 
 
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus 스크레이프용 텍스트 포맷.
+    WORKERS > 1 이면 전 워커 시계열을 worker 라벨로 구분해 합본 → 쿼리는 sum without (worker) (...)
+    """
+    body = EXPOSITION.render() if EXPOSITION is not None else REGISTRY.render()
+    return Response(body, media_type=METRICS_CONTENT_TYPE)
+
+
 # ==============================
 # 개발용 실행 (uvicorn)
 # ==============================
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=APP_PORT, reload=False)
+    # WORKERS > 1: 워커마다 이 모듈을 다시 import → 같은 환경 변수로 공유 상태(SQLite/디스크 캐시)에 붙는다
+    uvicorn.run("main:app", host="0.0.0.0", port=APP_PORT, reload=False, workers=WORKERS)
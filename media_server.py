@@ -0,0 +1,441 @@
+# ==============================================
+# media_server.py — 오디오 Range 서빙 (200/206/416, ETag, zero-copy)
+# ==============================================
+"""
+media_server.py
+---------------
+✅ /audio 전용 미디어 응답
+   - Range: bytes=a-b / a- / -N(suffix) / 다중 범위(multipart/byteranges)
+   - Range 없음 → 200 전체, 만족 불가 → 416 (Content-Range: bytes */size)
+   - ETag / Last-Modified, If-None-Match(304), If-Range 재검증
+   - 서버가 ASGI zerocopysend 확장을 제공하면 커널 sendfile, 아니면 mmap 슬라이스 전송
+   - 파일별 stat / mime / mmap 캐시 (짧은 TTL로 stat 재확인)
+     · 엔트리 수 상한(LRU) + 사라진 파일 주기 정리, 교체/제거된 엔트리의 fd·mmap은
+       그 엔트리로 전송 중인 응답이 모두 끝난 뒤 닫음 (참조 카운트)
+✅ 미리 직렬화·압축해 둔 응답 본문 (PrecompressedBody) — /script 등
+   - identity / gzip / br(brotli 설치 시) 변형을 한 번만 만들고 Accept-Encoding으로 선택
+   - 본문 sha256 기반 strong ETag, If-None-Match → 304
+"""
+import gzip
+import hashlib
+import mimetypes
+import mmap
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+from starlette.responses import Response
+from starlette.types import Scope, Receive, Send
+
+try:
+    import brotli  # 선택 의존성
+    _HAS_BROTLI = True
+except ImportError:  # pragma: no cover
+    brotli = None
+    _HAS_BROTLI = False
+
+
+# 다중 범위 요청에서 허용할 최대 구간 수 (초과 시 Range 무시 → 200)
+MAX_RANGES = 16
+SEND_CHUNK = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+# ==============================
+# Range 헤더 파싱
+# ==============================
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Range 헤더 → [(start, end_inclusive), ...] (정렬 + 겹침 병합)
+    - None 반환: Range 없음/형식 오류/지원 불가 단위 → 전체(200)로 응답
+    - RangeNotSatisfiable: 모든 구간이 파일 밖
+    """
+    if not header:
+        return None
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start_str, sep, end_str = part.partition("-")
+        start_str, end_str = start_str.strip(), end_str.strip()
+        if not sep:
+            return None
+        if not start_str:
+            # suffix: 마지막 N바이트
+            if not end_str.isdigit():
+                return None
+            n = int(end_str)
+            if n == 0:
+                continue
+            ranges.append((max(0, size - n), size - 1))
+            continue
+        if not start_str.isdigit() or (end_str and not end_str.isdigit()):
+            return None
+        start = int(start_str)
+        if end_str and int(end_str) < start:
+            return None
+        if start >= size:
+            continue  # 만족 불가 구간 (다른 구간이 있으면 그것만 응답)
+        end = int(end_str) if end_str else size - 1
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for s, e in ranges[1:]:
+        ps, pe = merged[-1]
+        if s <= pe + 1:
+            merged[-1] = (ps, max(pe, e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+# ==============================
+# 파일 메타 캐시
+# ==============================
+class MediaFile:
+    __slots__ = ("path", "size", "mtime", "etag", "last_modified", "mime", "checked_at",
+                 "_fd", "_mm", "_lock", "_refs", "_retired")
+
+    def __init__(self, path: Path, st: os.stat_result):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        mime, _ = mimetypes.guess_type(str(path))
+        self.mime = mime or "application/octet-stream"
+        self.checked_at = time.monotonic()
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        self._refs = 0          # 이 엔트리로 전송 중인 응답 수
+        self._retired = False   # 캐시에서 빠짐 → 마지막 응답이 끝나면 닫음
+
+    def fileno(self) -> int:
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(str(self.path), os.O_RDONLY)
+            return self._fd
+
+    def view(self) -> memoryview:
+        fd = self.fileno()
+        with self._lock:
+            if self._mm is None:
+                self._mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            return memoryview(self._mm)
+
+    # ---------------------------
+    # 수명 (응답 전송 동안 acquire → release)
+    # ---------------------------
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            idle = self._refs == 0 and self._retired
+        if idle:
+            self.close()
+
+    def retire(self):
+        """캐시에서 교체/제거됨: 쓰는 응답이 없으면 바로, 있으면 마지막 release에서 닫음"""
+        with self._lock:
+            self._retired = True
+            idle = self._refs == 0
+        if idle:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            mm, fd = self._mm, self._fd
+            self._mm = self._fd = None
+        if mm is not None:
+            mm.close()
+        if fd is not None:
+            os.close(fd)
+
+
+_CACHE: "OrderedDict[str, MediaFile]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+STAT_TTL_S = 1.0
+MAX_CACHE_ENTRIES = 256
+SWEEP_INTERVAL_S = 30.0     # 사라진 파일(정리된 이미지 파생본 등) 엔트리 정리 주기
+_last_sweep = 0.0
+
+
+def _drop(key: str):
+    mf = _CACHE.pop(key, None)
+    if mf is not None:
+        mf.retire()
+
+
+def _sweep(now: float):
+    """_CACHE_LOCK 안에서 호출: 경로가 없어진 엔트리 제거"""
+    global _last_sweep
+    if now - _last_sweep < SWEEP_INTERVAL_S:
+        return
+    _last_sweep = now
+    for key in [k for k in _CACHE if not os.path.exists(k)]:
+        _drop(key)
+
+
+def get_media_file(path: Path) -> MediaFile:
+    """
+    stat 결과를 STAT_TTL_S 동안 재사용. 파일이 바뀌면 새 엔트리(새 fd/mmap)로 교체하고
+    이전 엔트리는 진행 중인 응답이 끝나면 닫는다. 엔트리 수는 MAX_CACHE_ENTRIES (LRU)
+    """
+    key = str(path)
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        mf = _CACHE.get(key)
+        if mf is not None and now - mf.checked_at < STAT_TTL_S:
+            _CACHE.move_to_end(key)
+            return mf
+    try:
+        st = os.stat(key)
+    except FileNotFoundError:
+        with _CACHE_LOCK:
+            _drop(key)
+        raise  # 호출 측에서 처리
+    with _CACHE_LOCK:
+        mf = _CACHE.get(key)
+        if mf is not None and mf.size == st.st_size and mf.mtime == st.st_mtime:
+            mf.checked_at = now
+            _CACHE.move_to_end(key)
+            return mf
+        _drop(key)
+        mf = _CACHE[key] = MediaFile(Path(key), st)
+        _sweep(now)
+        while len(_CACHE) > MAX_CACHE_ENTRIES:
+            _drop(next(iter(_CACHE)))
+        return mf
+
+
+# ==============================
+# 조건부 요청
+# ==============================
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or ("W/" + etag) in tags
+
+
+def _if_range_ok(if_range: Optional[str], mf: MediaFile) -> bool:
+    """If-Range가 현재 버전과 일치할 때만 Range 적용 (불일치 → 200 전체)"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == mf.etag  # 강한 비교
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(mf.mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_qvalues(header: Optional[str]) -> Dict[str, float]:
+    """
+    Accept / Accept-Encoding → {토큰(소문자): q}. q 생략은 1, q 값이 잘못된 항목은 무시.
+    와일드카드(*, image/* 등)도 그대로 키로 남김 — 명시 항목 우선 적용은 호출 측에서
+    """
+    out: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, *params = part.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q: Optional[float] = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = None
+        if q is not None:
+            out[name] = q
+    return out
+
+
+# ==============================
+# 응답
+# ==============================
+class RangeFileResponse(Response):
+    """
+    parts: [(start, end_inclusive, prefix_bytes)] — 다중 범위면 각 구간 앞에 multipart 헤더,
+    trailer는 마지막 경계 문자열.
+    """
+
+    def __init__(
+        self,
+        mf: MediaFile,
+        status_code: int,
+        headers: Dict[str, str],
+        parts: List[Tuple[int, int, bytes]],
+        trailer: bytes = b"",
+        media_type: Optional[str] = None,
+    ):
+        self.mf = mf
+        self.parts = parts
+        self.trailer = trailer
+        self.status_code = status_code
+        self.media_type = media_type or mf.mime
+        self.background = None
+        self.body = b""
+        length = sum(len(p) + (e - s + 1) for s, e, p in parts) + len(trailer)
+        self.init_headers({**headers, "content-length": str(length)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or not self.parts:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        # 전송 중에는 캐시에서 교체돼도 fd/mmap을 닫지 않도록 참조 유지
+        self.mf.acquire()
+        view = None
+        try:
+            view = None if zerocopy else self.mf.view()
+            for s, e, prefix in self.parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": self.mf.fileno(),
+                        "offset": s,
+                        "count": e - s + 1,
+                        "more_body": True,
+                    })
+                    continue
+                pos = s
+                while pos <= e:
+                    nxt = min(e + 1, pos + SEND_CHUNK)
+                    await send({"type": "http.response.body", "body": bytes(view[pos:nxt]), "more_body": True})
+                    pos = nxt
+            await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+        finally:
+            if view is not None:
+                view.release()  # mmap.close()는 내보낸 버퍼가 남아 있으면 실패
+            self.mf.release()
+
+
+def serve_media(
+    path: Path,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    cache_control: str = "no-cache",
+) -> Response:
+    """GET/HEAD /audio 공통 처리 → 200 / 206 / 304 / 416"""
+    mf = get_media_file(path)
+    base = {
+        "accept-ranges": "bytes",
+        "etag": mf.etag,
+        "last-modified": mf.last_modified,
+        "cache-control": cache_control,
+    }
+
+    if if_none_match and _etag_matches(if_none_match, mf.etag):
+        return Response(status_code=304, headers=base)
+
+    ranges = None
+    if range_header and _if_range_ok(if_range, mf):
+        try:
+            ranges = parse_range_header(range_header, mf.size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**base, "content-range": f"bytes */{mf.size}"})
+
+    if ranges is None:
+        return RangeFileResponse(mf, 200, base, [(0, mf.size - 1, b"")] if mf.size else [])
+
+    if len(ranges) == 1:
+        s, e = ranges[0]
+        headers = {**base, "content-range": f"bytes {s}-{e}/{mf.size}"}
+        return RangeFileResponse(mf, 206, headers, [(s, e, b"")])
+
+    boundary = secrets.token_hex(12)
+    parts = []
+    for i, (s, e) in enumerate(ranges):
+        prefix = (
+            ("\r\n" if i else "") + f"--{boundary}\r\n"
+            f"Content-Type: {mf.mime}\r\n"
+            f"Content-Range: bytes {s}-{e}/{mf.size}\r\n\r\n"
+        ).encode("latin-1")
+        parts.append((s, e, prefix))
+    trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+    return RangeFileResponse(
+        mf, 206, base, parts, trailer,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+    )
+
+
+# ==============================
+# 사전 압축 본문
+# ==============================
+class PrecompressedBody:
+    """
+    불변 본문 1개 + 압축 변형. 만들 때 한 번만 압축하고 이후 요청은 바이트를 그대로 보낸다.
+    ETag는 인코딩별로 구분 ("<hash>", "<hash>-gzip", "<hash>-br") — strong ETag 규칙
+    """
+
+    def __init__(self, body: bytes, media_type: str = "application/json", min_compress: int = 512):
+        self.media_type = media_type
+        self.tag = hashlib.sha256(body).hexdigest()[:20]
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= min_compress:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if _HAS_BROTLI:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding: str = "identity") -> str:
+        return f'"{self.tag}"' if encoding == "identity" else f'"{self.tag}-{encoding}"'
+
+    def choose(self, accept_encoding: Optional[str]) -> str:
+        """
+        Accept-Encoding → 가장 작은 허용 변형.
+        명시한 코딩의 q가 * 보다 우선 (br;q=0, * → br 제외), q=0 은 제외
+        """
+        if not accept_encoding:
+            return "identity"
+        qvalues = parse_qvalues(accept_encoding)
+        for enc in ("br", "gzip"):
+            if enc in self.variants and qvalues.get(enc, qvalues.get("*", 0.0)) > 0:
+                return enc
+        return "identity"
+
+    def respond(
+        self,
+        accept_encoding: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+        cache_control: str = "no-cache",
+    ) -> Response:
+        enc = self.choose(accept_encoding)
+        headers = {"etag": self.etag(enc), "cache-control": cache_control, "vary": "Accept-Encoding"}
+        if enc != "identity":
+            headers["content-encoding"] = enc
+        # 어떤 인코딩의 ETag든 내용은 같음 → 모두 일치로 취급
+        if if_none_match and any(_etag_matches(if_none_match, self.etag(e)) for e in self.variants):
+            return Response(status_code=304, headers=headers)
+        return Response(self.variants[enc], media_type=self.media_type, headers=headers)
+
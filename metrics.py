@@ -0,0 +1,360 @@
+# ==============================================
+# metrics.py — Prometheus 텍스트 포맷 메트릭 (외부 의존성 없음)
+# ==============================================
+"""
+metrics.py
+----------
+✅ /metrics 노출용 최소 구현
+   - Counter / Gauge / Histogram (+ 라벨)
+   - Counter/Gauge는 콜백(함수)으로도 값 제공 가능 → 요청 시점에 상태 읽기
+   - render() → Prometheus text exposition format 0.0.4
+   - ServerTimingMiddleware: 요청별 처리 시간 헤더 (선택)
+   - monitor_loop_lag: 이벤트 루프 지연(예정 시각 대비 늦게 깨어난 시간) 주기 측정
+   - WorkerExposition: 멀티 워커(uvicorn --workers N)에서 워커별 스냅샷을 공유 디렉터리에 쓰고
+     어느 워커가 스크레이프를 받든 전 워커 시계열을 worker="<pid>" 라벨로 합쳐서 노출
+     (레지스트리는 프로세스별이라 그대로 두면 스크레이프마다 임의 워커 값이 보여 카운터가 튐)
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Callable, Sequence
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 기본 버킷
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 90.0)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 5e7)
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _label_str(names: Sequence[str], values: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda s: str(s).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, **kw):
+        key = tuple(str(kw.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, const: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        raise NotImplementedError
+
+    def render(self, const: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples(const)
+
+
+# ==============================
+# Counter / Gauge
+# ==============================
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class _ValueMetric(_Metric):
+    """
+    직접 inc/set 하거나, callback(→ float | {라벨값 tuple: float})으로 수집 시점에 값 제공
+    """
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], Any]] = None):
+        super().__init__(name, doc, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def _samples(self, const: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        if self.callback is not None:
+            try:
+                val = self.callback()
+            except Exception:
+                return []
+            if isinstance(val, dict):
+                return [f"{self.name}{_label_str(self.labelnames, tuple(map(str, k)), const)} {_fmt(v)}" for k, v in val.items()]
+            return [f"{self.name}{_label_str((), (), const)} {_fmt(val)}"]
+        with self._lock:
+            items = list(self._children.items())
+        return [f"{self.name}{_label_str(self.labelnames, k, const)} {_fmt(c.value)}" for k, c in items]
+
+
+class Counter(_ValueMetric):
+    kind = "counter"
+
+
+class Gauge(_ValueMetric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+
+# ==============================
+# Histogram
+# ==============================
+class _Hist:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = 0
+        n = len(self.bounds)
+        while i < n and value > self.bounds[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _Hist(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _samples(self, const: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        with self._lock:
+            items = list(self._children.items())
+        out = []
+        for k, h in items:
+            with h._lock:
+                counts, total, count = list(h.counts), h.sum, h.count
+            acc = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, k, list(const) + [('le', _fmt(bound))])} {acc}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, k, const)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, k, const)} {count}")
+        return out
+
+
+# ==============================
+# 레지스트리
+# ==============================
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = (), callback=None) -> Counter:
+        return self.register(Counter(name, doc, labelnames, callback))
+
+    def gauge(self, name: str, doc: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, doc, labelnames, callback))
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, doc, labelnames, buckets))
+
+    def families(self, const: Sequence[Tuple[str, str]] = ()) -> List[Tuple[str, str, str, List[str]]]:
+        """(이름, 종류, 설명, 샘플 줄) 목록 — 워커 스냅샷 합본용"""
+        return [(m.name, m.kind, m.doc, m._samples(const)) for m in self._metrics]
+
+    def render(self, const: Sequence[Tuple[str, str]] = ()) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render(const))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ==============================
+# 멀티 워커 합본
+# ==============================
+class WorkerExposition:
+    """
+    워커마다 state_dir/<worker>.json 에 자기 샘플(worker 라벨 포함)을 주기적으로 기록하고,
+    render()는 자기 최신 값 + 다른 워커들의 스냅샷을 메트릭 이름별로 합쳐 돌려준다.
+    - 다른 워커 값은 최대 publish 주기만큼 늦을 수 있음
+    - stale_s 넘게 갱신되지 않은 스냅샷(종료/크래시한 워커)은 제외
+    - Prometheus 쪽에서는 sum without (worker) (...) 로 합산
+    """
+
+    def __init__(self, registry: Registry, state_dir: Path, worker: Optional[str] = None, stale_s: float = 30.0):
+        self.registry = registry
+        self.state_dir = Path(state_dir)
+        self.worker = worker or str(os.getpid())
+        self.stale_s = stale_s
+        self.path = self.state_dir / f"{self.worker}.json"
+
+    def _families(self) -> List[Tuple[str, str, str, List[str]]]:
+        return self.registry.families((("worker", self.worker),))
+
+    def publish(self, families: Optional[List[Tuple[str, str, str, List[str]]]] = None):
+        """자기 스냅샷을 원자적으로 교체 (tmp → os.replace)"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{threading.get_ident()}.tmp")  # 스크레이프 스레드와 publish_loop가 겹칠 수 있음
+        tmp.write_text(json.dumps({"worker": self.worker, "families": families or self._families()}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _others(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        out = []
+        for p in sorted(self.state_dir.glob("*.json")):
+            if p == self.path:
+                continue
+            try:
+                if now - p.stat().st_mtime > self.stale_s:
+                    continue
+                out.append(json.loads(p.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue  # 교체 중 / 방금 삭제됨
+        return out
+
+    def render(self) -> str:
+        own = self._families()
+        try:
+            self.publish(own)
+        except OSError:
+            pass
+        order: List[str] = []
+        merged: Dict[str, Tuple[str, str, List[str]]] = {}
+        for snap in [{"families": own}] + self._others():
+            for name, kind, doc, samples in snap.get("families", []):
+                if name not in merged:
+                    order.append(name)
+                    merged[name] = (kind, doc, [])
+                merged[name][2].extend(samples)
+        lines: List[str] = []
+        for name in order:
+            kind, doc, samples = merged[name]
+            lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"] + samples
+        return "\n".join(lines) + "\n"
+
+
+async def publish_loop(exposition: WorkerExposition, interval_s: float = 5.0):
+    """interval_s마다 스냅샷 갱신 (다른 워커가 스크레이프를 받아도 이 워커 값이 보이도록)"""
+    while True:
+        try:
+            exposition.publish()
+        except OSError:
+            pass
+        await asyncio.sleep(interval_s)
+
+
+# ==============================
+# 이벤트 루프 지연
+# ==============================
+async def monitor_loop_lag(histogram: Histogram, interval_s: float = 0.25):
+    """
+    interval_s마다 깨어나 예정보다 늦은 시간을 기록.
+    동기 작업(대용량 JSON 직렬화, 스코어링 등)이 루프를 막으면 여기서 드러난다.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval_s)
+        histogram.observe(max(0.0, loop.time() - t0 - interval_s))
+
+
+# ==============================
+# Server-Timing 헤더 (순수 ASGI — 스트리밍/zero-copy 응답을 감싸지 않음)
+# ==============================
+class ServerTimingMiddleware:
+    """
+    응답 시작 시점까지의 앱 처리 시간을 `Server-Timing: app;dur=<ms>`로 덧붙인다.
+    라우트가 이미 넣은 Server-Timing(stt/net 등)이 있으면 뒤에 이어 붙임.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                dur = f"app;dur={(time.perf_counter() - t0) * 1000.0:.1f}".encode("latin-1")
+                headers = list(message.get("headers", []))
+                for i, (k, v) in enumerate(headers):
+                    if k.lower() == b"server-timing":
+                        headers[i] = (k, v + b", " + dur)
+                        break
+                else:
+                    headers.append((b"server-timing", dur))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, _send)
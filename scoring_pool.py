@@ -0,0 +1,127 @@
+# ==============================================
+# scoring_pool.py — fuzzy 스코어링 프로세스 풀 (GIL 밖에서 ScriptIndex 질의)
+# ==============================================
+"""
+scoring_pool.py
+---------------
+✅ /similar · 세션 매칭의 CPU 작업(rapidfuzz / difflib)을 별도 프로세스로
+   - 자식 프로세스는 인덱스 파일(CACHE_DIR/scripts/<sha256>-i*.idx)을 mmap으로 열어 씀 (다시 빌드하지 않음)
+     → 요청마다 대본을 보내지 않고 (인덱스 파일 경로, 질의)만 전달, 워커와 같은 페이지 캐시 공유
+   - PooledIndex: ScriptIndex와 같은 인터페이스 — query / query_batch만 풀로, 나머지는 로컬 인덱스
+   - 풀이 깨지면(자식 강제 종료 등) 로컬 인덱스로 계산하고 다음 호출 때 풀을 다시 만든다
+   - 호출은 블로킹(.result()) → 라우트에서는 threadpool로 감싸서 사용
+   - spawn 컨텍스트: 스레드가 도는 워커 프로세스를 fork하지 않음
+"""
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, List
+
+from script_index import ScriptIndex, MappedScriptIndex
+
+# 자식 프로세스가 열어 둘 대본 인덱스(매핑) 수
+_CHILD_MAX_INDEXES = 8
+
+
+# ==============================
+# 자식 프로세스 쪽
+# ==============================
+_indexes: "OrderedDict[str, ScriptIndex]" = OrderedDict()
+
+
+def _index_for(index_file: str) -> ScriptIndex:
+    idx = _indexes.get(index_file)
+    if idx is None:
+        idx = MappedScriptIndex(index_file)
+        _indexes[index_file] = idx
+        while len(_indexes) > _CHILD_MAX_INDEXES:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(index_file)
+    return idx
+
+
+def _query(index_file: str, text: str, candidates: Optional[List[int]], top_k: int) -> List[Dict[str, Any]]:
+    return _index_for(index_file).query(text, candidates, top_k)
+
+
+def _query_batch(index_file: str, texts: List[str], candidates: Optional[List[int]], top_k: int) -> List[List[Dict[str, Any]]]:
+    return _index_for(index_file).query_batch(texts, candidates, top_k)
+
+
+# ==============================
+# 워커 프로세스 쪽
+# ==============================
+class ScoringPool:
+    def __init__(self, processes: int):
+        self.processes = max(1, int(processes))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.fallbacks = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # 워커 프로세스 안에서 처음 쓸 때 생성 (import 시점에 만들면 uvicorn 부모 프로세스에 생김)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _broken(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def run(self, fn, *args):
+        """풀에서 실행 → 결과. 풀이 깨졌으면 BrokenProcessPool (호출 측이 로컬로 대체)"""
+        self.calls += 1
+        try:
+            return self.executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self.fallbacks += 1
+            self._broken()
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"processes": self.processes, "calls": self.calls, "fallbacks": self.fallbacks}
+
+
+class PooledIndex:
+    """
+    ScriptIndex 대용: 질의는 풀의 자식 프로세스에서, 나머지 속성은 로컬 인덱스에서.
+    """
+
+    def __init__(self, index: ScriptIndex, pool: ScoringPool, index_file: str):
+        self.local = index
+        self.pool = pool
+        self.index_file = index_file
+
+    def __len__(self):
+        return len(self.local)
+
+    def __getattr__(self, name):
+        return getattr(self.local, name)
+
+    def query(self, text: str, candidates: Optional[List[int]] = None, top_k: int = 1) -> List[Dict[str, Any]]:
+        try:
+            return self.pool.run(_query, self.index_file, text, candidates, top_k)
+        except (BrokenProcessPool, OSError):
+            return self.local.query(text, candidates, top_k)
+
+    def query_batch(self, texts: List[str], candidates: Optional[List[int]] = None, top_k: int = 1) -> List[List[Dict[str, Any]]]:
+        try:
+            return self.pool.run(_query_batch, self.index_file, texts, candidates, top_k)
+        except (BrokenProcessPool, OSError):
+            return self.local.query_batch(texts, candidates, top_k)
@@ -0,0 +1,278 @@
+# ==============================================
+# script_aligner.py — 오프라인 정렬: AUDIO_FILE 발화 구간 ↔ 대본 줄 타임라인
+# ==============================================
+"""
+script_aligner.py
+-----------------
+✅ 알려진 음원(AUDIO_FILE + media/scripts.txt)은 공연마다 같은 음성을 다시 전사/매칭할 필요가 없다
+   - 오프라인 1회: 발화 구간(audio_envelope) → 구간별 Whisper 전사 → ScriptIndex로 줄 정렬
+   - 결과: (start, end, line_idx, scene, score) 타임라인 JSON을 CACHE_DIR/alignment 에 저장
+     · 파일명에 음원 (mtime, size) + 대본 해시 → 둘 중 하나라도 바뀌면 자연히 무효
+   - 런타임: AlignmentIndex.at(t) / overlapping(t0, t1) — bisect로 O(log n) 조회
+
+실행:
+    python script_aligner.py [--audio media/sample.wav] [--script media/scripts.txt]
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import threading
+from array import array
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from script_loader import load_script_with_scenes
+from script_index import ScriptIndex
+from script_session import candidate_window
+from audio_envelope import get_envelope
+from wav_slicer import get_wav_source
+from whisper_client import WhisperClient, is_cacheable
+from stt_cache import SttCache, range_key
+
+ALIGNMENT_VERSION = 1
+
+# 정렬 시 후보 창 (직전 정렬 줄 기준 뒤/앞) — 창 안 점수가 min_score 미만이면 전체 재검색
+ALIGN_BACK = 1
+ALIGN_AHEAD = 4
+
+
+def script_digest(lines: List[str]) -> str:
+    """대본 줄 목록 → 짧은 해시 (타임라인 파일 키)"""
+    h = hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+    return h[:16]
+
+
+def timeline_path(cache_dir: Path, audio: Path, digest: str) -> Path:
+    st = audio.stat()
+    tag = hashlib.sha1(str(audio).encode("utf-8")).hexdigest()[:12]
+    name = f"alignment-{tag}-{st.st_mtime_ns:x}-{st.st_size:x}-{digest}-v{ALIGNMENT_VERSION}.json"
+    return Path(cache_dir) / "alignment" / name
+
+
+# ==============================
+# 런타임 조회
+# ==============================
+class AlignmentIndex:
+    """
+    시작 시각 기준 정렬된 병렬 배열. at(t)는 bisect 1회.
+    """
+
+    def __init__(self, entries: List[List[float]], meta: Optional[Dict[str, Any]] = None):
+        entries = sorted(entries, key=lambda e: e[0])
+        self.meta = meta or {}
+        self.starts = array("d", [e[0] for e in entries])
+        self.ends = array("d", [e[1] for e in entries])
+        self.line_idx = array("l", [int(e[2]) for e in entries])
+        self.scene = array("l", [int(e[3]) for e in entries])
+        self.score = array("d", [e[4] for e in entries])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _entry(self, i: int) -> Dict[str, Any]:
+        return {
+            "start": self.starts[i],
+            "end": self.ends[i],
+            "line_idx": self.line_idx[i],
+            "scene": self.scene[i],
+            "score": self.score[i],
+        }
+
+    def at(self, t: float) -> Optional[Dict[str, Any]]:
+        """t초에 걸쳐 있는 구간 (없으면 None)"""
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i >= 0 and t < self.ends[i]:
+            return self._entry(i)
+        return None
+
+    def last_before(self, t: float) -> Optional[Dict[str, Any]]:
+        """t초 이전에 시작한 마지막 구간 (무음 구간에서 '직전 줄' 표시용)"""
+        i = bisect.bisect_right(self.starts, t) - 1
+        return self._entry(i) if i >= 0 else None
+
+    def overlapping(self, t0: float, t1: float) -> List[Dict[str, Any]]:
+        """[t0, t1)과 겹치는 구간들 (구간은 서로 겹치지 않는다고 가정)"""
+        i = max(0, bisect.bisect_right(self.starts, t0) - 1)
+        out = []
+        n = len(self.starts)
+        while i < n and self.starts[i] < t1:
+            if self.ends[i] > t0:
+                out.append(self._entry(i))
+            i += 1
+        return out
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            **self.meta,
+            "entries": [
+                [self.starts[i], self.ends[i], self.line_idx[i], self.scene[i], self.score[i]]
+                for i in range(len(self))
+            ],
+        }
+
+
+_MEM: Dict[str, Tuple[Tuple[int, int], AlignmentIndex]] = {}
+_LOCK = threading.Lock()
+
+
+def get_alignment(audio: Path, digest: str, cache_dir: Path) -> Optional[AlignmentIndex]:
+    """현재 음원/대본에 맞는 타임라인이 있으면 로드 (메모리 캐시), 없으면 None"""
+    try:
+        path = timeline_path(cache_dir, Path(audio).resolve(), digest)
+        st = path.stat()
+    except OSError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    with _LOCK:
+        hit = _MEM.get(str(path))
+        if hit is not None and hit[0] == key:
+            return hit[1]
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        entries = data.pop("entries", [])
+        idx = AlignmentIndex(entries, data)
+        _MEM[str(path)] = (key, idx)
+        return idx
+
+
+# ==============================
+# 오프라인 빌드
+# ==============================
+def align_transcripts(
+    index: ScriptIndex,
+    segments: List[Tuple[float, float]],
+    texts: List[Optional[str]],
+    min_score: float = 60.0,
+) -> List[List[float]]:
+    """
+    구간 순서대로 직전 정렬 줄 주변 창에서 먼저 찾고, min_score 미만이면 전체 인덱스 재검색.
+    min_score 미만으로 끝난 구간(잡음/애드리브)과 전사 실패 구간(None)은 타임라인에서 제외.
+    """
+    entries = []
+    cursor: Optional[int] = None
+    for (start, end), text in zip(segments, texts):
+        text = (text or "").strip()
+        if not text:
+            continue
+        cand = candidate_window(cursor, len(index), ALIGN_BACK, ALIGN_AHEAD)
+        found = index.query(text, cand)
+        if cand is not None and (not found or found[0]["score_pct"] < min_score):
+            wide = index.query(text, None)
+            if wide and (not found or wide[0]["score_pct"] > found[0]["score_pct"]):
+                found = wide
+        if not found or found[0]["score_pct"] < min_score:
+            continue
+        best = found[0]
+        cursor = best["idx"]
+        entries.append([start, end, best["idx"], best["scene"], best["score_pct"]])
+    return entries
+
+
+async def transcribe_segments(
+    client: WhisperClient, cache: Optional[SttCache], audio: Path, segments: List[Tuple[float, float]],
+) -> Tuple[List[Optional[str]], List[BaseException]]:
+    """
+    구간별 전사 → (구간 순서대로 텍스트, 실패 목록). 실패한 구간(타임아웃/5xx 등)은 텍스트 None —
+    한 구간이 실패해도 나머지 결과는 유지. 라이브 /stt-range와 같은 캐시 키(range_key)를 써서
+    이미 전사한 구간은 GPU를 다시 부르지 않는다 (다시 실행하면 실패 구간만 전사).
+    """
+    src = get_wav_source(audio)
+
+    async def one(start: float, end: float) -> str:
+        chunk = src.slice(start, end)
+        key = range_key(audio, chunk.version[0], chunk.version[1], *chunk.frames)
+        hit = await cache.get(key) if cache is not None else None
+        if hit is None:
+            hit = await client.transcribe(chunk)
+            if cache is not None and is_cacheable(hit):
+                await cache.put(key, hit)
+        return hit.get("text") or ""
+
+    # 동시성은 WhisperClient 세마포어가 제한
+    results = await asyncio.gather(*[one(s, e) for s, e in segments], return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    texts = [None if isinstance(r, BaseException) else r for r in results]
+    return texts, errors
+
+
+async def build_timeline(
+    audio: Path,
+    script_path: str,
+    cache_dir: Path,
+    whisper_urls: List[str],
+    timeout: float = 90.0,
+    max_concurrency: int = 4,
+    min_score: float = 60.0,
+) -> Path:
+    audio = Path(audio).resolve()
+    data = load_script_with_scenes(script_path)
+    index = ScriptIndex.from_script_data(data)
+    digest = script_digest(index.lines)
+
+    env = get_envelope(audio, cache_dir)
+    segments = [(s["start"], s["end"]) for s in env["segments"]["items"]]
+    print(f"[aligner] {len(segments)} segments, {len(index)} script lines")
+
+    client = WhisperClient(whisper_urls, timeout=timeout, max_concurrency=max_concurrency)
+    cache = SttCache(disk_dir=Path(cache_dir) / "stt")
+    await client.start()
+    try:
+        texts, errors = await transcribe_segments(client, cache, audio, segments)
+    finally:
+        await client.close()
+    failed = [list(seg) for seg, text in zip(segments, texts) if text is None]
+    if failed:
+        print(f"[aligner] ⚠️ {len(failed)}/{len(segments)} segments failed to transcribe "
+              f"(first error: {errors[0]!r}) — re-run to retry only those")
+        if len(failed) == len(segments):
+            raise errors[0]
+
+    entries = align_transcripts(index, segments, texts, min_score)
+    st = audio.stat()
+    out = {
+        "version": ALIGNMENT_VERSION,
+        "audio": str(audio),
+        "audio_mtime_ns": st.st_mtime_ns,
+        "audio_size": st.st_size,
+        "script": str(script_path),
+        "script_digest": digest,
+        "min_score": min_score,
+        "failed_segments": failed,
+        "entries": entries,
+    }
+    target = timeline_path(cache_dir, audio, digest)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(out, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, target)
+    print(f"[aligner] {len(entries)}/{len(segments)} segments aligned → {target}")
+    return target
+
+
+# -------------------------
+# 실행
+# -------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AUDIO_FILE ↔ scripts.txt 오프라인 정렬")
+    parser.add_argument("--audio", default=os.getenv("AUDIO_FILE", "media/sample.wav"))
+    parser.add_argument("--script", default="media/scripts.txt")
+    parser.add_argument("--cache-dir", default=os.getenv("CACHE_DIR", ".cache"))
+    parser.add_argument("--min-score", type=float, default=60.0)
+    args = parser.parse_args()
+
+    urls = [u for u in os.getenv("WHISPER_HTTP_URLS", "").split(",") if u.strip()] or [
+        os.getenv("WHISPER_HTTP_URL", "http://114.110.135.253:5001/stt")
+    ]
+    asyncio.run(build_timeline(
+        Path(args.audio),
+        args.script,
+        Path(args.cache_dir).resolve(),
+        urls,
+        timeout=float(os.getenv("WHISPER_HTTP_TIMEOUT", "90")),
+        min_score=args.min_score,
+    ))
@@ -0,0 +1,284 @@
+# ==============================================
+# script_catalog.py — 대본 카탈로그 (id별 지연 로드 + 컴파일 캐시 + 핫 리로드)
+# ==============================================
+"""
+script_catalog.py
+-----------------
+✅ 한 배포에서 여러 작품의 대본을 id로 제공
+   - id → 파일: "default" = SCRIPT_FILE(media/scripts.txt), 그 외 = SCRIPTS_DIR/<id>.txt
+   - 최초 사용 시 로드 (지연), 메모리에는 최근 사용 max_loaded개만 유지 (LRU)
+   - 컴파일 결과(lines / scene 번호 / scene_count)는 파일 내용 sha256 키로 CACHE_DIR/scripts 에 저장
+     → 재기동/재로드 시 정규식 파싱 없이 JSON만 읽음
+   - 조회 시 stat을 check_interval_s 간격으로 확인, 내용이 바뀌면 새 인덱스를 만든 뒤 통째로 교체
+     (진행 중 요청은 이전 CompiledScript 참조를 그대로 사용)
+   - /script 응답 본문(줄 + 씬별 줄 묶음)은 버전당 1회 직렬화 + gzip/br 압축해 보관
+   - 유사도 인덱스는 같은 키로 CACHE_DIR/scripts/<sha256>-i*.idx 에 저장하고 mmap으로 연다
+     → 워커 N개 × (1 + 스코어링 프로세스) 가 모두 같은 파일을 매핑 (페이지 캐시 1벌, 프로세스별 사본 없음)
+   - 멀티 워커: 세션은 SQLite 공유 저장소(session_db), 스코어링은 프로세스 풀(인덱스 파일 경로만 전달)
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from script_loader import load_script_with_scenes
+from script_index import ScriptIndex, MappedScriptIndex, INDEX_FILE_VERSION, open_index
+from script_session import SessionTracker
+from script_aligner import script_digest
+from media_server import PrecompressedBody
+from session_store import SqliteSessionTracker
+from scoring_pool import ScoringPool, PooledIndex
+
+
+COMPILED_VERSION = 1
+DEFAULT_SCRIPT_ID = "default"
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+
+class ScriptNotFound(KeyError):
+    """카탈로그에 없는 대본 id"""
+
+
+class CompiledScript:
+    """
+    대본 1개에 대한 불변 묶음: 줄/씬 + 유사도 인덱스 + 세션 트래커.
+    핫 리로드 시 객체째 교체되므로 요청 처리 중에는 같은 객체를 끝까지 쓰면 된다.
+    """
+
+    def __init__(
+        self,
+        script_id: str,
+        path: Path,
+        content_hash: str,
+        data: Dict[str, Any],
+        tracker_kwargs: Dict[str, Any],
+        index_file: Optional[Path] = None,
+        session_db: Optional[Path] = None,
+        pool: Optional[ScoringPool] = None,
+    ):
+        self.id = script_id
+        self.path = path
+        self.content_hash = content_hash
+        self.lines: List[str] = list(data["lines"])
+        self.scenes: List[int] = [int(s) for s in data["scenes"]]
+        self.scene_count: int = int(data.get("scene_count") or len(set(self.scenes)))
+        self.digest = script_digest(self.lines)
+        # index_file이 있으면 mmap 인덱스 (저장 실패 시 프로세스 내 ScriptIndex)
+        self.index: ScriptIndex = open_index(index_file, self.lines, self.scenes)
+        # 질의용 인덱스: 풀이 있고 인덱스 파일이 있으면 자식 프로세스에서 (블로킹 — threadpool에서 호출)
+        if pool is not None and isinstance(self.index, MappedScriptIndex):
+            self.scorer = PooledIndex(self.index, pool, str(self.index.path))
+        else:
+            self.scorer = self.index
+        if session_db is not None:
+            self.sessions: SessionTracker = SqliteSessionTracker(
+                self.scorer, session_db, f"{script_id}:{content_hash[:16]}", **tracker_kwargs)
+        else:
+            self.sessions = SessionTracker(self.scorer, **tracker_kwargs)
+        self.loaded_at = time.time()
+        self._payload: Optional[PrecompressedBody] = None
+
+    def script_json(self) -> Dict[str, Any]:
+        """/script 응답 구조 (프런트 linesByScene 계산까지 서버에서)"""
+        by_scene: Dict[int, List[int]] = {}
+        for idx, scene in enumerate(self.scenes):
+            by_scene.setdefault(scene, []).append(idx)
+        return {
+            "ok": True,
+            "script": self.id,
+            "count": len(self.lines),
+            "scene_count": self.scene_count,
+            "lines": [{"idx": i, "text": t, "scene": s} for i, (t, s) in enumerate(zip(self.lines, self.scenes))],
+            "scenes": sorted(by_scene),
+            "lines_by_scene": {str(s): idxs for s, idxs in sorted(by_scene.items())},
+        }
+
+    @property
+    def payload(self) -> PrecompressedBody:
+        """직렬화 + 압축은 처음 요청될 때 1회 (동시에 두 번 만들어져도 결과는 같음)"""
+        if self._payload is None:
+            body = json.dumps(self.script_json(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._payload = PrecompressedBody(body)
+        return self._payload
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "path": str(self.path),
+            "content_hash": self.content_hash[:16],
+            "lines": len(self.lines),
+            "scene_count": self.scene_count,
+            "sessions": self.sessions.stats()["sessions"],
+        }
+
+
+class ScriptCatalog:
+    def __init__(
+        self,
+        default_path: Path,
+        scripts_dir: Optional[Path] = None,
+        cache_dir: Optional[Path] = None,
+        max_loaded: int = 8,
+        check_interval_s: float = 2.0,
+        tracker_kwargs: Optional[Dict[str, Any]] = None,
+        session_db: Optional[Path] = None,
+        scoring_pool: Optional[ScoringPool] = None,
+    ):
+        self.default_path = Path(default_path)
+        self.scripts_dir = Path(scripts_dir) if scripts_dir else None
+        self.cache_dir = Path(cache_dir) / "scripts" if cache_dir else None
+        self.max_loaded = max(1, int(max_loaded))
+        self.check_interval_s = float(check_interval_s)
+        self.tracker_kwargs = tracker_kwargs or {}
+        self.session_db = Path(session_db) if session_db else None
+        self.scoring_pool = scoring_pool
+
+        # id → (CompiledScript, (mtime_ns, size), 마지막 stat 확인 시각)
+        self._loaded: "OrderedDict[str, Tuple[CompiledScript, Tuple[int, int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 같은 id를 동시에 컴파일하지 않도록 id별 락
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+        self.loads = 0
+        self.reloads = 0
+        self.compile_hits = 0
+        self.evictions = 0
+
+    # ---------------------------
+    # id → 파일
+    # ---------------------------
+    def path_for(self, script_id: str) -> Path:
+        if script_id == DEFAULT_SCRIPT_ID:
+            return self.default_path
+        if self.scripts_dir is None or not _ID_RE.match(script_id):
+            raise ScriptNotFound(script_id)
+        return self.scripts_dir / f"{script_id}.txt"
+
+    def ids(self) -> List[str]:
+        out = [DEFAULT_SCRIPT_ID] if self.default_path.exists() else []
+        if self.scripts_dir is not None and self.scripts_dir.is_dir():
+            out += sorted(p.stem for p in self.scripts_dir.glob("*.txt") if _ID_RE.match(p.stem) and p.stem != DEFAULT_SCRIPT_ID)
+        return out
+
+    # ---------------------------
+    # 컴파일 (내용 해시 캐시)
+    # ---------------------------
+    def _compile(self, path: Path) -> Tuple[str, Dict[str, Any]]:
+        """(내용 해시, 컴파일 결과)"""
+        content_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+        target = self.cache_dir / f"{content_hash}-v{COMPILED_VERSION}.json" if self.cache_dir else None
+        if target is not None:
+            try:
+                data = json.loads(target.read_text(encoding="utf-8"))
+                self.compile_hits += 1
+                return content_hash, data
+            except (OSError, ValueError):
+                pass
+
+        parsed = load_script_with_scenes(str(path))
+        data = {
+            "lines": parsed["lines"],
+            "scenes": [int(s.get("scene", 1)) for s in parsed["scenes"]],
+            "scene_count": parsed["scene_count"],
+        }
+        if target is not None:
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, target)
+            except OSError:
+                pass  # 컴파일 캐시는 best-effort
+        return content_hash, data
+
+    def _index_file(self, content_hash: str) -> Optional[Path]:
+        """mmap 인덱스 파일 경로 (없으면 CompiledScript가 만들어 저장)"""
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{content_hash}-i{INDEX_FILE_VERSION}.idx"
+
+    # ---------------------------
+    # 조회 (지연 로드 + 변경 감지 + LRU)
+    # ---------------------------
+    def get(self, script_id: Optional[str] = None) -> CompiledScript:
+        script_id = script_id or DEFAULT_SCRIPT_ID
+        now = time.monotonic()
+        with self._lock:
+            hit = self._loaded.get(script_id)
+            if hit is not None:
+                self._loaded.move_to_end(script_id)
+                if now - hit[2] < self.check_interval_s:
+                    return hit[0]
+            load_lock = self._load_locks.setdefault(script_id, threading.Lock())
+
+        path = self.path_for(script_id)
+        try:
+            st = path.stat()
+        except OSError:
+            if hit is not None:
+                return hit[0]  # 파일이 잠시 사라져도 마지막 버전 유지
+            with self._lock:
+                self._load_locks.pop(script_id, None)
+            raise ScriptNotFound(script_id)
+        key = (st.st_mtime_ns, st.st_size)
+
+        if hit is not None and hit[1] == key:
+            with self._lock:
+                if script_id in self._loaded:
+                    self._loaded[script_id] = (hit[0], key, now)
+            return hit[0]
+
+        with load_lock:
+            # 다른 요청이 먼저 다시 로드했으면 그 결과 사용
+            with self._lock:
+                cur = self._loaded.get(script_id)
+            if cur is not None and cur[1] == key:
+                return cur[0]
+
+            content_hash, data = self._compile(path)
+            if cur is not None and cur[0].content_hash == content_hash:
+                # mtime만 바뀌고 내용은 같음 → 인덱스/세션 유지
+                script = cur[0]
+            else:
+                script = CompiledScript(
+                    script_id, path, content_hash, data, self.tracker_kwargs,
+                    index_file=self._index_file(content_hash), session_db=self.session_db, pool=self.scoring_pool,
+                )
+                if cur is not None:
+                    self.reloads += 1
+                else:
+                    self.loads += 1
+
+            with self._lock:
+                self._loaded[script_id] = (script, key, time.monotonic())
+                self._loaded.move_to_end(script_id)
+                while len(self._loaded) > self.max_loaded:
+                    self._loaded.popitem(last=False)
+                    self.evictions += 1
+            return script
+
+    def loaded(self) -> List[CompiledScript]:
+        with self._lock:
+            return [v[0] for v in self._loaded.values()]
+
+    # ---------------------------
+    # 상태
+    # ---------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.ids(),
+            "loaded": [s.info() for s in self.loaded()],
+            "max_loaded": self.max_loaded,
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "compile_cache_hits": self.compile_hits,
+            "evictions": self.evictions,
+            "session_db": str(self.session_db) if self.session_db else None,
+            "scoring_pool": self.scoring_pool.stats() if self.scoring_pool else None,
+        }
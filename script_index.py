@@ -0,0 +1,381 @@
+# ==============================================
+# script_index.py — 사전 컴파일된 스크립트 유사도 인덱스
+# ==============================================
+"""
+script_index.py
+---------------
+✅ load_script_with_scenes() 결과로 1회 빌드하는 ScriptIndex
+   - 줄별 정규화 텍스트를 미리 계산
+   - 문자 n-gram 역색인으로 후보를 먼저 좁힌 뒤 fuzzy 점수 계산
+   - rapidfuzz(있으면) 배치 스코어러, 없으면 difflib (quick_ratio 상한으로 가지치기)
+   - 단건 / 배치 질의, top-k 결과 + scene 번호
+✅ save() → 바이너리 산출물, MappedScriptIndex → mmap 읽기 전용으로 열기
+   - 줄 / 정규화 텍스트 / scene / 역색인을 프로세스 힙에 복사하지 않음
+     → 같은 파일을 여는 워커·스코어링 프로세스가 OS 페이지 캐시 1벌을 공유
+"""
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+# ---------------------------
+# Similarity (rapidfuzz preferred, difflib fallback)
+# ---------------------------
+try:
+    from rapidfuzz import process, fuzz  # pip install rapidfuzz
+    _HAS_RAPIDFUZZ = True
+except Exception:
+    _HAS_RAPIDFUZZ = False
+    from difflib import SequenceMatcher
+
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_for_match(text: str) -> str:
+    """비교용 정규화: 문장부호 제거, 공백 정리, 소문자"""
+    text = _PUNCT_RE.sub(" ", text or "")
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+def char_ngrams(text: str, n: int = 2) -> set:
+    """공백 제거 후 문자 n-gram 집합 (한국어는 2-gram이 적당)"""
+    compact = text.replace(" ", "")
+    if len(compact) < n:
+        return {compact} if compact else set()
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+class ScriptIndex:
+    """
+    스크립트 줄 유사도 검색 인덱스 (읽기 전용, 빌드 후 불변).
+    """
+
+    def __init__(
+        self,
+        lines: List[str],
+        scenes: Optional[List[int]] = None,
+        ngram: int = 2,
+        prune_above: int = 64,
+        max_candidates: int = 48,
+    ):
+        self.lines: List[str] = list(lines)
+        n = len(self.lines)
+        if scenes is None or len(scenes) != n:
+            scenes = [1] * n
+        self.scenes: List[int] = [int(s) for s in scenes]
+        self.ngram = ngram
+        # 줄 수가 prune_above 이하이면 역색인 가지치기 없이 전체 스코어링
+        self.prune_above = prune_above
+        self.max_candidates = max_candidates
+
+        self.norm: List[str] = [normalize_for_match(t) for t in self.lines]
+
+        # n-gram → 줄 인덱스 목록 (역색인)
+        postings: Dict[str, List[int]] = {}
+        for i, text in enumerate(self.norm):
+            for g in char_ngrams(text, ngram):
+                postings.setdefault(g, []).append(i)
+        self.postings: Dict[str, Tuple[int, ...]] = {g: tuple(v) for g, v in postings.items()}
+
+    # ---------------------------
+    # 생성
+    # ---------------------------
+    @classmethod
+    def from_script_data(cls, data: Dict[str, Any], **kwargs) -> "ScriptIndex":
+        """load_script_with_scenes() 결과로 빌드"""
+        lines = data.get("lines") or []
+        mapped = data.get("scenes") or []
+        scenes = [int(s.get("scene", 1)) for s in mapped] if len(mapped) == len(lines) else None
+        return cls(lines, scenes, **kwargs)
+
+    def __len__(self):
+        return len(self.lines)
+
+    # ---------------------------
+    # 산출물 (MappedScriptIndex용)
+    # ---------------------------
+    def save(self, path) -> None:
+        """
+        mmap으로 열 수 있는 바이너리 파일로 저장 (tmp → os.replace, 여러 프로세스가 동시에 써도 안전).
+        레이아웃: MAGIC | version u32 | 헤더 길이 u32 | JSON 헤더 | 8바이트 정렬된 섹션들
+        """
+        if self.ngram > _MAX_MAPPED_NGRAM:
+            raise ValueError(f"ngram > {_MAX_MAPPED_NGRAM} cannot be mapped")
+        line_offsets, line_blob = _string_table(self.lines)
+        norm_offsets, norm_blob = _string_table(self.norm)
+        grams = sorted((_gram_key(g), ids) for g, ids in self.postings.items())
+        post_offsets = array("q", [0])
+        post_ids = array("i")
+        for _, ids in grams:
+            post_ids.extend(ids)
+            post_offsets.append(len(post_ids))
+        sections = [
+            ("line_offsets", "q", line_offsets.tobytes()),
+            ("lines", "B", line_blob),
+            ("norm_offsets", "q", norm_offsets.tobytes()),
+            ("norm", "B", norm_blob),
+            ("scenes", "i", array("i", self.scenes).tobytes()),
+            ("gram_keys", "Q", array("Q", [k for k, _ in grams]).tobytes()),
+            ("post_offsets", "q", post_offsets.tobytes()),
+            ("post_ids", "i", post_ids.tobytes()),
+        ]
+        # 헤더 길이가 오프셋에 영향을 주므로 헤더 크기를 넉넉히 고정한 뒤 섹션 배치
+        header_size = 4096
+        pos = _align(len(_MAGIC) + 8 + header_size)
+        layout: Dict[str, List[Any]] = {}
+        for name, fmt, raw in sections:
+            layout[name] = [pos, len(raw), fmt]
+            pos = _align(pos + len(raw))
+        header = json.dumps({
+            "n": len(self.lines),
+            "ngram": self.ngram,
+            "prune_above": self.prune_above,
+            "max_candidates": self.max_candidates,
+            "sections": layout,
+        }).encode("utf-8")
+        if len(header) > header_size:
+            raise ValueError("index header too large")
+
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC + struct.pack("<II", INDEX_FILE_VERSION, len(header)) + header)
+            for name, _, raw in sections:
+                f.seek(layout[name][0])
+                f.write(raw)
+            f.truncate(pos)
+        os.replace(tmp, path)
+
+    # ---------------------------
+    # 후보 가지치기
+    # ---------------------------
+    def _candidates(self, query_norm: str, restrict: Optional[List[int]]) -> List[int]:
+        base = restrict if restrict is not None else range(len(self.lines))
+        if len(base) <= self.prune_above:
+            return list(base)
+
+        hits: Dict[int, int] = {}
+        allowed = set(restrict) if restrict is not None else None
+        for g in char_ngrams(query_norm, self.ngram):
+            for i in self.postings.get(g, ()):
+                if allowed is None or i in allowed:
+                    hits[i] = hits.get(i, 0) + 1
+        if not hits:
+            return []
+        best = heapq.nlargest(self.max_candidates, hits.items(), key=lambda kv: kv[1])
+        return sorted(i for i, _ in best)
+
+    def clean_candidates(self, cand: Iterable) -> List[int]:
+        """요청의 candidates 정리: 범위 체크 + 중복 제거 + 정수 변환"""
+        n = len(self.lines)
+        return sorted({int(i) for i in cand if isinstance(i, (int, float)) and 0 <= int(i) < n})
+
+    # ---------------------------
+    # 스코어링
+    # ---------------------------
+    def _score(self, query_norm: str, cand: List[int], top_k: int) -> List[Tuple[int, float]]:
+        if not cand or not query_norm:
+            return []
+        if _HAS_RAPIDFUZZ:
+            choices = [self.norm[i] for i in cand]
+            found = process.extract(query_norm, choices, scorer=fuzz.token_set_ratio, limit=top_k)
+            return [(cand[local], float(score)) for _, score, local in found]
+
+        # difflib fallback: query를 seq2로 고정(내부 분석 캐시) + quick_ratio 상한으로 건너뛰기
+        sm = SequenceMatcher(None)
+        sm.set_seq2(query_norm)
+        heap: List[Tuple[float, int]] = []
+        for i in cand:
+            sm.set_seq1(self.norm[i])
+            floor = heap[0][0] if len(heap) >= top_k else 0.0
+            if sm.real_quick_ratio() * 100.0 <= floor or sm.quick_ratio() * 100.0 <= floor:
+                continue
+            s = sm.ratio() * 100.0
+            if len(heap) < top_k:
+                heapq.heappush(heap, (s, -i))
+            elif s > heap[0][0]:
+                heapq.heapreplace(heap, (s, -i))
+        return [(-neg_i, s) for s, neg_i in sorted(heap, reverse=True)]
+
+    def query(self, text: str, candidates: Optional[List[int]] = None, top_k: int = 1) -> List[Dict[str, Any]]:
+        """
+        단건 질의 → [{"idx", "score_pct", "scene"}, ...] (점수 내림차순, 최대 top_k)
+        candidates가 주어지면 해당 인덱스 안에서만 검색.
+        """
+        q = normalize_for_match(text)
+        cand = self._candidates(q, candidates)
+        return [
+            {"idx": i, "score_pct": round(s, 2), "scene": self.scenes[i]}
+            for i, s in self._score(q, cand, max(1, int(top_k)))
+        ]
+
+    def query_batch(
+        self,
+        texts: List[str],
+        candidates: Optional[List[int]] = None,
+        top_k: int = 1,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        여러 문장을 한 번에 질의 (결과 순서 = 입력 순서).
+        가지치기가 필요 없는 크기면 rapidfuzz cdist로 (질의 × 줄) 행렬을 한 번에 계산.
+        """
+        top_k = max(1, int(top_k))
+        base = candidates if candidates is not None else list(range(len(self.lines)))
+        if _HAS_RAPIDFUZZ and len(texts) > 1 and base and len(base) <= self.prune_above:
+            try:
+                return self._cdist_batch(texts, base, top_k)
+            except ImportError:
+                pass  # cdist는 numpy 필요 → 단건 루프로
+        return [self.query(t, candidates, top_k) for t in texts]
+
+    def _cdist_batch(self, texts: List[str], base: List[int], top_k: int) -> List[List[Dict[str, Any]]]:
+        queries = [normalize_for_match(t) for t in texts]
+        choices = [self.norm[i] for i in base]
+        matrix = process.cdist(queries, choices, scorer=fuzz.token_set_ratio, workers=-1)
+        out = []
+        for q, row in zip(queries, matrix):
+            if not q:
+                out.append([])
+                continue
+            order = (-row).argsort(kind="stable")[:top_k]  # 동점이면 앞 줄 우선
+            out.append([
+                {"idx": base[j], "score_pct": round(float(row[j]), 2), "scene": self.scenes[base[j]]}
+                for j in order
+            ])
+        return out
+
+
+# ==============================
+# mmap 인덱스
+# ==============================
+INDEX_FILE_VERSION = 1
+_MAGIC = b"SIDX"
+# n-gram 키 = 문자 코드포인트(21비트)를 이어 붙인 정수 → uint64에 3글자까지
+_MAX_MAPPED_NGRAM = 3
+
+
+def _gram_key(gram: str) -> int:
+    key = 0
+    for ch in gram:
+        key = (key << 21) | ord(ch)
+    return key
+
+
+def _align(pos: int, to: int = 8) -> int:
+    return (pos + to - 1) // to * to
+
+
+def _string_table(strings: List[str]) -> Tuple[array, bytes]:
+    """(시작 오프셋 n+1개, UTF-8 이어 붙인 바이트)"""
+    offsets = array("q", [0])
+    parts = []
+    pos = 0
+    for s in strings:
+        raw = s.encode("utf-8")
+        parts.append(raw)
+        pos += len(raw)
+        offsets.append(pos)
+    return offsets, b"".join(parts)
+
+
+class _MappedStrings:
+    """매핑된 문자열 표 (읽을 때 해당 줄만 디코드)"""
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class _MappedPostings:
+    """n-gram → 줄 인덱스 목록 (정렬된 키 배열 이진 탐색, dict.get과 같은 모양)"""
+    __slots__ = ("_keys", "_offsets", "_ids")
+
+    def __init__(self, keys: memoryview, offsets: memoryview, ids: memoryview):
+        self._keys = keys
+        self._offsets = offsets
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, gram: str, default=()):
+        key = _gram_key(gram)
+        j = bisect_left(self._keys, key)
+        if j < len(self._keys) and self._keys[j] == key:
+            return self._ids[self._offsets[j]:self._offsets[j + 1]].tolist()
+        return default
+
+
+class MappedScriptIndex(ScriptIndex):
+    """
+    ScriptIndex.save() 산출물을 mmap으로 연 읽기 전용 인덱스 (질의 결과는 ScriptIndex와 동일).
+    파일이 없거나 형식/버전이 다르면 OSError / ValueError → 호출 측이 다시 빌드
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"not a script index file: {self.path}")
+        version, header_len = struct.unpack_from("<II", mm, len(_MAGIC))
+        if version != INDEX_FILE_VERSION:
+            raise ValueError(f"script index version {version} != {INDEX_FILE_VERSION}")
+        start = len(_MAGIC) + 8
+        header = json.loads(bytes(mm[start:start + header_len]).decode("utf-8"))
+
+        view = memoryview(mm)
+        sec = {name: view[off:off + size].cast(fmt) for name, (off, size, fmt) in header["sections"].items()}
+        self.lines = _MappedStrings(sec["line_offsets"], sec["lines"])
+        self.norm = _MappedStrings(sec["norm_offsets"], sec["norm"])
+        self.scenes = sec["scenes"]
+        self.postings = _MappedPostings(sec["gram_keys"], sec["post_offsets"], sec["post_ids"])
+        self.ngram = int(header["ngram"])
+        self.prune_above = int(header["prune_above"])
+        self.max_candidates = int(header["max_candidates"])
+        if len(self.lines) != int(header["n"]) or len(self.scenes) != len(self.lines):
+            raise ValueError(f"corrupt script index file: {self.path}")
+
+
+def open_index(path: Optional[Path], lines: List[str], scenes: Optional[List[int]] = None) -> ScriptIndex:
+    """
+    산출물 경로가 있으면 mmap 인덱스 (없거나 깨졌으면 새로 저장 후 매핑),
+    저장할 수 없으면 프로세스 내 ScriptIndex
+    """
+    if path is not None:
+        try:
+            return MappedScriptIndex(path)
+        except (OSError, ValueError):
+            pass
+    index = ScriptIndex(lines, scenes)
+    if path is None:
+        return index
+    try:
+        index.save(path)
+        return MappedScriptIndex(path)
+    except (OSError, ValueError):
+        return index
@@ -0,0 +1,226 @@
+# ==============================================
+# script_session.py — 서버 측 대본 진행 세션 (커서 / 씬 진행도 / 적응형 후보 창)
+# ==============================================
+"""
+script_session.py
+-----------------
+✅ index.html에만 있던 씬 진행 로직(makeCandidateWindow / sceneProgress / completedScenes)을 서버로
+   - 세션별 커서(직전 확정 매치), 줄 단위 매치 비트맵, 씬별 완료 줄 수, 완료 씬 비트맵
+   - 후보 창: 커서 주변만 스코어링 → 창 안에서 못 찾으면 창을 넓히고 전체 인덱스로 재검색
+   - 씬 전환 규칙은 프런트와 동일: "씬의 모든 줄이 기준 이상 1회 이상" + "씬 마지막 줄 감지"
+   - 상태는 bytearray / array 로 압축 보관, 유휴 세션은 idle_s 후 축출 (최대 max_sessions개)
+   - 세션 id만 있으면 재접속해도 진행도 유지
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from script_index import ScriptIndex
+
+
+def candidate_window(center: Optional[int], n_lines: int, back: int = 2, ahead: int = 3) -> Optional[List[int]]:
+    """직전 매치 주변 후보 인덱스 (프런트 makeCandidateWindow와 동일 규칙)"""
+    if center is None or n_lines <= 0:
+        return None  # None이면 전체 비교
+    lo = max(0, center - back)
+    hi = min(n_lines - 1, center + ahead)
+    return list(range(lo, hi + 1))
+
+
+class ScriptSession:
+    """
+    세션 1개 상태. 스크립트 구조(줄→씬)는 트래커가 공유하고, 여기엔 진행도만 둔다.
+    """
+    __slots__ = ("sid", "cursor", "ahead", "matched", "scene_done", "completed",
+                 "last_seen", "hits", "misses")
+
+    def __init__(self, sid: str, n_lines: int, n_scenes: int, ahead: int):
+        self.sid = sid
+        self.cursor = -1                                   # -1 = 아직 확정 매치 없음
+        self.ahead = ahead                                 # 현재 앞쪽 창 크기 (적응형)
+        self.matched = bytearray((n_lines + 7) // 8)       # 줄별 기준 이상 매치 비트맵
+        self.scene_done = array("H", bytes(2 * n_scenes))  # 씬별 매치된 줄 수
+        self.completed = bytearray((n_scenes + 7) // 8)    # 전환 완료된 씬 비트맵
+        self.last_seen = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _get(bits: bytearray, i: int) -> bool:
+        return bool(bits[i >> 3] & (1 << (i & 7)))
+
+    @staticmethod
+    def _set(bits: bytearray, i: int):
+        bits[i >> 3] |= 1 << (i & 7)
+
+
+class SessionTracker:
+    def __init__(
+        self,
+        index: ScriptIndex,
+        match_threshold: float = 90.0,
+        back: int = 2,
+        ahead: int = 3,
+        max_ahead: int = 24,
+        idle_s: float = 1800.0,
+        max_sessions: int = 10000,
+    ):
+        self.index = index
+        self.match_threshold = float(match_threshold)
+        self.back = back
+        self.base_ahead = ahead
+        self.max_ahead = max(ahead, max_ahead)
+        self.idle_s = float(idle_s)
+        self.max_sessions = max(1, int(max_sessions))
+
+        # 줄 → 씬 슬롯(0..n_scenes-1), 씬별 줄 수 / 마지막 줄 (모든 세션이 공유)
+        self.scene_ids: List[int] = sorted(set(index.scenes))
+        slot = {s: k for k, s in enumerate(self.scene_ids)}
+        self.line_slot = array("H", [slot[s] for s in index.scenes])
+        self.scene_size = array("H", [0] * len(self.scene_ids))
+        self.scene_last = array("l", [-1] * len(self.scene_ids))
+        for i, k in enumerate(self.line_slot):
+            self.scene_size[k] += 1
+            self.scene_last[k] = i
+
+        self._sessions: "OrderedDict[str, ScriptSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    # ---------------------------
+    # 세션 조회 / 축출
+    # ---------------------------
+    def _evict(self, now: float):
+        # OrderedDict는 last_seen 순 → 앞에서부터 만료 확인
+        while self._sessions:
+            sid, sess = next(iter(self._sessions.items()))
+            if now - sess.last_seen <= self.idle_s and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[sid]
+            self.evicted += 1
+
+    def get(self, sid: str, create: bool = True) -> Optional[ScriptSession]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            sess = self._sessions.get(sid)
+            if sess is None:
+                if not create:
+                    return None
+                sess = ScriptSession(sid, len(self.index), len(self.scene_ids), self.base_ahead)
+                self._sessions[sid] = sess
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(sid)
+            sess.last_seen = now
+            return sess
+
+    def reset(self, sid: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(sid, None) is not None
+
+    # ---------------------------
+    # 매칭 + 진행도 갱신
+    # ---------------------------
+    def observe(self, sid: str, text: str, commit: bool = True, top_k: int = 1) -> Dict[str, Any]:
+        """
+        세션 창 안에서 스코어링 → 못 찾으면 전체 재검색.
+        commit=False(부분 전사 등)면 결과만 돌려주고 상태는 바꾸지 않는다.
+        반환: {"matches", "fallback", "scene_completed"}
+        """
+        sess = self.get(sid)
+        n = len(self.index)
+        cand = candidate_window(sess.cursor if sess.cursor >= 0 else None, n, self.back, sess.ahead)
+        found = self.index.query(text, cand, top_k) if n else []
+        fallback = False
+        if cand is not None and (not found or found[0]["score_pct"] < self.match_threshold):
+            fallback = True
+            wide = self.index.query(text, None, top_k)
+            if wide and (not found or wide[0]["score_pct"] > found[0]["score_pct"]):
+                found = wide
+
+        out = {"matches": found, "fallback": fallback, "scene_completed": None}
+        if not commit or not found:
+            return out
+
+        best = found[0]
+
+        def apply(s: ScriptSession) -> Optional[int]:
+            if fallback:
+                # 창 밖에서 찾았거나 못 찾음 → 다음 창을 넓힘
+                s.misses += 1
+                s.ahead = min(self.max_ahead, s.ahead * 2)
+            else:
+                s.hits += 1
+                s.ahead = self.base_ahead
+            return self._commit(s, best["idx"], best["score_pct"])
+
+        out["scene_completed"] = self._update(sess, apply)
+        return out
+
+    def mark(self, sid: str, idx: int, score_pct: float) -> Optional[int]:
+        """
+        스코어링 없이 줄 매치를 기록 (오프라인 정렬 타임라인 재생 등).
+        반환: 이번에 완료된 씬 번호 (없으면 None)
+        """
+        if not 0 <= idx < len(self.index):
+            return None
+        sess = self.get(sid)
+        return self._update(sess, lambda s: self._commit(s, idx, score_pct))
+
+    def _update(self, sess: ScriptSession, fn):
+        """
+        세션 상태 변경을 원자적으로 적용 → fn(세션) 반환값.
+        메모리 트래커는 락 안에서 그대로, 공유 저장소 트래커는 재조회 → 적용 → 저장으로 대체
+        """
+        with self._lock:
+            return fn(sess)
+
+    def _commit(self, sess: ScriptSession, idx: int, score_pct: float) -> Optional[int]:
+        """커서 이동 + 기준 이상이면 진행도 갱신 (_update 안에서 호출)"""
+        sess.cursor = idx
+        if score_pct < self.match_threshold:
+            return None
+        k = self.line_slot[idx]
+        if not ScriptSession._get(sess.matched, idx):
+            ScriptSession._set(sess.matched, idx)
+            sess.scene_done[k] += 1
+        if (
+            idx == self.scene_last[k]
+            and sess.scene_done[k] >= self.scene_size[k]
+            and not ScriptSession._get(sess.completed, k)
+        ):
+            ScriptSession._set(sess.completed, k)
+            return self.scene_ids[k]
+        return None
+
+    # ---------------------------
+    # 상태
+    # ---------------------------
+    def snapshot(self, sid: str) -> Optional[Dict[str, Any]]:
+        """재접속 시 프런트 복원용"""
+        sess = self.get(sid, create=False)
+        if sess is None:
+            return None
+        n = len(self.index)
+        return {
+            "session": sid,
+            "cursor": sess.cursor if sess.cursor >= 0 else None,
+            "window": [self.back, sess.ahead],
+            "matched": [i for i in range(n) if ScriptSession._get(sess.matched, i)],
+            "completed_scenes": [
+                s for k, s in enumerate(self.scene_ids) if ScriptSession._get(sess.completed, k)
+            ],
+            "hits": sess.hits,
+            "misses": sess.misses,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_s": self.idle_s,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,160 @@
+# ==============================================
+# session_store.py — 워커 간 공유 대본 진행 세션 (SQLite)
+# ==============================================
+"""
+session_store.py
+----------------
+✅ uvicorn 워커 여러 개가 같은 세션 진행도를 보도록 SessionTracker 상태를 SQLite에 보관
+   - 행 1개 = 세션 1개: 커서 / 창 크기 / 매치 비트맵 / 씬별 완료 줄 수 / 완료 씬 비트맵 (BLOB 그대로)
+   - scope = "<대본 id>:<내용 해시>" → 대본이 바뀌면 이전 진행도와 섞이지 않음 (메모리 트래커와 동일)
+   - 갱신은 BEGIN IMMEDIATE 안에서 재조회 → 적용 → 저장 (다른 워커의 동시 갱신을 잃지 않음)
+   - WAL 모드 + 스레드별 연결, 유휴/초과 세션은 주기적으로 정리
+"""
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from script_session import ScriptSession, SessionTracker
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    scope      TEXT NOT NULL,
+    sid        TEXT NOT NULL,
+    cursor     INTEGER NOT NULL,
+    ahead      INTEGER NOT NULL,
+    matched    BLOB NOT NULL,
+    scene_done BLOB NOT NULL,
+    completed  BLOB NOT NULL,
+    hits       INTEGER NOT NULL,
+    misses     INTEGER NOT NULL,
+    last_seen  REAL NOT NULL,
+    PRIMARY KEY (scope, sid)
+);
+CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+"""
+
+_COLUMNS = "cursor, ahead, matched, scene_done, completed, hits, misses"
+
+# 유휴/초과 세션 정리 주기(초)
+SWEEP_INTERVAL_S = 30.0
+
+
+class SqliteSessionTracker(SessionTracker):
+    def __init__(self, index, db_path: Path, scope: str, **kwargs):
+        super().__init__(index, **kwargs)
+        self.db_path = Path(db_path)
+        self.scope = scope
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    # ---------------------------
+    # 연결 / 직렬화
+    # ---------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None → 트랜잭션은 직접 BEGIN/COMMIT
+            conn = sqlite3.connect(str(self.db_path), timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _new(self, sid: str) -> ScriptSession:
+        return ScriptSession(sid, len(self.index), len(self.scene_ids), self.base_ahead)
+
+    def _from_row(self, sid: str, row) -> ScriptSession:
+        sess = self._new(sid)
+        cursor, ahead, matched, scene_done, completed, hits, misses = row
+        if len(matched) != len(sess.matched) or len(completed) != len(sess.completed) or len(scene_done) != 2 * len(sess.scene_done):
+            return sess  # 구조가 다르면(있을 수 없지만) 새 세션으로
+        sess.cursor = cursor
+        sess.ahead = ahead
+        sess.matched = bytearray(matched)
+        sess.scene_done = array("H")
+        sess.scene_done.frombytes(scene_done)
+        sess.completed = bytearray(completed)
+        sess.hits = hits
+        sess.misses = misses
+        return sess
+
+    def _load(self, conn: sqlite3.Connection, sid: str) -> Optional[ScriptSession]:
+        row = conn.execute(
+            f"SELECT {_COLUMNS} FROM sessions WHERE scope = ? AND sid = ?", (self.scope, sid)
+        ).fetchone()
+        return self._from_row(sid, row) if row is not None else None
+
+    def _save(self, conn: sqlite3.Connection, sess: ScriptSession, now: float):
+        conn.execute(
+            f"INSERT OR REPLACE INTO sessions (scope, sid, {_COLUMNS}, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.scope, sess.sid, sess.cursor, sess.ahead, bytes(sess.matched), sess.scene_done.tobytes(),
+             bytes(sess.completed), sess.hits, sess.misses, now),
+        )
+
+    # ---------------------------
+    # 정리
+    # ---------------------------
+    def _sweep(self, conn: sqlite3.Connection, now: float):
+        if now - self._last_sweep < SWEEP_INTERVAL_S:
+            return
+        self._last_sweep = now
+        n = conn.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.idle_s,)).rowcount
+        n += conn.execute(
+            "DELETE FROM sessions WHERE scope = ? AND sid IN ("
+            " SELECT sid FROM sessions WHERE scope = ? ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (self.scope, self.scope, self.max_sessions),
+        ).rowcount
+        self.evicted += max(0, n)
+
+    # ---------------------------
+    # SessionTracker 저장소 훅
+    # ---------------------------
+    def get(self, sid: str, create: bool = True) -> Optional[ScriptSession]:
+        now = time.time()
+        conn = self._conn()
+        self._sweep(conn, now)
+        sess = self._load(conn, sid)
+        if sess is None and create:
+            sess = self._new(sid)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 다른 워커가 먼저 만들었으면 그대로 둠
+                if self._load(conn, sid) is None:
+                    self._save(conn, sess, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return sess
+
+    def _update(self, sess: ScriptSession, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = self._load(conn, sess.sid) or sess
+            result = fn(cur)
+            self._save(conn, cur, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def reset(self, sid: str) -> bool:
+        cur = self._conn().execute("DELETE FROM sessions WHERE scope = ? AND sid = ?", (self.scope, sid))
+        return cur.rowcount > 0
+
+    def stats(self) -> Dict[str, Any]:
+        count = self._conn().execute("SELECT COUNT(*) FROM sessions WHERE scope = ?", (self.scope,)).fetchone()[0]
+        return {
+            "sessions": count,
+            "max_sessions": self.max_sessions,
+            "idle_s": self.idle_s,
+            "evicted": self.evicted,
+            "store": str(self.db_path),
+        }
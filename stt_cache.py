@@ -0,0 +1,221 @@
+# ==============================================
+# stt_cache.py — 전사 결과 캐시 (내용 주소 기반, 메모리 LRU + 디스크)
+# ==============================================
+"""
+stt_cache.py
+------------
+✅ 같은 오디오 구간을 Whisper(GPU)에 두 번 보내지 않기 위한 캐시
+   - 키: PCM 업로드의 sha256, 또는 구간 요청이면 (AUDIO_FILE, mtime, 시작/끝 프레임)
+   - 1단: 메모리 LRU (텍스트 바이트 합계 기준으로 축출)
+   - 2단: 디스크 JSON (선택, 재기동 후에도 유지)
+   - hit / miss 카운터 → /health
+   - shared=True(멀티 워커): 디스크 lease 파일로 워커 간 single-flight
+     · 먼저 lease를 만든 워커만 Whisper 호출, 나머지는 디스크에 결과가 생길 때까지 대기
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from starlette.concurrency import run_in_threadpool
+
+
+# 엔트리당 고정 오버헤드 추정치 (dict/키 문자열 등)
+_ENTRY_OVERHEAD = 200
+
+
+def payload_key(data) -> str:
+    """업로드 바이트 → 캐시 키"""
+    return payload_key_from_digest(hashlib.sha256(data).hexdigest())
+
+
+def payload_key_from_digest(hexdigest: str) -> str:
+    """수신 중 계산해 둔 sha256 → 캐시 키 (payload_key와 같은 값)"""
+    return "pcm:" + hexdigest
+
+
+def range_key(path, mtime_ns: int, size: int, frame_start: int, frame_end: int) -> str:
+    """AUDIO_FILE 구간 → 캐시 키 (파일이 바뀌면 자연히 다른 키)"""
+    raw = f"{path}|{mtime_ns}|{size}|{frame_start}|{frame_end}"
+    return "range:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SttCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, disk_dir: Optional[Path] = None, shared: bool = False):
+        self.max_bytes = max(0, int(max_bytes))
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.shared = bool(shared) and self.disk_dir is not None
+
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_waits = 0
+
+    # ---------------------------
+    # 메모리 LRU
+    # ---------------------------
+    @staticmethod
+    def _entry_size(key: str, value: Dict[str, Any]) -> int:
+        return _ENTRY_OVERHEAD + len(key) + len((value.get("text") or "").encode("utf-8"))
+
+    def _mem_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+            return value
+
+    def _mem_put(self, key: str, value: Dict[str, Any]):
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._lru:
+                self._bytes -= self._sizes[key]
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._lru:
+                old, _ = self._lru.popitem(last=False)
+                self._bytes -= self._sizes.pop(old)
+                self.evictions += 1
+
+    # ---------------------------
+    # 디스크
+    # ---------------------------
+    def _disk_path(self, key: str) -> Path:
+        kind, _, digest = key.partition(":")
+        return self.disk_dir / digest[:2] / f"{kind}-{digest}.json"
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.disk_dir is None:
+            return None
+        try:
+            return json.loads(self._disk_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, value: Dict[str, Any]):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            pass  # 디스크 캐시는 best-effort
+
+    # ---------------------------
+    # 워커 간 lease (shared=True)
+    # ---------------------------
+    def _lease_path(self, key: str) -> Path:
+        path = self._disk_path(key)
+        return path.with_name(path.name[:-len(".json")] + ".lease")
+
+    def _claim(self, key: str, ttl_s: float) -> bool:
+        path = self._lease_path(key)
+        for _ in range(2):
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.close(os.open(str(path), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    # 만든 워커가 죽었으면 ttl 뒤 만료
+                    if time.time() - path.stat().st_mtime <= ttl_s:
+                        return False
+                    path.unlink()
+                except OSError:
+                    pass
+            except OSError:
+                return True  # 조정 불가 → 그냥 직접 호출
+        return False
+
+    def _release(self, key: str):
+        try:
+            self._lease_path(key).unlink()
+        except OSError:
+            pass
+
+    async def claim(self, key: str, ttl_s: float) -> bool:
+        """이 워커가 key를 전사할 차례면 True (shared가 아니면 항상 True)"""
+        if not self.shared:
+            return True
+        return await run_in_threadpool(self._claim, key, ttl_s)
+
+    async def release(self, key: str):
+        if self.shared:
+            await run_in_threadpool(self._release, key)
+
+    async def wait_shared(self, key: str, timeout_s: float, poll_s: float = 0.05) -> Optional[Dict[str, Any]]:
+        """
+        다른 워커가 전사 중인 key의 결과를 디스크에서 기다림.
+        결과 없이 lease가 사라지면(실패/취소) 또는 timeout이면 None
+        """
+        self.shared_waits += 1
+        deadline = time.monotonic() + timeout_s
+        lease = self._lease_path(key)
+        while time.monotonic() < deadline:
+            value = await run_in_threadpool(self._disk_get, key)
+            if value is not None:
+                self._mem_put(key, value)
+                return value
+            if not lease.exists():
+                return await run_in_threadpool(self._disk_get, key)
+            await asyncio.sleep(poll_s)
+        return None
+
+    # ---------------------------
+    # 조회 / 저장
+    # ---------------------------
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._mem_get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.disk_dir is not None:
+            value = await run_in_threadpool(self._disk_get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self._mem_put(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: Dict[str, Any]):
+        self._mem_put(key, value)
+        if self.disk_dir is not None:
+            await run_in_threadpool(self._disk_put, key, value)
+
+    # ---------------------------
+    # 상태
+    # ---------------------------
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "disk": str(self.disk_dir) if self.disk_dir else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "shared": self.shared,
+            "shared_waits": self.shared_waits,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
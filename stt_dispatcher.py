@@ -0,0 +1,275 @@
+# ==============================================
+# stt_dispatcher.py — Whisper 요청 합치기(single-flight) + 마이크로 배치
+# ==============================================
+"""
+stt_dispatcher.py
+-----------------
+✅ 라우트와 Whisper 사이의 디스패처
+   - 캐시 조회 → 같은 키의 진행 중 요청에 합류(single-flight) → 배치 대기열
+   - max_wait_ms 동안 들어온 청크를 최대 max_batch개까지 묶어서 전송
+     · 배치 엔드포인트(WHISPER_BATCH_PATH)가 설정돼 있으면 한 번의 배치 요청
+     · 없으면 공유 커넥션 풀로 동시에 개별 요청 (동시성은 WhisperClient가 제한)
+   - 결과는 같은 키를 기다리던 모든 호출자에게 전달 + 캐시에 저장
+     (2xx JSON text 결과만 저장 — 429/4xx/5xx는 예외, JSON 아닌 원문 응답은 전달만)
+   - 호출자가 끊기면 그 호출자만 대기를 멈춤. 모두 떠나면 전송 전이면 배치에서 제외,
+     전송 후면 업스트림 호출 취소 (배치 요청은 같은 배치의 호출자가 모두 떠났을 때만)
+   - 공유 캐시(멀티 워커)면 대기열에 넣기 전에 워커 간 lease 확인 → 다른 워커가 전사 중이면 그 결과 사용
+"""
+import asyncio
+import time
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
+
+from whisper_client import WhisperClient, ClientDisconnected, WhisperTimeout, watch_disconnect, is_cacheable
+from stt_cache import SttCache
+
+
+class _Job:
+    __slots__ = ("key", "content", "future", "waiters", "dispatched", "enqueued_at", "leased", "shared",
+                 "upstream", "group")
+
+    def __init__(self, key: str, content, future: "asyncio.Future"):
+        self.key = key
+        self.content = content
+        self.future = future
+        self.waiters = 0
+        self.dispatched = False
+        self.enqueued_at = time.monotonic()
+        self.leased = False   # 워커 간 lease 보유 (전송 후 해제)
+        self.shared = False   # 다른 워커의 전사 결과로 완료
+        self.upstream: Optional["asyncio.Future"] = None  # 전송 후: 업스트림 호출 작업
+        self.group: Tuple["_Job", ...] = ()                # 같은 업스트림 호출을 쓰는 작업들
+
+
+class SttDispatcher:
+    def __init__(
+        self,
+        client: WhisperClient,
+        cache: Optional[SttCache] = None,
+        max_batch: int = 8,
+        max_wait_ms: float = 10.0,
+        use_batch: bool = False,
+    ):
+        self.client = client
+        self.cache = cache
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_s = max(0.0, float(max_wait_ms) / 1000.0)
+        self.use_batch = bool(use_batch) and client.supports_batch
+
+        self._inflight: Dict[str, _Job] = {}
+        self._queue: Optional["asyncio.Queue[_Job]"] = None
+        self._worker: Optional["asyncio.Task"] = None
+        self._tasks: set = set()
+
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.shared_hits = 0
+
+    # ---------------------------
+    # 수명 주기
+    # ---------------------------
+    async def start(self):
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for t in list(self._tasks):
+            t.cancel()
+        for job in list(self._inflight.values()):
+            if not job.future.done():
+                job.future.set_exception(WhisperTimeout("dispatcher closed"))
+                job.future.exception()
+        self._inflight.clear()
+
+    # ---------------------------
+    # 제출
+    # ---------------------------
+    async def submit(
+        self,
+        key: str,
+        content,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        (결과, 출처) 반환 — 출처: "cache" | "coalesced" | "shared"(다른 워커) | "upstream"
+        예외: WhisperTimeout / WhisperRequestFailed / ClientDisconnected
+        """
+        if self.cache is not None:
+            hit = await self.cache.get(key)
+            if hit is not None:
+                return hit, "cache"
+
+        job = self._inflight.get(key)
+        if job is not None:
+            self.coalesced += 1
+            source = "coalesced"
+        else:
+            job = _Job(key, content, asyncio.get_event_loop().create_future())
+            self._inflight[key] = job
+            if self.cache is not None and self.cache.shared:
+                self._spawn(self._enqueue_shared(job))
+            else:
+                self._queue.put_nowait(job)
+            source = "upstream"
+
+        job.waiters += 1
+        deadline = self.client.timeout if timeout is None else float(timeout)
+        watcher = None
+        try:
+            # asyncio.wait는 타임아웃에도 job.future를 취소하지 않음 (취소는 아래 finally에서 직접)
+            waiters = {job.future}
+            if is_disconnected is not None:
+                watcher = asyncio.ensure_future(watch_disconnect(is_disconnected, self.client.disconnect_poll_s))
+                waiters.add(watcher)
+            done, _ = await asyncio.wait(waiters, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+            if job.future.done():
+                return job.future.result(), ("shared" if job.shared else source)
+            if watcher is not None and watcher in done:
+                raise ClientDisconnected("client disconnected")
+            raise WhisperTimeout("whisper_http_timeout")
+        finally:
+            job.waiters -= 1
+            if watcher is not None and not watcher.done():
+                watcher.cancel()
+            # 아무도 기다리지 않으면 취소 표시 (전송 전이면 워커가 건너뜀)
+            if job.waiters == 0 and not job.future.done():
+                job.future.cancel()
+                if self._inflight.get(key) is job:
+                    del self._inflight[key]
+                # 전송 후: 같은 업스트림 호출을 기다리는 호출자가 더 없으면 호출 자체를 취소
+                up = job.upstream
+                if up is not None and not up.done() and all(j.waiters == 0 for j in job.group):
+                    up.cancel()
+                    self.cancelled += 1
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _enqueue_shared(self, job: _Job):
+        """lease를 잡으면 대기열로, 다른 워커가 잡고 있으면 그 결과를 기다림 (결과 없이 풀리면 다시 시도)"""
+        ttl = self.client.timeout + 5.0
+        while not job.future.done():
+            if await self.cache.claim(job.key, ttl):
+                job.leased = True
+                self._queue.put_nowait(job)
+                return
+            hit = await self.cache.wait_shared(job.key, ttl)
+            if hit is not None and not job.future.done():
+                self.shared_hits += 1
+                job.shared = True
+                job.future.set_result(hit)
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+
+    # ---------------------------
+    # 배치 수집 워커
+    # ---------------------------
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            until = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                remain = until - loop.time()
+                if remain <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remain))
+                except asyncio.TimeoutError:
+                    break
+
+            live = [j for j in batch if not j.future.done()]
+            self.dropped += len(batch) - len(live)
+            for j in batch:
+                if j.leased and j.future.done():
+                    await self.cache.release(j.key)
+            if not live:
+                continue
+            for j in live:
+                j.dispatched = True
+            self._spawn(self._dispatch(live))
+
+    async def _dispatch(self, jobs: List[_Job]):
+        # 전송 표시 후 실제 호출 전까지 모두 떠난 작업은 제외
+        live = [j for j in jobs if not j.future.done()]
+        self.dropped += len(jobs) - len(live)
+        if live:
+            self.batches += 1
+            self.batched_jobs += len(live)
+        if not live:
+            outcomes = []
+        elif self.use_batch and len(live) > 1:
+            upstream = asyncio.ensure_future(self.client.transcribe_batch([j.content for j in live]))
+            for j in live:
+                j.upstream, j.group = upstream, tuple(live)
+            try:
+                await asyncio.wait({upstream})
+            finally:
+                if not upstream.done():
+                    upstream.cancel()  # 디스패처 종료
+            if upstream.cancelled():
+                outcomes = [(j, None, asyncio.CancelledError()) for j in live]
+            elif upstream.exception() is not None:
+                outcomes = [(j, None, upstream.exception()) for j in live]
+            else:
+                outcomes = list(zip(live, upstream.result(), [None] * len(live)))
+        else:
+            tasks = [asyncio.ensure_future(self.client.transcribe(j.content)) for j in live]
+            for j, t in zip(live, tasks):
+                j.upstream, j.group = t, (j,)
+            raw = await asyncio.gather(*tasks, return_exceptions=True)
+            outcomes = [
+                (j, None, r) if isinstance(r, BaseException) else (j, r, None)
+                for j, r in zip(live, raw)
+            ]
+
+        # 1) 결과 먼저 전달 (디스크 캐시 쓰기로 응답이 늦어지지 않게)
+        for job, result, error in outcomes:
+            if job.future.done():
+                continue
+            if error is not None:
+                job.future.set_exception(error)
+                job.future.exception()
+            else:
+                job.future.set_result(result)
+
+        # 2) 캐시 저장 후 in-flight 제거 — 그 사이 들어온 요청은 완료된 future에 바로 합류
+        for job, result, error in outcomes:
+            if error is None and self.cache is not None and is_cacheable(result):
+                await self.cache.put(job.key, result)
+        for job in jobs:
+            job.upstream = None
+            job.group = ()
+            if job.leased:
+                await self.cache.release(job.key)
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+    # ---------------------------
+    # 상태
+    # ---------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_keys": len(self._inflight),
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "avg_batch": round(self.batched_jobs / self.batches, 2) if self.batches else 0.0,
+            "dropped": self.dropped,
+            "cancelled": self.cancelled,
+            "shared_hits": self.shared_hits,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait_s * 1000.0, 1),
+            "batch": self.use_batch,
+        }
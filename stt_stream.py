@@ -0,0 +1,280 @@
+# ==============================================
+# stt_stream.py — WebSocket 스트리밍 STT 세션 (브라우저 ↔ Whisper /ws)
+# ==============================================
+"""
+stt_stream.py
+-------------
+✅ test/proxy.py 릴레이를 FastAPI 앱 안으로 옮긴 버전
+   - 세션(브라우저 소켓)당 업스트림 Whisper 소켓 1개 유지
+   - 브라우저 → Whisper: 오디오/제어 프레임 그대로 전달
+   - Whisper → 브라우저: 전사 결과 + /similar 매칭(best_idx, scene)을 붙여 JSON 전송
+   - ?session=<id> 로 접속하면 매칭/씬 진행도를 SessionTracker에 저장 (/similar 세션과 공유)
+   - VadStreamSession(?mode=vad): 업스트림 WS 없이 서버 VAD가 PCM을 구간으로 잘라 HTTP STT 경로(디스패처)로
+"""
+import asyncio
+import json
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
+
+import numpy as np
+import websockets
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+
+from script_session import SessionTracker, candidate_window
+from vad import StreamingVad, VadConfig
+from wav_slicer import WavInfo, build_wav_header
+from whisper_client import WhisperError
+
+
+# 매칭 함수: (text, candidates) -> [{"idx", "score_pct", "scene"}, ...]
+MatchFn = Callable[[str, Optional[List[int]]], List[Dict[str, Any]]]
+
+# 전사 함수: WAV bytes -> (결과, 출처)  (디스패처 submit과 같은 반환)
+TranscribeFn = Callable[[bytes], Awaitable[Tuple[Dict[str, Any], str]]]
+
+
+def parse_transcript(message) -> Optional[Dict[str, Any]]:
+    """
+    Whisper /ws 응답 해석.
+    - JSON: {"text": "...", "partial"/"is_final": ...}
+    - 그 외 텍스트: 전체를 확정 전사로 취급
+    """
+    if isinstance(message, (bytes, bytearray)):
+        return None
+    try:
+        obj = json.loads(message)
+    except ValueError:
+        obj = {"text": message}
+    if not isinstance(obj, dict):
+        obj = {"text": str(obj)}
+
+    text = (obj.get("text") or "").strip()
+    if "partial" in obj:
+        partial = bool(obj.get("partial"))
+    else:
+        partial = not bool(obj.get("is_final", True))
+    return {"text": text, "partial": partial, "raw": obj}
+
+
+class SttStreamSession:
+    """
+    브라우저 WebSocket 1개에 대응하는 스트리밍 세션.
+    """
+
+    def __init__(
+        self,
+        client_ws: WebSocket,
+        upstream_url: str,
+        match: MatchFn,
+        n_lines: int,
+        match_threshold: float = 90.0,
+        open_timeout: float = 10.0,
+        tracker: Optional[SessionTracker] = None,
+        session_id: Optional[str] = None,
+    ):
+        self.client_ws = client_ws
+        self.upstream_url = upstream_url
+        self.match = match
+        self.n_lines = n_lines
+        self.match_threshold = match_threshold
+        self.open_timeout = open_timeout
+        self.last_best_idx: Optional[int] = None
+        # 세션 id가 있으면 커서/씬 진행도를 트래커에 보관 (재접속 시 이어짐)
+        self.tracker = tracker if session_id else None
+        self.session_id = session_id
+
+    async def run(self):
+        await self.client_ws.accept()
+        try:
+            upstream = await websockets.connect(
+                self.upstream_url, max_size=None, open_timeout=self.open_timeout
+            )
+        except Exception as e:
+            await self._send({"type": "error", "error": f"whisper_ws_connect_failed: {e}"})
+            await self.client_ws.close(code=1011)
+            return
+
+        try:
+            to_upstream = asyncio.ensure_future(self._client_to_whisper(upstream))
+            to_client = asyncio.ensure_future(self._whisper_to_client(upstream))
+            done, pending = await asyncio.wait({to_upstream, to_client}, return_when=asyncio.FIRST_COMPLETED)
+            for t in pending:
+                t.cancel()
+            for t in done:
+                exc = t.exception()
+                if exc is not None and not isinstance(exc, (WebSocketDisconnect, websockets.ConnectionClosed)):
+                    await self._send({"type": "error", "error": f"stream_failed: {exc}"})
+        finally:
+            await upstream.close()
+            try:
+                await self.client_ws.close()
+            except RuntimeError:
+                pass  # 이미 닫힘
+
+    # ---------------------------
+    # 방향별 펌프
+    # ---------------------------
+    async def _client_to_whisper(self, upstream):
+        while True:
+            msg = await self.client_ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            if msg.get("bytes") is not None:
+                await upstream.send(msg["bytes"])
+            elif msg.get("text") is not None:
+                await upstream.send(msg["text"])
+
+    async def _whisper_to_client(self, upstream):
+        async for message in upstream:
+            tr = parse_transcript(message)
+            if tr is None or not tr["text"]:
+                continue
+            # 매칭은 CPU 작업(또는 스코어링 풀/공유 세션 저장소 대기) → 이벤트 루프 밖에서
+            await self._send(await run_in_threadpool(self._annotate, tr))
+
+    # ---------------------------
+    # 매칭
+    # ---------------------------
+    def _annotate(self, tr: Dict[str, Any]) -> Dict[str, Any]:
+        out = {"type": "transcript", "text": tr["text"], "partial": tr["partial"],
+               "score_pct": 0.0, "best_idx": None, "scene": None}
+        if self.tracker is not None:
+            res = self.tracker.observe(self.session_id, tr["text"], commit=not tr["partial"])
+            if res["matches"]:
+                best = res["matches"][0]
+                out.update(score_pct=best["score_pct"], best_idx=best["idx"], scene=best["scene"])
+            out["scene_completed"] = res["scene_completed"]
+            return out
+        cand = candidate_window(self.last_best_idx, self.n_lines)
+        found = self.match(tr["text"], cand)
+        if cand is not None and (not found or found[0]["score_pct"] < self.match_threshold):
+            # 창 안에서 못 찾으면 전체 재검색 (점수가 더 높은 쪽 채택)
+            wide = self.match(tr["text"], None)
+            if wide and (not found or wide[0]["score_pct"] > found[0]["score_pct"]):
+                found = wide
+        if found:
+            best = found[0]
+            out.update(score_pct=best["score_pct"], best_idx=best["idx"], scene=best["scene"])
+            # 부분 전사는 흔들리므로 확정 전사만 창 중심을 옮김
+            if not tr["partial"]:
+                self.last_best_idx = best["idx"]
+        return out
+
+    async def _send(self, obj: Dict[str, Any]):
+        try:
+            await self.client_ws.send_text(json.dumps(obj, ensure_ascii=False))
+        except (RuntimeError, WebSocketDisconnect):
+            pass
+
+
+class VadStreamSession(SttStreamSession):
+    """
+    ?mode=vad 스트리밍 세션: Whisper /ws 대신 서버 VAD 구간 단위 HTTP 전사.
+    - 브라우저 → 서버: PCM s16le 모노 바이너리 프레임 (?rate=, 기본 16000)
+      텍스트 "flush" (또는 {"type": "flush"}) → 남은 구간 확정 후 {"type": "flushed"}
+    - 서버 → 브라우저: 구간마다 {"type": "transcript", ..., "start", "end", "cached"} (partial 없음)
+    - 구간 전사는 동시에, 매칭/전송은 구간 순서대로 (세션 커서가 뒤섞이지 않게)
+    """
+
+    def __init__(
+        self,
+        client_ws: WebSocket,
+        transcribe: TranscribeFn,
+        sample_rate: int,
+        match: MatchFn,
+        n_lines: int,
+        vad_config: Optional[VadConfig] = None,
+        **kwargs,
+    ):
+        super().__init__(client_ws, "", match, n_lines, **kwargs)
+        self.transcribe = transcribe
+        self.sample_rate = int(sample_rate)
+        self.vad = StreamingVad(self.sample_rate, vad_config)
+        self._pcm = bytearray()
+        self._pcm_start = 0      # self._pcm[0]의 샘플 인덱스
+        self._odd = b""          # 프레임 경계에 걸린 반쪽 샘플
+        self._last: Optional["asyncio.Future"] = None
+        self._tasks: set = set()
+
+    async def run(self):
+        await self.client_ws.accept()
+        try:
+            while True:
+                msg = await self.client_ws.receive()
+                if msg["type"] == "websocket.disconnect":
+                    return
+                if msg.get("bytes") is not None:
+                    self._submit(self._feed(msg["bytes"]))
+                elif _is_flush(msg.get("text")):
+                    self._submit(self.vad.flush())
+                    if self._tasks:
+                        await asyncio.wait(set(self._tasks))
+                    await self._send({"type": "flushed", "segments": self.vad.segments})
+        except WebSocketDisconnect:
+            return
+        finally:
+            for t in self._tasks:
+                t.cancel()
+
+    # ---------------------------
+    # PCM → 구간
+    # ---------------------------
+    def _feed(self, data: bytes) -> List[Tuple[float, float]]:
+        data = self._odd + data
+        n = len(data) & ~1
+        self._odd = data[n:]
+        if n == 0:
+            return []
+        self._pcm += data[:n]
+        x = np.frombuffer(data[:n], dtype="<i2").astype(np.float32) / 32768.0
+        return self.vad.feed(x)
+
+    def _wav(self, start_s: float, end_s: float) -> bytes:
+        a = max(0, int(round(start_s * self.sample_rate)) - self._pcm_start)
+        b = max(a, int(round(end_s * self.sample_rate)) - self._pcm_start)
+        pcm = bytes(self._pcm[2 * a:2 * b])
+        info = WavInfo(1, self.sample_rate, 16, 2, 1, 44, len(pcm))
+        return build_wav_header(info, len(pcm)) + pcm
+
+    def _submit(self, segments: List[Tuple[float, float]]):
+        for start, end in segments:
+            task = asyncio.ensure_future(self._transcribe(start, end, self._wav(start, end), self._last))
+            self._last = task
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # VAD가 더 이상 보지 않는 앞부분 오디오는 버림
+        keep_from = int(self.vad.horizon_s * self.sample_rate)
+        drop = min(len(self._pcm) // 2, keep_from - self._pcm_start)
+        if drop > 0:
+            del self._pcm[:2 * drop]
+            self._pcm_start += drop
+
+    async def _transcribe(self, start: float, end: float, wav: bytes, prev: Optional["asyncio.Future"]):
+        try:
+            result, source = await self.transcribe(wav)
+        except WhisperError as e:
+            result, source = None, str(e)
+        if prev is not None:
+            await asyncio.wait({prev})
+        if result is None:
+            await self._send({"type": "error", "error": source, "start": start, "end": end})
+            return
+        text = (result.get("text") or "").strip()
+        if not text:
+            return
+        out = await run_in_threadpool(self._annotate, {"text": text, "partial": False})
+        out.update(start=start, end=end, cached=source != "upstream")
+        await self._send(out)
+
+
+def _is_flush(text: Optional[str]) -> bool:
+    if not text:
+        return False
+    text = text.strip()
+    if text == "flush":
+        return True
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(obj, dict) and obj.get("type") == "flush"
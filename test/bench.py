@@ -0,0 +1,597 @@
+# ==============================================
+# bench.py — 부하/지연 벤치마크 (로컬 Whisper 대역 + 앱을 띄워서 측정)
+# ==============================================
+"""
+bench.py
+--------
+✅ 공연 시즌 전 배포 규모 산정용 재현 가능한 벤치마크
+   - test/fake_whisper.py(지연/지터/GPU 슬롯)와 앱(uvicorn main:app)을 빈 포트에 띄움
+     (--target 을 주면 이미 떠 있는 서버를 그대로 측정)
+   - replay: short_sample.wav를 프런트와 같은 규칙(엔벨로프 발화 구간)으로 잘라
+     관객 N명이 실시간 속도로 /stt-range(또는 /stt-proxy) → /similar 를 호출
+   - load: /stt-proxy, /similar, /audio(Range), /script 에 동시성 단계별 closed-loop 부하
+   - 지표: p50/p95/p99/max 지연, 처리량(req/s), 오류 수,
+     서버 이벤트 루프 지연(/metrics event_loop_lag_seconds 증분) + 벤치 클라이언트 자신의 루프 지연
+   - 결과 JSON 저장, --compare 로 이전 결과와 비교 (p95 상승 / 처리량 하락이 기준 % 넘으면 표시)
+
+실행:
+    python test/bench.py                                   # 기본: c=1,8,32 × 10초
+    python test/bench.py --concurrency 4,16 --duration 20 --whisper-latency-ms 800 --gpu-slots 2
+    python test/bench.py --compare test/results/bench-20260101-120000.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from audio_envelope import build_envelope  # noqa: E402
+
+SCENARIOS = ("stt-proxy", "similar", "audio", "script")
+
+
+# ==============================
+# 통계
+# ==============================
+def percentile(sorted_vals: List[float], q: float) -> Optional[float]:
+    """nearest-rank 백분위 (정렬된 목록)"""
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def summarize_latency(lat_s: List[float]) -> Dict[str, Any]:
+    vals = sorted(lat_s)
+    ms = lambda v: None if v is None else round(v * 1000.0, 2)
+    return {
+        "count": len(vals),
+        "mean_ms": ms(sum(vals) / len(vals)) if vals else None,
+        "p50_ms": ms(percentile(vals, 50)),
+        "p95_ms": ms(percentile(vals, 95)),
+        "p99_ms": ms(percentile(vals, 99)),
+        "max_ms": ms(vals[-1]) if vals else None,
+    }
+
+
+class LoopLagProbe:
+    """벤치 클라이언트 자신의 이벤트 루프 지연 (클라이언트가 병목이면 측정값을 믿으면 안 됨)"""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(max(0.0, loop.time() - t0 - self.interval_s))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> Dict[str, Any]:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        return summarize_latency(self.samples)
+
+
+# ==============================
+# 서버 메트릭 (/metrics 히스토그램 증분)
+# ==============================
+def parse_histogram(text: str, name: str) -> Optional[Dict[str, Any]]:
+    """
+    히스토그램 1개 → {"buckets": [(le, 누적)], "sum", "count", "series"}
+    멀티 워커(worker="<pid>" 라벨)면 시계열별 값을 버킷(le)마다 합산 → 서버 전체 분포
+    """
+    buckets: Dict[float, float] = {}
+    total = count = 0.0
+    series = 0
+    for line in text.splitlines():
+        if line.startswith(name + "_bucket{"):
+            le = line.split('le="', 1)[1].split('"', 1)[0]
+            bound = float("inf") if le == "+Inf" else float(le)
+            buckets[bound] = buckets.get(bound, 0.0) + float(line.rsplit(" ", 1)[1])
+        elif line.startswith(name + "_sum"):
+            total += float(line.rsplit(" ", 1)[1])
+        elif line.startswith(name + "_count"):
+            count += float(line.rsplit(" ", 1)[1])
+            series += 1
+    if not series:
+        return None
+    return {"buckets": sorted(buckets.items()), "sum": total, "count": count, "series": series}
+
+
+def histogram_delta(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """두 스냅샷 사이 관측분 → 평균 + 백분위(버킷 상한, ≤ 값)"""
+    if after is None:
+        return None
+    if before is None:
+        # 첫 관측 전에는 히스토그램 줄 자체가 없음 → 0부터
+        before = {"buckets": [], "sum": 0.0, "count": 0.0}
+    n = after["count"] - before["count"]
+    if n <= 0:
+        return {"samples": 0}
+    prev = dict(before["buckets"])
+    cum = [(le, c - prev.get(le, 0.0)) for le, c in after["buckets"]]
+
+    def upper(q: float) -> Optional[float]:
+        for le, c in cum:
+            if c >= q * n:
+                return None if le == float("inf") else round(le * 1000.0, 2)
+        return None
+
+    return {
+        "samples": int(n),
+        "mean_ms": round((after["sum"] - before["sum"]) / n * 1000.0, 3),
+        "p50_le_ms": upper(0.50),
+        "p99_le_ms": upper(0.99),
+        "max_le_ms": upper(1.0),
+    }
+
+
+async def scrape_loop_lag(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    try:
+        resp = await client.get("/metrics")
+    except httpx.HTTPError:
+        return None
+    if resp.status_code != 200:
+        return None
+    return parse_histogram(resp.text, "event_loop_lag_seconds")
+
+
+# ==============================
+# 오디오 청크 (프런트와 같은 발화 구간)
+# ==============================
+class WavClip:
+    def __init__(self, path: Path):
+        with wave.open(str(path), "rb") as w:
+            self.params = w.getparams()
+            self.frames = w.readframes(w.getnframes())
+        self.rate = self.params.framerate
+        self.block = self.params.nchannels * self.params.sampwidth
+        self.duration = len(self.frames) / float(self.block * self.rate)
+        segs = build_envelope(path)["segments"]["items"]
+        self.segments: List[Tuple[float, float]] = [(s["start"], s["end"]) for s in segs] or [(0.0, self.duration)]
+
+    def chunk(self, start: float, end: float, salt: Optional[int] = None) -> bytes:
+        """[start, end) 초 구간 WAV. salt를 주면 마지막 샘플만 바꿔 캐시 키를 다르게"""
+        a = int(start * self.rate) * self.block
+        b = max(a + self.block, int(end * self.rate) * self.block)
+        pcm = bytearray(self.frames[a:b])
+        if salt is not None and len(pcm) >= 4:
+            struct.pack_into("<I", pcm, len(pcm) - 4, salt & 0xFFFFFFFF)
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(self.params.nchannels)
+            w.setsampwidth(self.params.sampwidth)
+            w.setframerate(self.rate)
+            w.writeframes(bytes(pcm))
+        return buf.getvalue()
+
+
+# ==============================
+# 프로세스 (fake whisper + 앱)
+# ==============================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(url: str, timeout_s: float = 30.0):
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient(timeout=2.0) as c:
+        while time.monotonic() < deadline:
+            try:
+                if (await c.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"not ready: {url}")
+
+
+class Stack:
+    """fake whisper + 앱 프로세스 묶음 (--target 이면 아무것도 띄우지 않음)"""
+
+    def __init__(self, args):
+        self.args = args
+        self.procs: List[subprocess.Popen] = []
+        self.base_url = args.target
+        self.whisper_url: Optional[str] = None
+        self.tmp: Optional[tempfile.TemporaryDirectory] = None
+
+    async def __aenter__(self) -> "Stack":
+        if self.base_url:
+            return self
+        a = self.args
+        self.tmp = tempfile.TemporaryDirectory(prefix="bench-")
+        wport, aport = free_port(), free_port()
+        self.whisper_url = f"http://127.0.0.1:{wport}"
+        self.procs.append(subprocess.Popen([
+            sys.executable, str(ROOT / "test" / "fake_whisper.py"), "--port", str(wport),
+            "--latency-ms", str(a.whisper_latency_ms), "--jitter-ms", str(a.whisper_jitter_ms),
+            "--rtf", str(a.whisper_rtf), "--gpu-slots", str(a.gpu_slots), "--script", str(a.script),
+        ], cwd=str(ROOT)))
+        await wait_ready(self.whisper_url + "/health")
+
+        env = dict(os.environ)
+        env.update({
+            "AUDIO_FILE": str(Path(a.wav).resolve()),
+            "SCRIPT_FILE": str(Path(a.script).resolve()),
+            "WHISPER_HTTP_URL": self.whisper_url + "/stt",
+            "WHISPER_HTTP_URLS": "",
+            "WHISPER_BATCH_PATH": "/stt-batch" if a.batch else "",
+            "CACHE_DIR": self.tmp.name,
+            "STT_CACHE_DISK": "0",
+        })
+        for kv in a.app_env:
+            k, _, v = kv.partition("=")
+            env[k] = v
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(aport),
+               "--log-level", "warning"]
+        if a.workers > 1:
+            cmd += ["--workers", str(a.workers)]
+            env.setdefault("WORKERS", str(a.workers))  # 워커 간 공유 상태(세션/전사 캐시) 켜기
+            # /metrics 합본에서 다른 워커 값이 늦는 폭을 단계 길이보다 충분히 짧게
+            env.setdefault("METRICS_PUBLISH_INTERVAL_S", "0.5")
+        self.procs.append(subprocess.Popen(cmd, cwd=str(ROOT), env=env))
+        self.base_url = f"http://127.0.0.1:{aport}"
+        await wait_ready(self.base_url + "/health")
+        return self
+
+    async def __aexit__(self, *exc):
+        for p in reversed(self.procs):
+            p.terminate()
+        for p in self.procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        if self.tmp is not None:
+            self.tmp.cleanup()
+
+
+# ==============================
+# 워크로드 (요청 1회 → (status, 응답 바이트))
+# ==============================
+Request = Callable[[httpx.AsyncClient, int, int], Awaitable[Tuple[int, int]]]
+
+
+class Workloads:
+    def __init__(self, clip: WavClip, lines: List[str], audio_size: int, script_etag: Optional[str], cache_hit_ratio: float):
+        self.clip = clip
+        self.lines = lines or ["테스트 문장"]
+        self.audio_size = audio_size
+        self.script_etag = script_etag
+        self.cache_hit_ratio = cache_hit_ratio
+        self._salt = 0
+        # 캐시 적중용 고정 페이로드 (구간별 1개)
+        self._fixed = [clip.chunk(s, e) for s, e in clip.segments]
+
+    async def stt_proxy(self, client: httpx.AsyncClient, worker: int, i: int) -> Tuple[int, int]:
+        seg = i % len(self.clip.segments)
+        if random.random() < self.cache_hit_ratio:
+            data = self._fixed[seg]
+        else:
+            self._salt += 1
+            data = self.clip.chunk(*self.clip.segments[seg], salt=self._salt)
+        resp = await client.post("/stt-proxy", files={"file": ("chunk.wav", data, "audio/wav")})
+        return resp.status_code, resp.num_bytes_downloaded
+
+    async def similar(self, client: httpx.AsyncClient, worker: int, i: int) -> Tuple[int, int]:
+        line = self.lines[(worker * 7 + i) % len(self.lines)]
+        # 전사 오류 흉내: 글자 10% 탈락
+        text = "".join(ch for ch in line if random.random() > 0.1)
+        payload: Dict[str, Any] = {"text": text}
+        if i % 4 == 0:
+            payload["session"] = f"bench-{worker}"
+        resp = await client.post("/similar", json=payload)
+        return resp.status_code, resp.num_bytes_downloaded
+
+    async def audio(self, client: httpx.AsyncClient, worker: int, i: int) -> Tuple[int, int]:
+        span = 64 * 1024
+        start = random.randrange(0, max(1, self.audio_size - span))
+        resp = await client.get("/audio", headers={"Range": f"bytes={start}-{start + span - 1}"})
+        return resp.status_code, resp.num_bytes_downloaded
+
+    async def script(self, client: httpx.AsyncClient, worker: int, i: int) -> Tuple[int, int]:
+        headers = {"Accept-Encoding": "br, gzip"}
+        if self.script_etag and i % 2:
+            headers["If-None-Match"] = self.script_etag
+        resp = await client.get("/script", headers=headers)
+        return resp.status_code, resp.num_bytes_downloaded
+
+    def get(self, name: str) -> Request:
+        return {
+            "stt-proxy": self.stt_proxy,
+            "similar": self.similar,
+            "audio": self.audio,
+            "script": self.script,
+        }[name]
+
+
+async def run_closed_loop(client: httpx.AsyncClient, fn: Request, concurrency: int, duration_s: float, warmup_s: float) -> Dict[str, Any]:
+    """동시성 c개 워커가 duration_s 동안 응답을 받자마자 다음 요청 (워밍업 구간은 집계 제외)"""
+    lat: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    nbytes = 0
+    t_start = time.monotonic()
+    t_measure = t_start + warmup_s
+    t_end = t_measure + duration_s
+
+    async def worker(w: int):
+        nonlocal errors, nbytes
+        i = 0
+        while True:
+            t0 = time.monotonic()
+            if t0 >= t_end:
+                return
+            try:
+                status, size = await fn(client, w, i)
+            except httpx.HTTPError as e:
+                status, size = type(e).__name__, 0
+            t1 = time.monotonic()
+            i += 1
+            if t0 < t_measure:
+                continue
+            lat.append(t1 - t0)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            nbytes += size
+            if not isinstance(status, int) or status >= 400:
+                errors += 1
+
+    await asyncio.gather(*[worker(w) for w in range(concurrency)])
+    wall = max(1e-9, time.monotonic() - t_measure)
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(lat) / wall, 2),
+        "bytes_per_s": round(nbytes / wall, 1),
+        "errors": errors,
+        "status": statuses,
+        "latency": summarize_latency(lat),
+    }
+
+
+# ==============================
+# 재생 리플레이 (관객 N명 × 실시간 청크)
+# ==============================
+async def run_replay(client: httpx.AsyncClient, clip: WavClip, audiences: int, loops: int, speed: float, mode: str) -> Dict[str, Any]:
+    """
+    관객마다 재생 시작 시각을 조금씩 엇갈리게 하고, 발화 구간이 끝나는 시점(재생 속도 반영)에
+    STT → /similar(세션)를 호출. behind_s = 응답 완료 시각 - 구간 종료 시각 (화면 반영 지연)
+    """
+    stt_lat: List[float] = []
+    sim_lat: List[float] = []
+    e2e_lat: List[float] = []
+    errors = 0
+    cached = 0
+    chunks = {seg: clip.chunk(*seg) for seg in clip.segments}
+
+    async def audience(a: int):
+        nonlocal errors, cached
+        await asyncio.sleep(random.uniform(0, 0.5))
+        sid = f"replay-{a}"
+        await client.delete(f"/session/{sid}")
+        for _ in range(loops):
+            t0 = time.monotonic()
+            for seg in clip.segments:
+                due = t0 + seg[1] / speed
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+                s0 = time.monotonic()
+                try:
+                    if mode == "range":
+                        resp = await client.post("/stt-range", json={"start": seg[0], "end": seg[1]})
+                    else:
+                        resp = await client.post("/stt-proxy", files={"file": ("chunk.wav", chunks[seg], "audio/wav")})
+                    s1 = time.monotonic()
+                    body = resp.json() if resp.status_code == 200 else {}
+                    if resp.status_code != 200:
+                        errors += 1
+                        continue
+                    cached += bool(body.get("cached"))
+                    sim = await client.post("/similar", json={"text": body.get("text") or "", "session": sid})
+                    s2 = time.monotonic()
+                    if sim.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                stt_lat.append(s1 - s0)
+                sim_lat.append(s2 - s1)
+                e2e_lat.append(s2 - due)
+            # 다음 재생은 파일 길이만큼 지난 뒤
+            await asyncio.sleep(max(0.0, t0 + clip.duration / speed - time.monotonic()))
+
+    t_start = time.monotonic()
+    await asyncio.gather(*[audience(a) for a in range(audiences)])
+    wall = max(1e-9, time.monotonic() - t_start)
+    return {
+        "audiences": audiences,
+        "loops": loops,
+        "speed": speed,
+        "mode": mode,
+        "segments": len(clip.segments),
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(stt_lat) / wall, 2),
+        "errors": errors,
+        "cached_fraction": round(cached / len(stt_lat), 3) if stt_lat else None,
+        "latency": summarize_latency(stt_lat),
+        "similar": summarize_latency(sim_lat),
+        "behind": summarize_latency(e2e_lat),
+    }
+
+
+# ==============================
+# 비교
+# ==============================
+def compare(prev: Dict[str, Any], cur: Dict[str, Any], threshold_pct: float) -> List[str]:
+    """공통 시나리오별 p95 / 처리량 변화 출력 → 기준을 넘은 회귀 목록"""
+    regressions = []
+    print(f"\n{'scenario':<22}{'p95 ms':>20}{'rps':>20}")
+    for key, now in cur["results"].items():
+        old = prev.get("results", {}).get(key)
+        if old is None:
+            continue
+        p_old, p_new = old["latency"].get("p95_ms"), now["latency"].get("p95_ms")
+        r_old, r_new = old.get("throughput_rps"), now.get("throughput_rps")
+        dp = (p_new - p_old) / p_old * 100.0 if p_old and p_new is not None else 0.0
+        dr = (r_new - r_old) / r_old * 100.0 if r_old and r_new is not None else 0.0
+        flag = ""
+        if dp > threshold_pct or -dr > threshold_pct:
+            flag = "  ⚠️ regression"
+            regressions.append(key)
+        print(f"{key:<22}{f'{p_old}→{p_new} ({dp:+.0f}%)':>20}{f'{r_old}→{r_new} ({dr:+.0f}%)':>20}{flag}")
+    return regressions
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_row(key: str, r: Dict[str, Any], server_lag: Optional[Dict[str, Any]]):
+    lt = r["latency"]
+    lag = f"loop p99≤{server_lag.get('p99_le_ms')}ms" if server_lag and server_lag.get("samples") else "loop n/a"
+    print(f"  {key:<20} {r['throughput_rps']:>8} rps  p50 {lt['p50_ms']}  p95 {lt['p95_ms']}  p99 {lt['p99_ms']} ms"
+          f"  err {r['errors']}  {lag}")
+
+
+# ==============================
+# 실행
+# ==============================
+async def main(args) -> int:
+    clip = WavClip(Path(args.wav))
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    scenarios = [s for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS + ("replay",)]
+    if unknown:
+        print(f"❌ unknown scenario: {unknown}")
+        return 2
+
+    results: Dict[str, Any] = {}
+    async with Stack(args) as stack:
+        limits = httpx.Limits(max_connections=max(levels + [args.audiences]) + 8, max_keepalive_connections=max(levels + [args.audiences]) + 8)
+        async with httpx.AsyncClient(base_url=stack.base_url, timeout=args.timeout, limits=limits) as client:
+            script = (await client.get("/script")).json()
+            lines = [ln["text"] for ln in script.get("lines", [])]
+            etag = (await client.get("/script")).headers.get("etag")
+            head = await client.head("/audio")
+            audio_size = int(head.headers.get("content-length", 0))
+            work = Workloads(clip, lines, audio_size, etag, args.cache_hit_ratio)
+            probe = LoopLagProbe()
+            print(f"🎯 {stack.base_url}  segments={len(clip.segments)}  script_lines={len(lines)}")
+
+            if "replay" in scenarios:
+                mode = args.replay_mode or ("range" if not args.target else "proxy")
+                before = await scrape_loop_lag(client)
+                probe.start()
+                r = await run_replay(client, clip, args.audiences, args.replay_loops, args.speed, mode)
+                r["client_loop_lag"] = await probe.stop()
+                r["server_loop_lag"] = histogram_delta(before, await scrape_loop_lag(client))
+                key = f"replay@a{args.audiences}"
+                results[key] = r
+                _print_row(key, r, r["server_loop_lag"])
+
+            for name in scenarios:
+                if name == "replay":
+                    continue
+                for c in levels:
+                    before = await scrape_loop_lag(client)
+                    probe.start()
+                    r = await run_closed_loop(client, work.get(name), c, args.duration, args.warmup)
+                    r["client_loop_lag"] = await probe.stop()
+                    r["server_loop_lag"] = histogram_delta(before, await scrape_loop_lag(client))
+                    key = f"{name}@c{c}"
+                    results[key] = r
+                    _print_row(key, r, r["server_loop_lag"])
+
+            health = (await client.get("/health")).json()
+
+    out = {
+        "meta": {
+            "label": args.label,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "target": args.target or "local",
+            "args": vars(args),
+            "server_health": health,
+        },
+        "results": results,
+    }
+    path = Path(args.out) if args.out else ROOT / "test" / "results" / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 {path}")
+
+    if args.compare:
+        prev = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(prev, out, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="STT 프록시 / 유사도 / 미디어 부하 벤치마크")
+    parser.add_argument("--target", default="", help="이미 떠 있는 서버 URL (비우면 로컬에 fake whisper + 앱 기동)")
+    parser.add_argument("--wav", default=str(ROOT / "media" / "short_sample.wav"))
+    parser.add_argument("--script", default=str(ROOT / "media" / "scripts.txt"))
+    parser.add_argument("--scenarios", default="replay," + ",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="시나리오×동시성 단계별 측정 시간(초)")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.0, help="/stt-proxy 요청 중 같은 페이로드 재전송 비율")
+    parser.add_argument("--audiences", type=int, default=8, help="replay 동시 관객 수")
+    parser.add_argument("--replay-loops", type=int, default=3)
+    parser.add_argument("--replay-mode", choices=("range", "proxy"), default=None)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay 재생 배속")
+    # 로컬 기동 시 fake whisper / 앱 설정
+    parser.add_argument("--whisper-latency-ms", type=float, default=300.0)
+    parser.add_argument("--whisper-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--whisper-rtf", type=float, default=0.0)
+    parser.add_argument("--gpu-slots", type=int, default=0)
+    parser.add_argument("--batch", action="store_true", help="WHISPER_BATCH_PATH=/stt-batch")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn --workers")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="앱 환경 변수 (반복 가능)")
+    # 결과
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", default="")
+    parser.add_argument("--compare", default="", help="이전 결과 JSON")
+    parser.add_argument("--threshold", type=float, default=10.0, help="회귀 판정 기준(%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
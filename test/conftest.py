@@ -0,0 +1,31 @@
+# ==============================================
+# conftest.py — 테스트 공통 설정 / 픽스처
+# ==============================================
+"""
+실행:
+    python -m pytest -q test/
+"""
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from whisper_client import WhisperClient  # noqa: E402
+
+URLS = ["http://a.local/stt", "http://b.local/stt", "http://c.local/stt"]
+
+
+@pytest.fixture
+def mock_whisper():
+    """
+    실제 Whisper 없이 httpx.MockTransport(handler) 위에서 도는 WhisperClient 팩토리.
+    헬스 체크 루프는 기본으로 끔 (start()는 각 테스트의 이벤트 루프 안에서)
+    """
+    def make(handler, urls=URLS, **kwargs) -> WhisperClient:
+        kwargs.setdefault("health_interval_s", 0)
+        return WhisperClient(urls, transport=httpx.MockTransport(handler), **kwargs)
+    return make
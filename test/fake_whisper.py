@@ -0,0 +1,159 @@
+# ==============================================
+# fake_whisper.py — 벤치마크용 로컬 Whisper 대역 (지연/지터/GPU 슬롯 설정)
+# ==============================================
+"""
+fake_whisper.py
+---------------
+✅ GPU 서버 없이 STT 경로 부하를 재현
+   - POST /stt          multipart "file"  → {"text", "elapsed_s"}
+   - POST /stt-batch    multipart "files" → {"results": [...]}  (WHISPER_BATCH_PATH=/stt-batch)
+   - GET  /health, GET /stats
+   - 처리 시간 = latency ± jitter + 오디오 길이 × rtf, 동시 처리는 gpu_slots개 (나머지는 대기)
+   - --script 를 주면 업로드 해시로 대본 줄을 골라 돌려줌 → /similar 까지 실제와 비슷한 경로
+
+실행:
+    python test/fake_whisper.py --port 5001 --latency-ms 300 --jitter-ms 100 --gpu-slots 4
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import struct
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, UploadFile, File
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from script_loader import load_script_lines  # noqa: E402
+
+
+LATENCY_S = float(os.getenv("FAKE_WHISPER_LATENCY_MS", "300")) / 1000.0
+JITTER_S = float(os.getenv("FAKE_WHISPER_JITTER_MS", "50")) / 1000.0
+RTF = float(os.getenv("FAKE_WHISPER_RTF", "0"))            # 오디오 1초당 추가 처리 시간(초)
+GPU_SLOTS = int(os.getenv("FAKE_WHISPER_GPU_SLOTS", "0"))  # 0 = 무제한
+SCRIPT_PATH = os.getenv("FAKE_WHISPER_SCRIPT", "")
+
+_state = {"lines": [], "slots": None, "requests": 0, "batches": 0, "active": 0, "peak_active": 0, "started": time.time()}
+
+
+def _audio_seconds(data: bytes) -> float:
+    """RIFF 헤더에서 길이 추정 (실패 시 0)"""
+    try:
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            return 0.0
+        pos = 12
+        byte_rate = 0
+        while pos + 8 <= len(data):
+            cid = data[pos:pos + 4]
+            csize = struct.unpack_from("<I", data, pos + 4)[0]
+            if cid == b"fmt ":
+                byte_rate = struct.unpack_from("<I", data, pos + 16)[0]
+            elif cid == b"data":
+                return (len(data) - pos - 8) / float(byte_rate) if byte_rate else 0.0
+            pos += 8 + csize + (csize & 1)
+    except struct.error:
+        pass
+    return 0.0
+
+
+def _text_for(data: bytes) -> str:
+    if not _state["lines"]:
+        return f"len={len(data)}"
+    h = int.from_bytes(hashlib.sha1(data).digest()[:4], "big")
+    return _state["lines"][h % len(_state["lines"])]
+
+
+async def _process(data: bytes) -> float:
+    """GPU 슬롯 1개를 잡고 처리 시간만큼 대기 → 처리 시간(초)"""
+    cost = max(0.0, LATENCY_S + random.uniform(-JITTER_S, JITTER_S)) + RTF * _audio_seconds(data)
+    slots: Optional[asyncio.Semaphore] = _state["slots"]
+    if slots is not None:
+        await slots.acquire()
+    _state["active"] += 1
+    _state["peak_active"] = max(_state["peak_active"], _state["active"])
+    try:
+        await asyncio.sleep(cost)
+    finally:
+        _state["active"] -= 1
+        if slots is not None:
+            slots.release()
+    return round(cost, 3)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _state["slots"] = asyncio.Semaphore(GPU_SLOTS) if GPU_SLOTS > 0 else None
+    if SCRIPT_PATH:
+        _state["lines"] = load_script_lines(SCRIPT_PATH)
+    yield
+
+
+app = FastAPI(title="fake whisper", lifespan=lifespan)
+
+
+@app.post("/stt")
+async def stt(file: UploadFile = File(...)):
+    data = await file.read()
+    _state["requests"] += 1
+    elapsed = await _process(data)
+    return JSONResponse({"text": _text_for(data), "elapsed_s": elapsed})
+
+
+@app.post("/stt-batch")
+async def stt_batch(files: List[UploadFile] = File(...)):
+    blobs = [await f.read() for f in files]
+    _state["batches"] += 1
+    _state["requests"] += len(blobs)
+    # 배치는 슬롯 1개로 한 번에 (가장 긴 항목 기준)
+    elapsed = await _process(max(blobs, key=len))
+    return JSONResponse({"results": [{"text": _text_for(b), "elapsed_s": elapsed} for b in blobs]})
+
+
+@app.get("/health")
+async def health():
+    return {"ok": True}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": _state["requests"],
+        "batches": _state["batches"],
+        "active": _state["active"],
+        "peak_active": _state["peak_active"],
+        "uptime_s": round(time.time() - _state["started"], 1),
+        "latency_ms": LATENCY_S * 1000.0,
+        "jitter_ms": JITTER_S * 1000.0,
+        "rtf": RTF,
+        "gpu_slots": GPU_SLOTS,
+    }
+
+
+# -------------------------
+# 실행
+# -------------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="로컬 Whisper 대역 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_S * 1000.0)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_S * 1000.0)
+    parser.add_argument("--rtf", type=float, default=RTF)
+    parser.add_argument("--gpu-slots", type=int, default=GPU_SLOTS)
+    parser.add_argument("--script", default=SCRIPT_PATH)
+    args = parser.parse_args()
+
+    LATENCY_S = args.latency_ms / 1000.0
+    JITTER_S = args.jitter_ms / 1000.0
+    RTF = args.rtf
+    GPU_SLOTS = args.gpu_slots
+    SCRIPT_PATH = args.script
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
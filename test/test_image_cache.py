@@ -0,0 +1,33 @@
+# ==============================================
+# test_image_cache.py — Accept 협상 (q 값)
+# ==============================================
+import pytest
+
+from image_cache import ImageCache
+
+
+@pytest.fixture
+def images(tmp_path):
+    cache = ImageCache(tmp_path, tmp_path)
+    cache.formats = ["avif", "webp", "jpeg"]  # 설치된 Pillow 플러그인과 무관하게 규칙만 확인
+    return cache
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "jpeg"),
+    ("*/*", "jpeg"),
+    ("image/*", "jpeg"),
+    ("image/avif,image/webp,image/apng,image/*,*/*;q=0.8", "avif"),
+    ("image/webp,*/*", "webp"),
+    ("image/avif;q=0, image/webp", "webp"),
+    ("image/avif;q=0, image/webp;q=0, */*", "jpeg"),
+    ("image/avif;q=0.5, image/webp;q=0.9", "webp"),
+    ("IMAGE/AVIF", "avif"),
+])
+def test_negotiate_uses_q_values(images, accept, expected):
+    assert images.negotiate(accept) == expected
+
+
+def test_negotiate_without_pillow_serves_original(images):
+    images.formats = []
+    assert images.negotiate("image/avif") is None
@@ -0,0 +1,137 @@
+# ==============================================
+# test_media_server.py — MediaFile 캐시의 fd/mmap 수명
+# ==============================================
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import media_server
+from media_server import PrecompressedBody, get_media_file, serve_media
+
+
+def _write(path: Path, data: bytes):
+    """임시 파일 → os.replace (배포/파생본 생성과 같은 방식: 새 inode)"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    # mtime 해상도가 거친 파일 시스템에서도 "바뀜"으로 보이게
+    st = tmp.stat()
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    os.replace(tmp, path)
+
+
+def _fresh_cache():
+    with media_server._CACHE_LOCK:
+        for key in list(media_server._CACHE):
+            media_server._drop(key)
+
+
+async def _stream(response, pause: asyncio.Event):
+    """본문 첫 청크를 보낸 뒤 pause가 풀릴 때까지 대기하는 ASGI send"""
+    chunks = []
+
+    async def send(msg):
+        if msg["type"] == "http.response.body":
+            chunks.append(msg["body"])
+            if len(chunks) == 1:
+                await pause.wait()
+
+    scope = {"type": "http", "method": "GET", "extensions": {}}
+    await response(scope, None, send)
+    return b"".join(chunks)
+
+
+def test_replaced_entry_closed_after_inflight_response():
+    async def run():
+        _fresh_cache()
+        media_server.SEND_CHUNK = 4
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / "a.wav"
+            _write(path, b"0123456789")
+            old = get_media_file(path)
+            pause = asyncio.Event()
+            task = asyncio.ensure_future(_stream(serve_media(path), pause))
+            await asyncio.sleep(0.01)
+            fd = old._fd
+            assert fd is not None
+
+            _write(path, b"abcdefghijkl")
+            old.checked_at = 0.0
+            new = get_media_file(path)
+            assert new is not old
+            os.fstat(fd)  # 전송 중 → 아직 열려 있음
+
+            pause.set()
+            assert await task == b"0123456789"
+            assert old._fd is None and old._mm is None  # 마지막 응답이 끝나면서 닫힘
+        _fresh_cache()
+        media_server.SEND_CHUNK = 256 * 1024
+
+    asyncio.run(run())
+
+
+def test_cache_is_bounded_and_closes_evicted():
+    _fresh_cache()
+    saved = media_server.MAX_CACHE_ENTRIES
+    media_server.MAX_CACHE_ENTRIES = 4
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            entries = []
+            for i in range(10):
+                p = Path(d) / f"{i}.bin"
+                _write(p, b"x" * (i + 1))
+                mf = get_media_file(p)
+                mf.view().release()
+                entries.append(mf)
+            assert len(media_server._CACHE) == 4
+            assert all(mf._fd is None for mf in entries[:6])
+            assert all(mf._fd is not None for mf in entries[6:])
+    finally:
+        media_server.MAX_CACHE_ENTRIES = saved
+        _fresh_cache()
+
+
+def test_missing_files_are_dropped():
+    _fresh_cache()
+    with tempfile.TemporaryDirectory() as d:
+        keep, gone = Path(d) / "keep.bin", Path(d) / "gone.bin"
+        _write(keep, b"k")
+        _write(gone, b"g")
+        gone_mf = get_media_file(gone)
+        gone_mf.fileno()
+        gone.unlink()
+        media_server._last_sweep = 0.0
+        new = Path(d) / "new.bin"
+        _write(new, b"n")
+        get_media_file(new)  # 새 엔트리 추가 시 주기 정리
+        assert str(gone) not in media_server._CACHE
+        assert gone_mf._fd is None
+        get_media_file(keep).checked_at = 0.0
+        keep.unlink()
+        try:
+            get_media_file(keep)
+            raise AssertionError("expected FileNotFoundError")
+        except FileNotFoundError:
+            pass
+        assert str(keep) not in media_server._CACHE
+    _fresh_cache()
+
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "identity"),
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, *", "gzip"),
+    ("br;q=0, gzip;q=0, *", "identity"),
+    ("*;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("br;q=abc, gzip", "gzip"),
+    ("BR; Q=0.5", "br"),
+])
+def test_precompressed_choose_respects_explicit_q(header, expected):
+    body = PrecompressedBody(b'{"x": "' + b"a" * 4096 + b'"}')
+    body.variants.setdefault("br", body.variants["gzip"])  # brotli 미설치 환경에서도 선택 규칙만 확인
+    assert body.choose(header) == expected
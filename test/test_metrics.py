@@ -0,0 +1,53 @@
+# ==============================================
+# test_metrics.py — 멀티 워커 /metrics 합본
+# ==============================================
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from metrics import Registry, WorkerExposition
+
+
+def _worker(state_dir: Path, worker: str, requests: int):
+    """워커 1개 흉내: 프로세스별 레지스트리 + 같은 공유 디렉터리"""
+    reg = Registry()
+    reg.counter("reqs_total", "Requests", ["route"]).labels(route="/stt").inc(requests)
+    lag = reg.histogram("lag_seconds", "Loop lag", buckets=(0.01, 0.1))
+    for _ in range(requests):
+        lag.observe(0.05)
+    return WorkerExposition(reg, state_dir, worker=worker, stale_s=30.0)
+
+
+def test_any_worker_exposes_all_workers():
+    with tempfile.TemporaryDirectory() as d:
+        a, b = _worker(Path(d), "101", 3), _worker(Path(d), "202", 5)
+        b.publish()
+        text = a.render()
+        assert text.count("# TYPE reqs_total counter") == 1
+        assert 'reqs_total{route="/stt",worker="101"} 3' in text
+        assert 'reqs_total{route="/stt",worker="202"} 5' in text
+        assert 'lag_seconds_bucket{worker="202",le="0.1"} 5' in text
+        assert 'lag_seconds_count{worker="101"} 3' in text
+        # 반대쪽 워커가 받아도 같은 시계열
+        assert 'reqs_total{route="/stt",worker="101"} 3' in b.render()
+
+
+def test_stale_and_removed_workers_are_dropped():
+    with tempfile.TemporaryDirectory() as d:
+        a, b, c = _worker(Path(d), "101", 1), _worker(Path(d), "202", 1), _worker(Path(d), "303", 1)
+        b.publish()
+        c.publish()
+        old = time.time() - 60
+        os.utime(b.path, (old, old))  # 갱신이 끊긴 워커
+        c.remove()                    # 정상 종료한 워커
+        text = a.render()
+        assert 'worker="101"' in text
+        assert 'worker="202"' not in text and 'worker="303"' not in text
+
+
+def test_single_process_render_has_no_worker_label():
+    reg = Registry()
+    reg.counter("reqs_total", "Requests").inc()
+    assert reg.render().splitlines()[-1] == "reqs_total 1"
+
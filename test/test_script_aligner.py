@@ -0,0 +1,40 @@
+# ==============================================
+# test_script_aligner.py — 오프라인 정렬: 구간 전사 실패 처리
+# ==============================================
+import asyncio
+
+import httpx
+
+from conftest import ROOT
+from script_aligner import transcribe_segments, align_transcripts
+from script_index import ScriptIndex
+
+AUDIO = ROOT / "media" / "short_sample.wav"
+
+
+def test_failed_segment_keeps_the_others(mock_whisper):
+    calls = {"n": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        if calls["n"] == 2:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"text": "첫 번째 줄", "elapsed_s": 0.01})
+
+    client = mock_whisper(handler, ["http://a.local/stt"], failure_threshold=10)
+    segments = [(0.0, 0.5), (0.5, 1.0), (1.0, 1.5), (1.5, 2.0)]
+
+    async def run():
+        await client.start()
+        try:
+            return await transcribe_segments(client, None, AUDIO, segments)
+        finally:
+            await client.close()
+
+    texts, errors = asyncio.run(run())
+    assert len(texts) == 4 and texts.count(None) == 1 and len(errors) == 1
+    assert all(t == "첫 번째 줄" for t in texts if t is not None)
+
+    index = ScriptIndex(["첫 번째 줄", "두 번째 줄"])
+    entries = align_transcripts(index, segments, texts)
+    assert len(entries) == 3 and all(e[2] == 0 for e in entries)
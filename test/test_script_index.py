@@ -0,0 +1,126 @@
+# ==============================================
+# test_script_index.py — ScriptIndex 질의 / mmap 인덱스 파일
+# ==============================================
+import json
+import random
+
+import pytest
+
+from conftest import ROOT
+from script_loader import load_script_with_scenes
+from script_index import ScriptIndex, MappedScriptIndex
+from script_catalog import ScriptCatalog
+from scoring_pool import ScoringPool, PooledIndex
+
+SCRIPT = ROOT / "media" / "scripts.txt"
+
+
+@pytest.fixture(scope="module")
+def real_index() -> ScriptIndex:
+    return ScriptIndex.from_script_data(load_script_with_scenes(str(SCRIPT)))
+
+
+@pytest.fixture(scope="module")
+def big_index(real_index) -> ScriptIndex:
+    """prune_above(64줄)를 넘는 대본 — 역색인 가지치기 경로"""
+    rnd = random.Random(7)
+    lines = [f"{rnd.choice(real_index.lines)} {i} {rnd.choice(real_index.lines)[:10]}" for i in range(300)]
+    return ScriptIndex(lines, [i // 30 + 1 for i in range(300)])
+
+
+def _queries(index: ScriptIndex):
+    return [t[:20] for t in index.lines[::5]] + ["", "!!!", "전혀 상관없는 문장"]
+
+
+@pytest.mark.parametrize("which", ["real_index", "big_index"])
+def test_mapped_index_matches_in_memory(which, request, tmp_path):
+    index = request.getfixturevalue(which)
+    index.save(tmp_path / "a.idx")
+    mapped = MappedScriptIndex(tmp_path / "a.idx")
+    assert list(mapped.lines) == index.lines and list(mapped.scenes) == index.scenes
+    subset = list(range(0, len(index), 3))
+    for q in _queries(index):
+        assert mapped.query(q, None, 3) == index.query(q, None, 3)
+        assert mapped.query(q, subset, 2) == index.query(q, subset, 2)
+    assert mapped.query_batch(_queries(index), None, 2) == index.query_batch(_queries(index), None, 2)
+    json.dumps(mapped.query_batch(_queries(index), subset, 2))  # numpy/memoryview 값이 섞이지 않음
+
+
+def test_mapped_index_rejects_other_files(tmp_path):
+    bad = tmp_path / "bad.idx"
+    bad.write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        MappedScriptIndex(bad)
+
+
+def test_catalog_maps_one_index_file_shared_with_scoring_pool(tmp_path):
+    pool = ScoringPool(1)
+    try:
+        catalogs = [ScriptCatalog(SCRIPT, cache_dir=tmp_path, scoring_pool=pool) for _ in range(2)]
+        a, b = (c.get() for c in catalogs)  # 워커 2개 흉내
+        assert isinstance(a.index, MappedScriptIndex) and a.index.path == b.index.path
+        assert len(list((tmp_path / "scripts").glob("*.idx"))) == 1
+        assert isinstance(a.scorer, PooledIndex)
+        q = a.lines[3][:12]
+        assert a.scorer.query(q, None, 2) == a.index.query(q, None, 2)
+        assert pool.calls == 1 and pool.fallbacks == 0
+    finally:
+        pool.shutdown()
+
+
+# ---------------------------
+# 정규화 / 질의
+# ---------------------------
+def test_normalize_for_match():
+    from script_index import normalize_for_match, char_ngrams
+    assert normalize_for_match("  Hello,   World!! ") == "hello world"
+    assert normalize_for_match("안녕…  하세요?") == "안녕 하세요"
+    assert normalize_for_match(None) == ""
+    assert char_ngrams("ab cd") == {"ab", "bc", "cd"}
+    assert char_ngrams("가") == {"가"} and char_ngrams("") == set()
+
+
+def test_exact_line_is_found_with_its_scene(real_index):
+    for i in (0, len(real_index) // 2, len(real_index) - 1):
+        best = real_index.query(real_index.lines[i])[0]
+        assert best["idx"] == i and best["score_pct"] == 100.0 and best["scene"] == real_index.scenes[i]
+    assert real_index.query("") == [] and real_index.query("?!") == []
+
+
+def test_candidates_restrict_the_search(real_index):
+    cand = real_index.clean_candidates([3, 3.0, 4, -1, 10 ** 6, "x"])
+    assert cand == [3, 4]
+    found = real_index.query(real_index.lines[0], cand, top_k=5)
+    assert {m["idx"] for m in found} <= {3, 4}
+
+
+def test_pruning_above_threshold(big_index):
+    assert len(big_index) > big_index.prune_above
+    q = big_index.lines[123]
+    cand = big_index._candidates(big_index.norm[123], None)
+    assert 123 in cand and len(cand) <= big_index.max_candidates
+    assert big_index.query(q)[0]["idx"] == 123
+    small = ScriptIndex(big_index.lines[:big_index.prune_above])
+    assert small._candidates(small.norm[5], None) == list(range(big_index.prune_above))  # 가지치기 없이 전체
+
+
+@pytest.fixture(params=["rapidfuzz", "difflib"])
+def scorer(request, monkeypatch):
+    import difflib
+    import script_index
+    if request.param == "rapidfuzz":
+        if not script_index._HAS_RAPIDFUZZ:
+            pytest.skip("rapidfuzz not installed")
+    else:
+        monkeypatch.setattr(script_index, "_HAS_RAPIDFUZZ", False)
+        monkeypatch.setattr(script_index, "SequenceMatcher", difflib.SequenceMatcher, raising=False)
+    return request.param
+
+
+@pytest.mark.parametrize("which", ["real_index", "big_index"])
+def test_query_batch_matches_query(which, request, scorer):
+    index = request.getfixturevalue(which)
+    texts = _queries(index)
+    for cand in (None, list(range(0, len(index), 2))):
+        for top_k in (1, 3):
+            assert index.query_batch(texts, cand, top_k) == [index.query(t, cand, top_k) for t in texts]
@@ -0,0 +1,113 @@
+# ==============================================
+# test_script_session.py — 후보 창 / 씬 진행도 / 세션 축출
+# ==============================================
+import pytest
+
+from script_index import ScriptIndex
+from script_session import SessionTracker, candidate_window
+
+LINES = [
+    "오늘 아침 시장에 다녀왔다",
+    "사과 세 개와 배를 샀다",
+    "집에 돌아오니 비가 내렸다",
+    "우산을 챙기지 못해 젖었다",
+    "따뜻한 차를 한 잔 마셨다",
+    "창밖으로 무지개가 떴다",
+    "저녁에는 친구에게 전화했다",
+    "내일 다시 만나기로 약속했다",
+]
+SCENES = [1, 1, 1, 2, 2, 2, 3, 3]
+
+
+@pytest.fixture
+def tracker() -> SessionTracker:
+    return SessionTracker(ScriptIndex(LINES, SCENES), back=1, ahead=2, max_ahead=8)
+
+
+# ---------------------------
+# candidate_window
+# ---------------------------
+def test_candidate_window_without_cursor_scores_everything():
+    assert candidate_window(None, 8) is None
+    assert candidate_window(3, 0) is None
+
+
+def test_candidate_window_is_clipped_to_script():
+    assert candidate_window(4, 10, back=2, ahead=3) == [2, 3, 4, 5, 6, 7]
+    assert candidate_window(0, 10, back=2, ahead=3) == [0, 1, 2, 3]
+    assert candidate_window(9, 10, back=2, ahead=3) == [7, 8, 9]
+    assert candidate_window(0, 1) == [0]
+
+
+# ---------------------------
+# observe / 씬 진행도
+# ---------------------------
+def test_scene_completes_only_after_every_line_and_the_last_line(tracker):
+    assert tracker.observe("s", LINES[0])["scene_completed"] is None
+    assert tracker.observe("s", LINES[2])["scene_completed"] is None  # 1번 줄을 건너뜀
+    assert tracker.observe("s", LINES[1])["scene_completed"] is None
+    assert tracker.observe("s", LINES[2])["scene_completed"] == 1
+    assert tracker.observe("s", LINES[2])["scene_completed"] is None  # 같은 씬은 한 번만
+    snap = tracker.snapshot("s")
+    assert snap["cursor"] == 2 and snap["matched"] == [0, 1, 2]
+    assert snap["completed_scenes"] == [1]
+
+
+def test_window_widens_on_fallback_and_resets_on_hit(tracker):
+    first = tracker.observe("s", LINES[0])
+    assert not first["fallback"] and first["matches"][0]["idx"] == 0
+
+    # 창(0..2) 밖의 줄 → 전체 재검색으로 찾고 다음 창을 두 배로
+    jump = tracker.observe("s", LINES[6])
+    assert jump["fallback"] and jump["matches"][0]["idx"] == 6
+    assert tracker.snapshot("s")["window"] == [1, 4]
+
+    assert tracker.observe("s", LINES[0])["fallback"]  # 창 5..7 밖 → 다시 넓힘, 상한 max_ahead
+    assert tracker.snapshot("s")["window"] == [1, 8]
+
+    hit = tracker.observe("s", LINES[1])
+    assert not hit["fallback"] and hit["matches"][0]["idx"] == 1
+    snap = tracker.snapshot("s")
+    assert snap["window"] == [1, 2] and snap["misses"] == 2 and snap["hits"] == 2
+
+
+def test_uncommitted_observe_leaves_state_untouched(tracker):
+    tracker.observe("s", LINES[0])
+    out = tracker.observe("s", LINES[5], commit=False)
+    assert out["matches"][0]["idx"] == 5
+    snap = tracker.snapshot("s")
+    assert snap["cursor"] == 0 and snap["window"] == [1, 2] and snap["misses"] == 0
+
+
+def test_low_score_moves_cursor_without_progress(tracker):
+    assert tracker.mark("s", 3, 50.0) is None
+    snap = tracker.snapshot("s")
+    assert snap["cursor"] == 3 and snap["matched"] == []
+    assert tracker.mark("s", 99, 100.0) is None and tracker.snapshot("s")["cursor"] == 3
+
+
+def test_mark_replays_timeline(tracker):
+    done = [tracker.mark("s", i, 95.0) for i in range(len(LINES))]
+    assert [s for s in done if s is not None] == [1, 2, 3]
+
+
+# ---------------------------
+# 세션 관리
+# ---------------------------
+def test_sessions_are_independent_and_evicted_by_capacity():
+    tracker = SessionTracker(ScriptIndex(LINES, SCENES), max_sessions=2)
+    tracker.mark("a", 1, 100.0)
+    tracker.mark("b", 4, 100.0)
+    assert tracker.snapshot("a")["cursor"] == 1  # a가 최근 사용 → b가 가장 오래됨
+    tracker.mark("c", 6, 100.0)
+    assert tracker.snapshot("b") is None
+    assert tracker.snapshot("a")["cursor"] == 1 and tracker.snapshot("c")["cursor"] == 6
+    assert tracker.stats()["evicted"] == 1
+    assert tracker.reset("a") and not tracker.reset("a")
+
+
+def test_idle_sessions_expire():
+    tracker = SessionTracker(ScriptIndex(LINES, SCENES), idle_s=60.0)
+    tracker.mark("a", 0, 100.0)
+    tracker.get("a", create=False).last_seen -= 120.0
+    assert tracker.snapshot("a") is None and tracker.stats()["evicted"] == 1
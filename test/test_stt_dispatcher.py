@@ -0,0 +1,195 @@
+# ==============================================
+# test_stt_dispatcher.py — 업스트림 호출 취소 / 캐시 저장 조건
+# ==============================================
+import asyncio
+import gc
+import time
+
+import httpx
+
+from whisper_client import ClientDisconnected, WhisperRequestFailed
+from stt_dispatcher import SttDispatcher
+from stt_cache import SttCache
+
+
+async def _dispatcher(mock_whisper, latency_s: float, batch_size: int = 0, **kwargs):
+    """느린 단일 백엔드 — 업스트림 요청이 끝났는지 / 취소됐는지 기록"""
+    log = {"started": 0, "finished": 0, "cancelled": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        log["started"] += 1
+        try:
+            await asyncio.sleep(latency_s)
+        except asyncio.CancelledError:
+            log["cancelled"] += 1
+            raise
+        log["finished"] += 1
+        if request.url.path.endswith("/stt-batch"):
+            return httpx.Response(200, json={"results": [{"text": "ok"}] * batch_size})
+        return httpx.Response(200, json={"text": "ok"})
+
+    client = mock_whisper(
+        handler, ["http://a.local/stt"], disconnect_poll_s=0.05,
+        batch_path="/stt-batch" if batch_size else None)
+    await client.start()
+    dispatcher = SttDispatcher(client, use_batch=bool(batch_size), **kwargs)
+    await dispatcher.start()
+    return dispatcher, log
+
+
+async def _close(dispatcher):
+    await dispatcher.close()
+    await dispatcher.client.close()
+
+
+def _gone_after(delay_s: float):
+    t0 = time.monotonic()
+
+    async def is_disconnected() -> bool:
+        return time.monotonic() - t0 > delay_s
+    return is_disconnected
+
+
+def test_upstream_cancelled_when_last_waiter_leaves(mock_whisper):
+    async def run():
+        dispatcher, log = await _dispatcher(mock_whisper, latency_s=5.0)
+        t0 = time.monotonic()
+        try:
+            try:
+                await dispatcher.submit("k", b"x", is_disconnected=_gone_after(0.2))
+                raise AssertionError("expected ClientDisconnected")
+            except ClientDisconnected:
+                pass
+            await asyncio.sleep(0.05)
+            assert time.monotonic() - t0 < 1.0
+            assert log == {"started": 1, "finished": 0, "cancelled": 1}, log
+            assert dispatcher.cancelled == 1
+            assert dispatcher.client.backends[0].outstanding == 0
+            assert dispatcher.stats()["in_flight_keys"] == 0
+        finally:
+            await _close(dispatcher)
+
+    asyncio.run(run())
+
+
+def test_upstream_kept_while_a_waiter_remains(mock_whisper):
+    async def run():
+        dispatcher, log = await _dispatcher(mock_whisper, latency_s=0.5)
+        leaving = asyncio.ensure_future(dispatcher.submit("k", b"x", is_disconnected=_gone_after(0.1)))
+        staying = asyncio.ensure_future(dispatcher.submit("k", b"x"))
+        try:
+            result, source = await staying
+            assert result["text"] == "ok"
+            try:
+                await leaving
+                raise AssertionError("expected ClientDisconnected")
+            except ClientDisconnected:
+                pass
+            assert log == {"started": 1, "finished": 1, "cancelled": 0}, log
+        finally:
+            await _close(dispatcher)
+
+    asyncio.run(run())
+
+
+def test_batch_cancelled_only_when_all_jobs_left(mock_whisper):
+    async def run():
+        dispatcher, log = await _dispatcher(mock_whisper, latency_s=0.5, batch_size=2, max_wait_ms=20)
+        leaving = asyncio.ensure_future(dispatcher.submit("a", b"a", is_disconnected=_gone_after(0.1)))
+        staying = asyncio.ensure_future(dispatcher.submit("b", b"b"))
+        try:
+            assert (await staying)[0]["text"] == "ok"
+            try:
+                await leaving
+            except ClientDisconnected:
+                pass
+            assert log == {"started": 1, "finished": 1, "cancelled": 0}, log
+            assert dispatcher.cancelled == 0
+        finally:
+            await _close(dispatcher)
+
+    asyncio.run(run())
+
+
+def _cached_dispatcher(mock_whisper, responses):
+    """응답을 순서대로 돌려주는 백엔드 + 메모리 캐시"""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    client = mock_whisper(handler, ["http://a.local/stt"], failure_threshold=10)
+    return SttDispatcher(client, SttCache(1 << 20)), calls
+
+
+def test_error_and_raw_replies_are_not_cached(mock_whisper):
+    cases = [
+        httpx.Response(429, json={"detail": "busy"}),
+        httpx.Response(400, json={"detail": "bad audio"}),
+        httpx.Response(200, json={"detail": "no text"}),
+        httpx.Response(200, text="plain text"),
+    ]
+    for reply in cases:
+        dispatcher, calls = _cached_dispatcher(mock_whisper, [reply])
+
+        async def run():
+            await dispatcher.client.start()
+            await dispatcher.start()
+            try:
+                for _ in range(2):
+                    try:
+                        result, source = await dispatcher.submit("k", b"x")
+                        assert source == "upstream" and result["stt_s"] is None
+                    except WhisperRequestFailed:
+                        pass
+            finally:
+                await _close(dispatcher)
+
+        asyncio.run(run())
+        assert len(calls) == 2, (reply, calls)  # 두 번째 요청도 업스트림으로
+
+
+def test_json_text_reply_is_cached(mock_whisper):
+    dispatcher, calls = _cached_dispatcher(mock_whisper, [httpx.Response(200, json={"text": "안녕", "elapsed_s": 0.1})])
+
+    async def run():
+        await dispatcher.client.start()
+        await dispatcher.start()
+        try:
+            assert (await dispatcher.submit("k", b"x"))[1] == "upstream"
+            result, source = await dispatcher.submit("k", b"x")
+            assert source == "cache" and result["text"] == "안녕"
+        finally:
+            await _close(dispatcher)
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_failed_call_leaves_no_unretrieved_future(mock_whisper):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(500)
+
+    client = mock_whisper(handler, ["http://a.local/stt"])
+    dispatcher = SttDispatcher(client)
+    unretrieved = []
+
+    async def run():
+        asyncio.get_event_loop().set_exception_handler(lambda loop, ctx: unretrieved.append(ctx["message"]))
+        await client.start()
+        await dispatcher.start()
+        try:
+            for key in ("a", "b"):
+                try:
+                    await dispatcher.submit(key, b"x")
+                    raise AssertionError("expected WhisperRequestFailed")
+                except WhisperRequestFailed:
+                    pass
+        finally:
+            await _close(dispatcher)
+        gc.collect()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert not unretrieved, unretrieved
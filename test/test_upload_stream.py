@@ -0,0 +1,63 @@
+# ==============================================
+# test_upload_stream.py — /stt-proxy 업로드 수신 (스풀 한도 / 업스트림 본문 선택)
+# ==============================================
+import asyncio
+import io
+import struct
+
+from starlette.datastructures import Headers, UploadFile
+
+from upload_stream import SPOOL_MAX_BYTES, FileSlice, WavUploadParser, upload_content
+
+BOUNDARY = "testboundary"
+
+
+def _wav(data_bytes: int) -> bytes:
+    fmt = struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16)
+    return (b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE" + b"fmt " + struct.pack("<I", 16) + fmt
+            + b"data" + struct.pack("<I", data_bytes) + b"\x01\x00" * (data_bytes // 2))
+
+
+async def _parse(body: bytes):
+    """multipart 본문 → (UploadFile, 파서) — 실제 요청과 같은 파서 경로"""
+    payload = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.wav\"\r\n"
+               f"Content-Type: audio/wav\r\n\r\n").encode() + body + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+    async def stream():
+        for i in range(0, len(payload), 64 * 1024):
+            yield payload[i:i + 64 * 1024]
+
+    headers = Headers({"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+    parser = WavUploadParser(headers, stream(), max_bytes=50_000_000)
+    form = await parser.parse()
+    return form["file"], parser
+
+
+def test_small_upload_is_sent_from_memory():
+    async def run():
+        upload, parser = await _parse(_wav(1000))
+        body = await upload_content(upload, parser.size)
+        await upload.close()
+        return body, parser.size
+
+    body, size = asyncio.run(run())
+    assert isinstance(body, bytes) and len(body) == size == 1044
+
+
+def test_upload_over_spool_limit_is_sent_from_fd():
+    async def run():
+        upload, parser = await _parse(_wav(SPOOL_MAX_BYTES + 1000))
+        body = await upload_content(upload, parser.size)
+        data = body.read()
+        await upload.close()
+        return body, data, parser.size
+
+    body, data, size = asyncio.run(run())
+    assert isinstance(body, FileSlice) and len(body) == size
+    assert data[:4] == b"RIFF" and len(data) == size
+
+
+def test_boundary_size_stays_in_memory():
+    f = io.BytesIO(b"x" * SPOOL_MAX_BYTES)  # fileno 없는 파일도 크기만으로 판단
+    body = asyncio.run(upload_content(UploadFile(f, filename="a.wav"), SPOOL_MAX_BYTES))
+    assert body == b"x" * SPOOL_MAX_BYTES
@@ -0,0 +1,116 @@
+# ==============================================
+# test_vad.py — 잡음 바닥 / 발화 구간 분할 / 스트리밍 분할 (합성 신호)
+# ==============================================
+import numpy as np
+import pytest
+
+from vad import (
+    VadConfig, DEFAULT_CONFIG, StreamingVad, frame_rms, frame_size, noise_floor, thresholds, segment_rms,
+)
+
+SR = 16000
+FRAME_S = DEFAULT_CONFIG.frame_s
+
+
+def _noise(seconds: float, level: float, seed: int = 0) -> np.ndarray:
+    return (np.random.default_rng(seed).standard_normal(int(SR * seconds)) * level).astype(np.float32)
+
+
+def _tone(x: np.ndarray, start_s: float, end_s: float, amp: float = 0.1) -> np.ndarray:
+    lo, hi = int(start_s * SR), int(end_s * SR)
+    t = np.arange(hi - lo) / SR
+    x[lo:hi] += (amp * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return x
+
+
+def _segments(x: np.ndarray, cfg: VadConfig = DEFAULT_CONFIG):
+    return segment_rms(frame_rms(x, frame_size(SR, cfg)), FRAME_S, cfg)
+
+
+def _close(a, b, tol: float = 0.06) -> bool:
+    return len(a) == len(b) and all(abs(p - q) <= tol for s, t in zip(a, b) for p, q in zip(s, t))
+
+
+# ---------------------------
+# 프레임 RMS / 바닥 / 임계
+# ---------------------------
+def test_frame_rms_drops_partial_frame():
+    x = np.full(3 * 320 + 100, 0.5, dtype=np.float32)
+    assert np.allclose(frame_rms(x, 320), [0.5, 0.5, 0.5])
+    assert len(frame_rms(x[:100], 320)) == 0
+
+
+def test_noise_floor_follows_noise_level_not_speech():
+    quiet, loud = 0.002, 0.02
+    x = np.concatenate((_noise(12, quiet, 1), _noise(12, loud, 2)))
+    x = _tone(x, 3.0, 8.0)  # 5초 발화가 이어져도 바닥은 잡음 수준 유지
+    floor = noise_floor(frame_rms(x, frame_size(SR)), FRAME_S)
+    at = (lambda s: float(floor[int(s / FRAME_S)]))
+    assert quiet * 0.5 < at(1.0) < quiet * 1.5
+    assert quiet * 0.5 < at(5.5) < quiet * 1.5
+    assert loud * 0.5 < at(22.0) < loud * 1.5
+
+
+def test_thresholds_keep_minimum_on_digital_silence():
+    on, off = thresholds(np.zeros(4, dtype=np.float32))
+    assert np.allclose(on, DEFAULT_CONFIG.min_threshold)
+    assert np.all(off > 0) and np.all(off < on)
+    on, off = thresholds(np.full(1, 0.01, dtype=np.float32))
+    assert on[0] == pytest.approx(0.03) and off[0] == pytest.approx(0.02)
+
+
+# ---------------------------
+# 파일 분할
+# ---------------------------
+@pytest.mark.parametrize("x", [np.zeros(SR * 5, dtype=np.float32), _noise(5, 0.003)], ids=["digital", "noise"])
+def test_silence_yields_no_segments(x):
+    assert _segments(x)["items"] == []
+
+
+def test_tone_bursts_are_padded_segments():
+    x = _tone(_tone(_noise(8, 0.002), 2.0, 3.5), 5.0, 6.0)
+    out = _segments(x)
+    assert _close(out["items"], [(1.9, 3.6), (4.9, 6.1)])
+    assert out["on_threshold"] > out["floor"] > 0
+
+
+def test_short_gaps_bridged_and_clicks_dropped():
+    x = _tone(_tone(_noise(8, 0.002), 1.0, 2.0), 2.2, 3.0)  # 0.2초 틈 → 한 구간
+    x = _tone(x, 6.0, 6.05)                                # 50ms 클릭 → 버림
+    assert _close(_segments(x)["items"], [(0.9, 3.1)])
+
+
+def test_long_speech_is_split_under_max_segment():
+    cfg = VadConfig(max_segment_s=5.0)
+    x = _noise(20, 0.002)
+    for t in np.arange(1.0, 18.0, 0.95):  # 0.15초 숨(min_silence_s 미만)만 있는 17초 발화
+        x = _tone(x, t, min(t + 0.8, 18.0))
+    items = _segments(x, cfg)["items"]
+    assert len(items) >= 4
+    assert all(e - s <= cfg.max_segment_s + 2 * cfg.pad_s + 1e-6 for s, e in items)
+    assert items[0][0] == pytest.approx(0.9, abs=0.06) and items[-1][1] == pytest.approx(18.1, abs=0.06)
+    assert all(a[1] <= b[0] for a, b in zip(items, items[1:]))
+
+
+# ---------------------------
+# 스트리밍
+# ---------------------------
+def test_streaming_matches_offline_and_emits_before_flush():
+    x = _tone(_tone(_tone(_noise(14, 0.002, 3), 2.0, 3.5), 5.0, 6.0), 9.0, 11.0)
+    vad = StreamingVad(SR)
+    early, block = [], SR // 10
+    for i in range(0, len(x), block):
+        early += vad.feed(x[i:i + block])
+    items = early + vad.flush()
+    assert len(early) == 3  # 구간 끝 뒤로 merge_gap_s 넘게 관찰되면 flush 전에 확정
+    assert _close(items, _segments(x)["items"], tol=0.1)
+    assert vad.segments == 3 and vad.horizon_s >= items[-1][1]
+    assert vad.flush() == []
+
+
+def test_streaming_buffer_stays_bounded_on_silence():
+    vad = StreamingVad(SR)
+    x = _noise(30, 0.002, 4)
+    for i in range(0, len(x), SR // 5):
+        assert vad.feed(x[i:i + SR // 5]) == []
+    assert len(vad._rms) * vad.frame_s <= vad.cfg.merge_gap_s + 0.5
@@ -0,0 +1,92 @@
+# ==============================================
+# test_wav_slicer.py — WAV 헤더 파싱/생성, 구간 → 프레임 정렬
+# ==============================================
+import struct
+
+import pytest
+
+from wav_slicer import WavFormatError, WavSource, build_wav_header, parse_wav_header
+
+RATE = 8000
+
+
+def _fmt_chunk(tag: int, channels: int, bits: int, sub_format=None) -> bytes:
+    block = channels * bits // 8
+    body = struct.pack("<HHIIHH", tag, channels, RATE, RATE * block, block, bits)
+    if sub_format is not None:
+        guid_tail = b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+        body += struct.pack("<HHI", 22, bits, 0) + struct.pack("<H", sub_format) + guid_tail
+    return b"fmt " + struct.pack("<I", len(body)) + body
+
+
+def _wav(pcm: bytes, fmt: bytes, extra: bytes = b"", data_size=None) -> bytes:
+    data = b"data" + struct.pack("<I", len(pcm) if data_size is None else data_size) + pcm
+    body = b"WAVE" + fmt + extra + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def _frames(n: int, channels: int = 2) -> bytes:
+    """프레임 i의 채널 c 샘플 = i * 2 + c (16-bit) → 어느 프레임인지 바이트로 확인 가능"""
+    return b"".join(struct.pack("<h", (i * 2 + c) % 32768) for i in range(n) for c in range(channels))
+
+
+@pytest.mark.parametrize("tag, channels, bits", [(1, 1, 16), (1, 2, 16), (1, 2, 24), (3, 1, 32), (1, 1, 8)])
+def test_header_round_trip(tag, channels, bits):
+    info = parse_wav_header(_wav(b"\x00" * 64, _fmt_chunk(tag, channels, bits)))
+    header = build_wav_header(info, 1234)
+    assert len(header) == 44
+    again = parse_wav_header(header + b"\x00" * 1234)
+    for name in ("channels", "sample_rate", "bits_per_sample", "block_align", "format_tag", "sample_format"):
+        assert getattr(again, name) == getattr(info, name), name
+    assert (again.data_offset, again.data_size) == (44, 1234)
+
+
+@pytest.mark.parametrize("sub_format, bits, expected", [(3, 32, 3), (1, 32, 1), (1, 24, 1), (1, 16, 1)])
+def test_extensible_maps_to_sub_format(sub_format, bits, expected):
+    info = parse_wav_header(_wav(b"\x00" * 64, _fmt_chunk(0xFFFE, 2, bits, sub_format)))
+    assert info.format_tag == 0xFFFE and info.sample_format == expected
+    assert parse_wav_header(build_wav_header(info, 0)).format_tag == expected
+
+
+def test_extensible_with_unsupported_sub_format_is_rejected():
+    with pytest.raises(WavFormatError):
+        parse_wav_header(_wav(b"\x00" * 64, _fmt_chunk(0xFFFE, 1, 8, sub_format=6)))  # A-law
+
+
+def test_parse_skips_extra_chunks_and_odd_padding():
+    extra = b"LIST" + struct.pack("<I", 5) + b"INFOx" + b"\x00"  # 홀수 크기 + 패딩 1바이트
+    raw = _wav(_frames(10), _fmt_chunk(1, 2, 16), extra)
+    info = parse_wav_header(raw)
+    assert raw[info.data_offset:info.data_offset + info.data_size] == _frames(10)
+
+
+def test_zero_data_size_means_until_end_of_file():
+    info = parse_wav_header(_wav(_frames(10), _fmt_chunk(1, 2, 16), data_size=0))
+    assert info.data_size == 40 and info.n_frames == 10
+
+
+def test_not_a_wav():
+    with pytest.raises(WavFormatError):
+        parse_wav_header(b"RIFF\x00\x00\x00\x00AVI LIST")
+
+
+def test_slice_aligns_to_frames_and_clamps(tmp_path):
+    n = RATE  # 1초
+    path = tmp_path / "a.wav"
+    path.write_bytes(_wav(_frames(n), _fmt_chunk(1, 2, 16)))
+    src = WavSource(path)
+
+    s = src.slice(0.1234, 0.5)
+    f0, f1 = int(0.1234 * RATE), int(0.5 * RATE)
+    assert s.frames == (f0, f1)
+    assert bytes(s.pcm) == _frames(n)[f0 * 4:f1 * 4]  # 프레임 경계에서 시작 (채널 어긋남 없음)
+    body = s.read()
+    assert len(body) == len(s) == 44 + (f1 - f0) * 4
+    info = parse_wav_header(body)
+    assert info.n_frames == f1 - f0 and body[44:] == bytes(s.pcm)
+    assert s.clone().read() == body  # 복제본은 처음부터
+
+    assert src.slice(0.9, 5.0).frames == (int(0.9 * RATE), n)
+    assert src.slice(-1.0, 0.001).frames == (0, int(0.001 * RATE))
+    empty = src.slice(0.5, 0.2)
+    assert empty.frames[0] == empty.frames[1] and len(empty.pcm) == 0
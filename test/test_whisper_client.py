@@ -0,0 +1,172 @@
+# ==============================================
+# test_whisper_client.py — 다중 백엔드 분산 / 서킷 브레이커 확인
+# ==============================================
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from whisper_client import WhisperStatusError, WhisperUnavailable
+from stt_dispatcher import SttDispatcher
+
+
+def _backends(mock_whisper, latency_s: float = 0.05, fail_hosts=(), **kwargs):
+    """백엔드 3대 (a/b/c.local) — host별 호출 수를 센다. fail_hosts는 500 응답"""
+    hits: Counter = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        hits[request.url.host] += 1
+        await asyncio.sleep(latency_s)
+        if request.url.host in fail_hosts:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"text": request.url.host, "elapsed_s": latency_s})
+
+    return mock_whisper(handler, **kwargs), hits
+
+
+def test_concurrent_requests_are_spread(mock_whisper):
+    client, hits = _backends(mock_whisper)
+
+    async def run():
+        await client.start()
+        try:
+            await asyncio.gather(*[client.transcribe(b"x") for _ in range(6)])
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert sorted(hits.values()) == [2, 2, 2], hits
+    assert all(b.outstanding == 0 for b in client.backends)
+
+
+def test_dispatcher_batch_is_spread(mock_whisper):
+    client, hits = _backends(mock_whisper)
+    dispatcher = SttDispatcher(client, max_batch=8, max_wait_ms=20)
+
+    async def run():
+        await client.start()
+        await dispatcher.start()
+        try:
+            await asyncio.gather(*[dispatcher.submit(f"k{i}", b"x%d" % i) for i in range(6)])
+        finally:
+            await dispatcher.close()
+            await client.close()
+
+    asyncio.run(run())
+    assert dispatcher.batches == 1
+    assert sorted(hits.values()) == [2, 2, 2], hits
+
+
+def test_failure_below_threshold_keeps_circuit_closed(mock_whisper):
+    client, _ = _backends(mock_whisper, failure_threshold=3)
+    backend = client.backends[0]
+    backend.record_failure(client.failure_threshold, client.cooldown_s)
+    assert backend.state(0.0) == "closed"
+    # half-open(1건 제한)이 아니므로 동시에 여러 건 받을 수 있음
+    slots = [client.pick(exclude=client.backends[1:]) for _ in range(3)]
+    assert all(s is not None and s.backend is backend for s in slots)
+    for s in slots:
+        s.release()
+
+
+def test_all_tripped_fails_fast(mock_whisper):
+    client, hits = _backends(mock_whisper, fail_hosts={"a.local", "b.local", "c.local"}, failure_threshold=1, cooldown_s=60)
+
+    async def run():
+        await client.start()
+        try:
+            for _ in range(3):
+                try:
+                    await client.transcribe(b"x")
+                except Exception:
+                    pass
+            assert all(b.state(time.monotonic()) == "open" for b in client.backends)
+            before = sum(hits.values())
+            try:
+                await client.transcribe(b"x")
+                raise AssertionError("expected WhisperUnavailable")
+            except WhisperUnavailable:
+                pass
+            assert sum(hits.values()) == before  # 업스트림 호출 없이 실패
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+def test_load_shedding_trips_circuit_without_latency_sample(mock_whisper):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "a.local":
+            return httpx.Response(429, json={"detail": "busy"})
+        return httpx.Response(200, json={"text": "ok"})
+
+    client = mock_whisper(handler, failure_threshold=2, cooldown_s=60)
+    a = client.backends[0]
+
+    async def run():
+        await client.start()
+        try:
+            for _ in range(2):
+                slot = client.pick(exclude=client.backends[1:])
+                try:
+                    await client._post(slot, b"x", "chunk.wav")
+                    raise AssertionError("expected WhisperStatusError")
+                except WhisperStatusError as e:
+                    assert e.status == 429
+            # 429 → 다른 백엔드로 재시도해서 성공
+            assert (await client.transcribe(b"x"))["text"] == "ok"
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert a.state(time.monotonic()) == "open"
+    assert a.failures == 2 and not a.samples and a.ewma_s is None
+
+
+def _hedging(mock_whisper, slow_host: str = "", **kwargs):
+    """백엔드 2대, 평소 100ms (slow_host만 1초) — p95 표본을 미리 채워 헤지 활성"""
+    hits: Counter = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        hits[request.url.host] += 1
+        await asyncio.sleep(1.0 if request.url.host == slow_host else 0.1)
+        return httpx.Response(200, json={"text": request.url.host})
+
+    client = mock_whisper(handler, ["http://a.local/stt", "http://b.local/stt"], hedge=True, hedge_min_delay_s=0.15, **kwargs)
+    for b in client.backends:
+        b.samples.extend([0.1] * client.hedge_min_samples)
+    return client, hits
+
+
+def test_local_queue_time_does_not_trigger_hedge(mock_whisper):
+    client, hits = _hedging(mock_whisper, max_concurrency=2)
+
+    async def run():
+        await client.start()
+        try:
+            await asyncio.gather(*[client.transcribe(b"x") for _ in range(20)])
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert sum(hits.values()) == 20, hits
+    assert sum(b.hedges for b in client.backends) == 0
+
+
+def test_slow_backend_is_hedged(mock_whisper):
+    client, hits = _hedging(mock_whisper, slow_host="a.local")
+    client.backends[1].outstanding = 1  # 1차는 a.local로
+
+    async def run():
+        await client.start()
+        try:
+            t0 = time.monotonic()
+            result = await client.transcribe(b"x")
+            return result, time.monotonic() - t0
+        finally:
+            await client.close()
+
+    result, elapsed = asyncio.run(run())
+    assert result["text"] == "b.local" and elapsed < 0.6
+    assert client.backends[0].hedges == 1 and client.backends[0].hedge_wins == 1
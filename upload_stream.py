@@ -0,0 +1,230 @@
+# ==============================================
+# upload_stream.py — /stt-proxy 업로드 스트리밍 수신 (메모리 상한 고정)
+# ==============================================
+"""
+upload_stream.py
+----------------
+✅ multipart WAV 업로드를 통째로 메모리에 올리지 않고 청크 단위로 처리
+   - 요청 본문을 읽는 동안 누적 크기 확인 → 한도를 넘는 순간 413 (나머지는 읽지 않음)
+   - 첫 HEAD_BYTES 안에서 RIFF/fmt/data 청크 검증 (44바이트 길이 검사 대체)
+   - sha256(캐시 키)도 청크가 들어올 때 같이 계산 → 다시 읽지 않음
+   - 파일 파트는 Starlette SpooledTemporaryFile에 기록 (1MB 초과 시 디스크로)
+   - 업스트림 전송은 FileSlice(os.pread)로 청크 단위 — 업로드 전체를 bytes로 만들지 않음
+"""
+import hashlib
+import io
+import os
+import struct
+from typing import Optional, Tuple, AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, UploadFile
+from starlette.formparsers import MultiPartParser, MultiPartException
+
+from wav_slicer import parse_wav_header, WavFormatError, WavInfo
+
+# WAV 헤더 검증에 쓰는 앞부분 (LIST/INFO 등 부가 청크 포함해도 충분한 크기)
+HEAD_BYTES = 64 * 1024
+
+# 파일 외 필드 + multipart 경계/헤더 여유분
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# 파일 파트 SpooledTemporaryFile 메모리 한도 (넘으면 디스크) — 파서에 고정해서 upload_content가 크기로 판단
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+class UploadRejected(MultiPartException):
+    """업로드 거부 (status: 400/413/415) — 파서가 임시 파일을 닫고 다시 던진다"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ==============================
+# 업스트림 전송용 file-like
+# ==============================
+class _Fd:
+    """dup한 fd 소유자 (FileSlice 복제본끼리 공유, 마지막 참조가 사라질 때 닫음)"""
+    __slots__ = ("fd",)
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def __del__(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class FileSlice(io.RawIOBase):
+    """
+    임시 파일 [0, size) 구간을 os.pread로 읽는 독립 스트림.
+    fd는 dup해서 보관 → 원본 UploadFile을 닫아도 진행 중인 전송/헤지 요청은 계속 읽을 수 있다.
+    fileno()는 노출하지 않음 (httpx가 seek/tell로 길이를 구하고 청크 단위로 read)
+    """
+
+    def __init__(self, fd: "_Fd", size: int):
+        super().__init__()
+        self._fd = fd
+        self._size = size
+        self._pos = 0
+
+    @classmethod
+    def from_file(cls, f) -> "FileSlice":
+        f.flush()
+        size = os.fstat(f.fileno()).st_size
+        return cls(_Fd(os.dup(f.fileno())), size)
+
+    def __len__(self):
+        return self._size
+
+    def clone(self) -> "FileSlice":
+        """같은 fd를 공유하는 독립 스트림 (재시도/헤지 요청용)"""
+        return FileSlice(self._fd, self._size)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        self._pos = max(0, min(self._size, pos))
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        chunk = os.pread(self._fd.fd, n, self._pos)
+        k = len(chunk)
+        memoryview(b)[:k] = chunk
+        self._pos += k
+        return k
+
+
+# ==============================
+# 수신 파서
+# ==============================
+class WavUploadParser(MultiPartParser):
+    """
+    field 이름의 파일 파트 1개만 받는 multipart 파서.
+    on_part_data(청크 콜백)에서 크기 한도 / 헤더 검증 / 해시를 처리한다.
+    """
+    max_file_size = SPOOL_MAX_BYTES  # Starlette MultiPartParser의 스풀 한도
+
+    def __init__(self, headers: Headers, stream: AsyncIterator[bytes], max_bytes: int, field: str = "file"):
+        super().__init__(headers, stream, max_files=1, max_fields=16)
+        self.field = field
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.info: Optional[WavInfo] = None
+        self._head = bytearray()
+        self._sha = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        part = self._current_part
+        if part.file is not None and part.field_name == self.field:
+            chunk = memoryview(data)[start:end]
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise UploadRejected(413, f"payload too large (> {self.max_bytes} bytes)")
+            self._sha.update(chunk)
+            if self.info is None:
+                self._head += chunk[:max(0, HEAD_BYTES - len(self._head))]
+                self.check_head(final=len(self._head) >= HEAD_BYTES)
+        elif part.file is None and len(part.data) + (end - start) > FORM_OVERHEAD_BYTES:
+            raise UploadRejected(413, "form field too large")
+        super().on_part_data(data, start, end)
+
+    def check_head(self, final: bool):
+        """헤더가 아직 덜 들어왔으면 다음 청크까지 보류, final이면 판정"""
+        if len(self._head) >= 12 and (self._head[0:4] != b"RIFF" or self._head[8:12] != b"WAVE"):
+            raise UploadRejected(400, "invalid wav: not a RIFF/WAVE file")
+        try:
+            self.info = parse_wav_header(self._head)
+        except (WavFormatError, struct.error) as e:
+            if final:
+                msg = str(e) if isinstance(e, WavFormatError) else "truncated header"
+                raise UploadRejected(400, f"invalid wav: {msg}")
+
+    @property
+    def digest(self) -> str:
+        return self._sha.hexdigest()
+
+
+def _limited(stream: AsyncIterator[bytes], limit: int, max_bytes: int) -> AsyncIterator[bytes]:
+    """본문 전체 크기 상한 limit (파일 외 필드/경계 포함, 메시지는 파일 한도 기준)"""
+    async def gen():
+        total = 0
+        async for chunk in stream:
+            total += len(chunk)
+            if total > limit:
+                raise UploadRejected(413, f"payload too large (> {max_bytes} bytes)")
+            yield chunk
+    return gen()
+
+
+async def receive_wav_upload(request, max_bytes: int, field: str = "file") -> Tuple[UploadFile, WavUploadParser]:
+    """
+    multipart 본문을 스트리밍으로 받아 (UploadFile, 파서) 반환.
+    파서에는 size / info(WavInfo) / digest(sha256 hex)가 채워져 있다.
+    실패 시 UploadRejected(status, message)
+    """
+    ctype = request.headers.get("content-type", "")
+    if not ctype.lower().startswith("multipart/form-data"):
+        raise UploadRejected(400, "multipart/form-data required")
+
+    limit = max_bytes + FORM_OVERHEAD_BYTES
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        # 본문을 읽기 전에 거절
+        raise UploadRejected(413, f"payload too large (> {max_bytes} bytes)")
+
+    parser = WavUploadParser(request.headers, _limited(request.stream(), limit, max_bytes), max_bytes, field)
+    try:
+        form = await parser.parse()
+    except UploadRejected:
+        raise
+    except MultiPartException as e:
+        raise UploadRejected(400, e.message)
+
+    upload = form.get(field)
+    if not isinstance(upload, UploadFile):
+        await form.close()
+        raise UploadRejected(400, f"file field '{field}' required")
+    if parser.size == 0:
+        await form.close()
+        raise UploadRejected(400, "empty file")
+    if parser.info is None:
+        # 파일 전체가 HEAD_BYTES보다 짧음 → 받은 만큼으로 최종 판정
+        try:
+            parser.check_head(final=True)
+        except UploadRejected:
+            await form.close()
+            raise
+    return upload, parser
+
+
+async def upload_content(upload: UploadFile, size: int):
+    """
+    업스트림으로 보낼 본문 (size = 파서가 센 파일 파트 바이트 수).
+    스풀 한도 이하(메모리에 남은 작은 업로드)는 bytes, 넘어서 디스크로 간 업로드는 FileSlice
+    """
+    if size <= SPOOL_MAX_BYTES:
+        await upload.seek(0)
+        return await upload.read()
+    return await run_in_threadpool(FileSlice.from_file, upload.file)
@@ -0,0 +1,306 @@
+# ==============================================
+# vad.py — 적응형 잡음 바닥 VAD / 발화 구간 분할 (파일 · 스트리밍)
+# ==============================================
+"""
+vad.py
+------
+✅ 프런트 poll()의 고정 임계값(0.03) + setInterval 청크 분할을 대체하는 서버 측 분할기
+   - 20ms 프레임 RMS를 numpy 벡터 연산으로 판정 (프레임 루프 없음)
+   - 잡음 바닥: floor_window_s 블록마다 하위 percentile → floor_span_s 범위의 최소 → 프레임으로 보간
+     · 발화 임계 = 바닥 × on_factor, 유지 임계 = 바닥 × off_factor (히스테리시스)
+     · 디지털 무음(바닥 ≈ 0)에서도 잡음이 발화로 잡히지 않게 min_threshold 하한
+   - 구간 다듬기: min_silence_s 미만 틈 병합 → min_segment_s 미만 구간은 가까운 이웃과 병합
+     → max_segment_s 초과 구간은 뒤쪽 절반에서 가장 조용한 프레임으로 분할 → min_keep_s 미만(클릭 등)은 버림 → pad_s 여유
+   - StreamingVad: PCM 블록을 넣으면 더 이상 바뀌지 않는 구간만 돌려줌 (버퍼는 max_segment_s 정도로 유지)
+   - 결과 구간은 그대로 STT(/stt-range, 디스패처)로 → Whisper 요청 수는 줄고 길이는 고르게
+"""
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+
+class VadConfig:
+    __slots__ = ("frame_s", "floor_window_s", "floor_span_s", "floor_percentile", "on_factor", "off_factor",
+                 "min_threshold", "min_silence_s", "min_segment_s", "merge_gap_s",
+                 "max_segment_s", "min_keep_s", "pad_s")
+
+    def __init__(
+        self,
+        frame_s: float = 0.02,
+        floor_window_s: float = 1.0,
+        floor_span_s: float = 10.0,   # 바닥은 이 범위 안 블록들의 최소 (긴 발화 중에도 바닥이 올라가지 않게)
+        floor_percentile: float = 10.0,
+        on_factor: float = 3.0,       # 바닥 대비 +9.5dB 이상이면 발화 시작
+        off_factor: float = 2.0,      # +6dB 아래로 내려가면 발화 끝
+        min_threshold: float = 0.004,
+        min_silence_s: float = 0.3,
+        min_segment_s: float = 0.6,
+        merge_gap_s: float = 1.0,
+        max_segment_s: float = 15.0,
+        min_keep_s: float = 0.2,
+        pad_s: float = 0.1,
+    ):
+        self.frame_s = frame_s
+        self.floor_window_s = floor_window_s
+        self.floor_span_s = max(floor_span_s, floor_window_s)
+        self.floor_percentile = floor_percentile
+        self.on_factor = on_factor
+        self.off_factor = off_factor
+        self.min_threshold = min_threshold
+        self.min_silence_s = min_silence_s
+        self.min_segment_s = min_segment_s
+        self.merge_gap_s = max(merge_gap_s, min_silence_s)
+        self.max_segment_s = max_segment_s
+        self.min_keep_s = min_keep_s
+        self.pad_s = pad_s
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+DEFAULT_CONFIG = VadConfig()
+
+
+def frame_size(sample_rate: int, cfg: VadConfig = DEFAULT_CONFIG) -> int:
+    return max(1, int(round(sample_rate * cfg.frame_s)))
+
+
+def frame_rms(x: np.ndarray, frame: int) -> np.ndarray:
+    """float 샘플 → 프레임 RMS (마지막 불완전 프레임은 제외)"""
+    n = len(x) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    w = x[:n * frame].reshape(n, frame)
+    return np.sqrt(np.mean(w * w, axis=1, dtype=np.float64)).astype(np.float32)
+
+
+# ==============================
+# 잡음 바닥 / 임계값
+# ==============================
+def noise_floor(rms: np.ndarray, frame_s: float, cfg: VadConfig = DEFAULT_CONFIG) -> np.ndarray:
+    """
+    블록별 하위 percentile → 앞뒤 floor_span_s/2 안 블록들의 최소 (블록 전체가 발화여도 바닥이 튀지 않게)
+    → 블록 중심 사이를 선형 보간해 프레임별 바닥
+    """
+    n = len(rms)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    fpb = max(1, int(round(cfg.floor_window_s / frame_s)))
+    nb = -(-n // fpb)
+    blocks = np.full(nb * fpb, np.nan, dtype=np.float64)
+    blocks[:n] = rms
+    p = np.nanpercentile(blocks.reshape(nb, fpb), cfg.floor_percentile, axis=1)
+    half = int(round(cfg.floor_span_s / cfg.floor_window_s / 2.0))
+    if nb > 1 and half > 0:
+        padded = np.pad(p, half, mode="edge")
+        p = np.min(np.stack([padded[k:k + nb] for k in range(2 * half + 1)]), axis=0)
+    centers = np.minimum(np.arange(nb) * fpb + fpb / 2.0, n - 1)
+    return np.interp(np.arange(n), centers, p).astype(np.float32)
+
+
+def thresholds(floor, cfg: VadConfig = DEFAULT_CONFIG):
+    """바닥 → (발화 시작 임계, 유지 임계)"""
+    low = cfg.min_threshold * cfg.off_factor / cfg.on_factor
+    return np.maximum(floor * cfg.on_factor, cfg.min_threshold), np.maximum(floor * cfg.off_factor, low)
+
+
+# ==============================
+# 구간 판정 + 다듬기 (프레임 단위)
+# ==============================
+def _detect(rms: np.ndarray, on: np.ndarray, off: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """유지 임계를 넘는 연속 구간 중 발화 시작 임계를 한 번이라도 넘은 것만 (히스테리시스)"""
+    above = rms > off
+    edges = np.diff(np.concatenate(([0], above.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # exclusive
+    hot = np.concatenate(([0], np.cumsum(rms > on)))
+    keep = hot[ends] - hot[starts] > 0
+    return starts[keep], ends[keep]
+
+
+def _bridge(starts: np.ndarray, ends: np.ndarray, gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """gap 프레임 미만의 무음 틈은 이어 붙임"""
+    if len(starts) < 2:
+        return starts, ends
+    keep = np.ones(len(starts), dtype=bool)
+    keep[1:] = starts[1:] - ends[:-1] >= gap
+    return starts[keep], np.append(ends[np.flatnonzero(keep)[1:] - 1], ends[-1])
+
+
+def _merge_short(segs: List[List[int]], min_len: int, max_gap: int, max_len: int) -> List[List[int]]:
+    """min_len 미만 구간을 틈이 더 가까운 이웃과 병합 (합친 길이 max_len 이하, 틈 max_gap 이하)"""
+    i = 0
+    while i < len(segs):
+        s, e = segs[i]
+        if e - s >= min_len:
+            i += 1
+            continue
+        best = None
+        if i > 0 and s - segs[i - 1][1] <= max_gap and e - segs[i - 1][0] <= max_len:
+            best = (s - segs[i - 1][1], i - 1)
+        if i + 1 < len(segs) and segs[i + 1][0] - e <= max_gap and segs[i + 1][1] - s <= max_len:
+            if best is None or segs[i + 1][0] - e < best[0]:
+                best = (segs[i + 1][0] - e, i + 1)
+        if best is None:
+            i += 1
+            continue
+        j = min(i, best[1])
+        segs[j:j + 2] = [[segs[j][0], segs[j + 1][1]]]
+        i = j  # 합친 구간도 아직 짧을 수 있음
+    return segs
+
+
+def _split_long(segs: List[List[int]], rms: np.ndarray, min_len: int, max_len: int) -> List[List[int]]:
+    """max_len 초과 구간은 [max_len/2, max_len] 범위에서 가장 조용한 프레임(5프레임 평균)에서 자름"""
+    out = []
+    kernel = np.ones(5, dtype=np.float32) / 5.0
+    for s, e in segs:
+        while e - s > max_len:
+            lo, hi = s + max(min_len, max_len // 2), min(s + max_len, e - min_len)
+            if hi <= lo:
+                cut = s + max_len
+            else:
+                smooth = np.convolve(rms[lo:hi], kernel, mode="same")
+                cut = lo + int(np.argmin(smooth))
+            out.append([s, cut])
+            s = cut
+        out.append([s, e])
+    return out
+
+
+def segment_frames(
+    rms: np.ndarray, on: np.ndarray, off: np.ndarray, frame_s: float, cfg: VadConfig = DEFAULT_CONFIG
+) -> List[List[int]]:
+    """프레임 RMS + 프레임별 임계 → [[start, end), ...] (프레임 인덱스, pad 전)"""
+    starts, ends = _detect(rms, on, off)
+    if len(starts) == 0:
+        return []
+    starts, ends = _bridge(starts, ends, int(round(cfg.min_silence_s / frame_s)))
+    max_len = int(round(cfg.max_segment_s / frame_s))
+    min_len = int(round(cfg.min_segment_s / frame_s))
+    segs = [[int(s), int(e)] for s, e in zip(starts, ends)]
+    segs = _merge_short(segs, min_len, int(round(cfg.merge_gap_s / frame_s)), max_len)
+    segs = _split_long(segs, rms, min_len, max_len)
+    keep = int(round(cfg.min_keep_s / frame_s))
+    return [seg for seg in segs if seg[1] - seg[0] >= keep]
+
+
+def _padded(segs: List[List[int]], n: int, pad: int, floor_start: int = 0) -> List[Tuple[int, int]]:
+    """앞뒤 pad 프레임 여유 (이웃 구간과 겹치지 않게, [floor_start, n) 안으로)"""
+    out = []
+    prev_end = floor_start
+    for i, (s, e) in enumerate(segs):
+        start = max(s - pad, prev_end)
+        end = min(e + pad, n)
+        if i + 1 < len(segs):
+            end = min(end, max(e, segs[i + 1][0] - pad))
+        out.append((start, end))
+        prev_end = end
+    return out
+
+
+def segment_rms(rms: np.ndarray, frame_s: float, cfg: VadConfig = DEFAULT_CONFIG) -> Dict[str, Any]:
+    """
+    파일 전체의 프레임 RMS → {"items": [(start_s, end_s), ...], "floor", "on_threshold", "off_threshold"}
+    임계값 필드는 프레임별 값의 중앙값 (프런트 입모양 애니메이션용)
+    """
+    floor = noise_floor(rms, frame_s, cfg)
+    on, off = thresholds(floor, cfg)
+    segs = segment_frames(rms, on, off, frame_s, cfg)
+    padded = _padded(segs, len(rms), int(round(cfg.pad_s / frame_s)))
+    median = (lambda a: float(np.median(a)) if len(a) else 0.0)
+    return {
+        "items": [(round(s * frame_s, 3), round(e * frame_s, 3)) for s, e in padded],
+        "floor": round(median(floor), 6),
+        "on_threshold": round(median(on), 6),
+        "off_threshold": round(median(off), 6),
+    }
+
+
+# ==============================
+# 스트리밍
+# ==============================
+class StreamingVad:
+    """
+    PCM(float32, 모노) 블록을 순서대로 feed → 확정된 (start_s, end_s) 구간 목록.
+    - 잡음 바닥은 인과적으로: 최근 floor_span_s 안 완료 블록들 + 진행 중 블록의 percentile 중 최소
+    - 구간 끝 뒤로 merge_gap_s 이상 관찰되면 확정 (그 뒤로는 병합/분할이 바뀌지 않음)
+    - 확정된 구간 앞의 프레임은 버림 → 버퍼는 최대 max_segment_s + merge_gap_s 정도
+    """
+
+    def __init__(self, sample_rate: int, cfg: Optional[VadConfig] = None):
+        self.cfg = cfg or DEFAULT_CONFIG
+        self.sample_rate = int(sample_rate)
+        self.frame = frame_size(self.sample_rate, self.cfg)
+        self.frame_s = self.frame / float(self.sample_rate)
+        self._fpb = max(1, int(round(self.cfg.floor_window_s / self.frame_s)))
+        self._close = int(round(self.cfg.merge_gap_s / self.frame_s))
+        self._pad = int(round(self.cfg.pad_s / self.frame_s))
+
+        self._rest = np.zeros(0, dtype=np.float32)
+        self._block = np.zeros(0, dtype=np.float32)
+        self._floors: "deque[float]" = deque(maxlen=max(1, int(round(self.cfg.floor_span_s / self.cfg.floor_window_s))))
+        self._rms = np.zeros(0, dtype=np.float32)
+        self._on = np.zeros(0, dtype=np.float32)
+        self._off = np.zeros(0, dtype=np.float32)
+        self._base = 0      # 버퍼 첫 프레임의 절대 인덱스
+        self._emitted = 0   # 마지막으로 내보낸 구간 끝(절대 프레임, pad 포함)
+        self.segments = 0
+
+    @property
+    def horizon_s(self) -> float:
+        """앞으로 나올 구간이 이보다 앞에서 시작하지 않음 → 호출 측 오디오 버퍼를 여기까지 버려도 됨"""
+        return max(self._emitted, self._base - self._pad) * self.frame_s
+
+    def _floor(self, rms: np.ndarray) -> float:
+        self._block = np.concatenate((self._block, rms))
+        while len(self._block) >= self._fpb:
+            self._floors.append(float(np.percentile(self._block[:self._fpb], self.cfg.floor_percentile)))
+            self._block = self._block[self._fpb:]
+        cands = list(self._floors)
+        if len(self._block) >= self._fpb // 4 or not cands:
+            cands.append(float(np.percentile(self._block, self.cfg.floor_percentile)) if len(self._block) else 0.0)
+        return min(cands)
+
+    def feed(self, x: np.ndarray) -> List[Tuple[float, float]]:
+        x = np.concatenate((self._rest, np.asarray(x, dtype=np.float32)))
+        n = len(x) // self.frame
+        self._rest = x[n * self.frame:]
+        if n == 0:
+            return []
+        rms = frame_rms(x[:n * self.frame], self.frame)
+        on, off = thresholds(np.float32(self._floor(rms)), self.cfg)
+        self._rms = np.concatenate((self._rms, rms))
+        self._on = np.concatenate((self._on, np.full(n, on, dtype=np.float32)))
+        self._off = np.concatenate((self._off, np.full(n, off, dtype=np.float32)))
+        return self._emit(final=False)
+
+    def flush(self) -> List[Tuple[float, float]]:
+        """스트림 끝: 남은 구간 모두 확정"""
+        out = self._emit(final=True)
+        self._rest = np.zeros(0, dtype=np.float32)
+        return out
+
+    def _emit(self, final: bool) -> List[Tuple[float, float]]:
+        n = len(self._rms)
+        segs = segment_frames(self._rms, self._on, self._off, self.frame_s, self.cfg)
+        # 구간 끝은 오름차순 → 확정 구간은 항상 앞쪽부터
+        done = segs if final else [seg for seg in segs if seg[1] + self._close <= n]
+        out = []
+        for s, e in _padded(segs, n, self._pad, self._emitted - self._base)[:len(done)]:
+            out.append((round((self._base + s) * self.frame_s, 3), round((self._base + e) * self.frame_s, 3)))
+            self._emitted = self._base + e
+        self.segments += len(out)
+
+        if final:
+            cut = n
+        elif done:
+            cut = done[-1][1]
+        else:
+            # 앞쪽 무음은 pad 여유(merge_gap_s)만 남기고 버림
+            cut = max(0, (segs[0][0] if segs else n) - self._close)
+        if cut:
+            self._rms, self._on, self._off = self._rms[cut:], self._on[cut:], self._off[cut:]
+            self._base += cut
+        return out
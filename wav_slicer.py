@@ -0,0 +1,241 @@
+# ==============================================
+# wav_slicer.py — 서버 측 WAV 구간 잘라내기 (mmap)
+# ==============================================
+"""
+wav_slicer.py
+-------------
+✅ 서버에 이미 있는 AUDIO_FILE에서 [start, end] 초 구간의 PCM 프레임을 직접 잘라냄
+   - WAV 헤더(RIFF 청크)는 파일당 1회 파싱 후 캐시 (mtime/size 바뀌면 재파싱)
+   - 파일은 mmap으로 열어두고 memoryview 슬라이스만 사용 (추가 복사 없음)
+   - 결과는 44바이트 헤더 + PCM 슬라이스를 순서대로 읽어주는 file-like 객체
+"""
+import io
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Tuple, Optional
+
+
+class WavFormatError(ValueError):
+    """지원하지 않거나 깨진 WAV"""
+
+
+# ==============================
+# 헤더 파싱
+# ==============================
+class WavInfo:
+    __slots__ = ("channels", "sample_rate", "bits_per_sample", "block_align",
+                 "format_tag", "data_offset", "data_size", "sub_format")
+
+    def __init__(self, channels, sample_rate, bits_per_sample, block_align, format_tag, data_offset, data_size,
+                 sub_format: Optional[int] = None):
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.block_align = block_align
+        self.format_tag = format_tag
+        self.data_offset = data_offset
+        self.data_size = data_size
+        self.sub_format = sub_format  # EXTENSIBLE의 SubFormat GUID 앞 2바이트 (1 = PCM, 3 = float)
+
+    @property
+    def sample_format(self) -> int:
+        """실제 샘플 형식: 1 = 정수 PCM, 3 = IEEE float (EXTENSIBLE이면 SubFormat 기준)"""
+        if self.format_tag == 0xFFFE:
+            return self.sub_format if self.sub_format in (1, 3) else 1
+        return self.format_tag
+
+    @property
+    def byte_rate(self) -> int:
+        return self.sample_rate * self.block_align
+
+    @property
+    def n_frames(self) -> int:
+        return self.data_size // self.block_align
+
+    @property
+    def duration(self) -> float:
+        return self.n_frames / float(self.sample_rate)
+
+
+def parse_wav_header(buf) -> WavInfo:
+    """
+    RIFF 청크를 순회하며 fmt / data 위치를 찾는다.
+    (LIST/INFO 등 부가 청크가 있어도 동작 — 44바이트 고정 헤더 가정 X)
+    """
+    total = len(buf)
+    if total < 12 or bytes(buf[0:4]) != b"RIFF" or bytes(buf[8:12]) != b"WAVE":
+        raise WavFormatError("not a RIFF/WAVE file")
+
+    fmt = None
+    sub_format: Optional[int] = None
+    pos = 12
+    while pos + 8 <= total:
+        cid = bytes(buf[pos:pos + 4])
+        csize = struct.unpack_from("<I", buf, pos + 4)[0]
+        body = pos + 8
+        if cid == b"fmt ":
+            if csize < 16:
+                raise WavFormatError("fmt chunk too short")
+            fmt = struct.unpack_from("<HHIIHH", buf, body)
+            # EXTENSIBLE: cbSize(2) + validBits(2) + channelMask(4) 뒤 SubFormat GUID
+            if fmt[0] == 0xFFFE and csize >= 40 and body + 26 <= total:
+                sub_format = struct.unpack_from("<H", buf, body + 24)[0]
+        elif cid == b"data":
+            if fmt is None:
+                raise WavFormatError("data chunk before fmt chunk")
+            format_tag, channels, sample_rate, _byte_rate, block_align, bits = fmt
+            # 1 = PCM, 3 = IEEE float, 0xFFFE = EXTENSIBLE
+            if format_tag not in (1, 3, 0xFFFE) or block_align <= 0 or sample_rate <= 0:
+                raise WavFormatError(f"unsupported wav format (tag={format_tag})")
+            if format_tag == 0xFFFE and sub_format not in (None, 1, 3):
+                raise WavFormatError(f"unsupported wav sub format ({sub_format})")
+            # 스트리밍 녹음 등으로 data 크기가 0/과대 기록된 경우 → 파일 끝까지
+            data_size = min(csize, total - body) if csize else total - body
+            return WavInfo(channels, sample_rate, bits, block_align, format_tag, body, data_size, sub_format)
+        # 청크는 2바이트 정렬
+        pos = body + csize + (csize & 1)
+
+    raise WavFormatError("data chunk not found")
+
+
+def build_wav_header(info: WavInfo, data_size: int) -> bytes:
+    """표준 44바이트 PCM/float 헤더 (원본 fmt 파라미터 유지, EXTENSIBLE은 SubFormat에 맞춰 1/3)"""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, info.sample_format, info.channels, info.sample_rate,
+        info.byte_rate, info.block_align, info.bits_per_sample,
+        b"data", data_size,
+    )
+
+
+# ==============================
+# 구간 슬라이스 (file-like)
+# ==============================
+class WavSlice(io.RawIOBase):
+    """
+    [헤더 bytes] + [mmap memoryview 슬라이스]를 하나의 읽기 전용 스트림으로 노출.
+    httpx multipart가 청크 단위로 read() 하므로 전체 구간을 한 번에 복사하지 않는다.
+    """
+
+    def __init__(self, header: bytes, pcm: memoryview, frames: Tuple[int, int] = (0, 0), version: Tuple[int, int] = (0, 0)):
+        super().__init__()
+        # frames: 원본 기준 [시작, 끝) 프레임, version: 원본 (mtime_ns, size) — 캐시 키용
+        self.frames = frames
+        self.version = version
+        self._header = header
+        self._pcm = pcm
+        self._hlen = len(header)
+        self._size = self._hlen + len(pcm)
+        self._pos = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def pcm(self) -> memoryview:
+        return self._pcm
+
+    def clone(self) -> "WavSlice":
+        """같은 버퍼를 공유하는 독립 스트림 (재시도/헤지 요청용)"""
+        return WavSlice(self._header, self._pcm, self.frames, self.version)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        self._pos = max(0, min(self._size, pos))
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        out = memoryview(b)
+        written = 0
+        if self._pos < self._hlen:
+            h = min(n, self._hlen - self._pos)
+            out[:h] = self._header[self._pos:self._pos + h]
+            written = h
+        if written < n:
+            p = self._pos + written - self._hlen
+            k = n - written
+            out[written:n] = self._pcm[p:p + k]
+        self._pos += n
+        return n
+
+
+# ==============================
+# mmap 소스 (헤더 캐시)
+# ==============================
+class WavSource:
+    """
+    경로별로 mmap + WavInfo를 보관. mtime/size가 바뀌면 다시 연다.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple[int, int]] = None
+        self._fh = None
+        self._mm: Optional[mmap.mmap] = None
+        self._info: Optional[WavInfo] = None
+
+    def _open(self) -> Tuple[mmap.mmap, WavInfo, Tuple[int, int]]:
+        st = self.path.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if self._key != key or self._mm is None:
+                fh = self.path.open("rb")
+                try:
+                    mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                    info = parse_wav_header(mm)
+                except Exception:
+                    fh.close()
+                    raise
+                # 이전 mmap은 진행 중인 슬라이스가 참조할 수 있으므로 GC에 맡김
+                self._fh, self._mm, self._info, self._key = fh, mm, info, key
+            return self._mm, self._info, self._key
+
+    def info(self) -> WavInfo:
+        return self._open()[1]
+
+    def slice(self, start_s: float, end_s: float) -> WavSlice:
+        """초 단위 구간 → WavSlice (프레임 경계로 정렬, 파일 길이로 클램프)"""
+        mm, info, version = self._open()
+        n_frames = info.n_frames
+        f0 = max(0, min(n_frames, int(start_s * info.sample_rate)))
+        f1 = max(f0, min(n_frames, int(end_s * info.sample_rate)))
+        b0 = info.data_offset + f0 * info.block_align
+        b1 = info.data_offset + f1 * info.block_align
+        pcm = memoryview(mm)[b0:b1]
+        return WavSlice(build_wav_header(info, b1 - b0), pcm, (f0, f1), version)
+
+
+_SOURCES: Dict[str, WavSource] = {}
+_SOURCES_LOCK = threading.Lock()
+
+
+def get_wav_source(path: Path) -> WavSource:
+    key = str(Path(path).resolve())
+    with _SOURCES_LOCK:
+        src = _SOURCES.get(key)
+        if src is None:
+            src = _SOURCES[key] = WavSource(Path(key))
+        return src
@@ -0,0 +1,523 @@
+# ==============================================
+# whisper_client.py — 비동기 Whisper HTTP 클라이언트 (다중 백엔드)
+# ==============================================
+"""
+whisper_client.py
+-----------------
+✅ 이벤트 루프를 막지 않는 Whisper HTTP 호출
+   - 앱 기동 시 1회 생성되는 keep-alive 커넥션 풀 (httpx.AsyncClient)
+   - 동시 업스트림 호출 수 제한 (asyncio.Semaphore)
+   - 요청별 데드라인 (대기열 대기 시간 포함)
+   - 브라우저 연결 끊김 감지 시 업스트림 호출 취소
+✅ 다중 STT 백엔드
+   - 분산 정책: least_outstanding (진행 중 요청 최소) / latency (진행 중 × 지연 EWMA 최소)
+     · 백엔드는 pick() 시점에 자리를 예약 (진행 중 수 +1) → 동시에 들어온 요청도 고르게 분산
+   - 백그라운드 헬스 체크 + 서킷 브레이커 (연속 실패 → 일정 시간 제외 → half-open 1건 시험)
+     · 모든 백엔드가 제외 상태면 바로 WhisperUnavailable (제외 시간이 끝날 때까지 빠르게 실패)
+   - 2xx가 아닌 응답(429/503 부하 차단 포함)은 서킷 실패로 집계, 지연 통계에서는 제외
+   - 헤지 요청(선택): 전송 후 최근 p95 지연이 지나도 응답이 없으면 다른 백엔드로 한 번 더, 먼저 온 결과 사용
+     (로컬 동시성 한도 대기 시간은 제외, 한도가 꽉 찼으면 헤지하지 않음)
+   - 연결 실패/429/5xx 시 다른 백엔드로 즉시 1회 재시도
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Sequence, Tuple
+from urllib.parse import urljoin
+
+import httpx
+
+
+# ==============================
+# 예외
+# ==============================
+class WhisperError(Exception):
+    """Whisper 호출 실패 공통 예외"""
+
+
+class WhisperTimeout(WhisperError):
+    """데드라인 초과"""
+
+
+class WhisperRequestFailed(WhisperError):
+    """연결 실패 / 프로토콜 오류 등"""
+
+
+class WhisperStatusError(WhisperRequestFailed):
+    """업스트림이 2xx가 아닌 상태코드로 응답 (429 과부하 / 4xx / 5xx)"""
+
+    def __init__(self, status: int):
+        super().__init__(f"upstream status {status}")
+        self.status = status
+
+
+class WhisperUnavailable(WhisperRequestFailed):
+    """사용 가능한 백엔드 없음 (전부 서킷 open / 헬스 체크 실패) → 503"""
+
+
+class ClientDisconnected(WhisperError):
+    """브라우저가 응답을 기다리지 않고 연결을 끊음"""
+
+
+async def watch_disconnect(is_disconnected: Callable[[], Awaitable[bool]], poll_s: float = 0.5):
+    """is_disconnected()가 True가 될 때까지 주기적으로 확인 (끊기면 반환)"""
+    while True:
+        if await is_disconnected():
+            return
+        await asyncio.sleep(poll_s)
+
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """
+    2xx JSON 응답의 text 필드에서 나온 결과인지 (캐시 저장 대상).
+    JSON이 아닌 2xx 응답은 원문을 그대로 돌려주지만 stt_s가 None → 캐시하지 않음
+    """
+    return result.get("stt_s") is not None and isinstance(result.get("text"), str)
+
+
+def _fresh(content):
+    """헤지/재시도용 독립 스트림 (WavSlice 등 file-like는 위치를 공유하지 않도록 복제)"""
+    clone = getattr(content, "clone", None)
+    return clone() if callable(clone) else content
+
+
+# ==============================
+# 백엔드 상태
+# ==============================
+class WhisperBackend:
+    """STT 서버 1대의 상태: 진행 중 요청 수, 지연 통계, 서킷 브레이커"""
+
+    def __init__(self, url: str, batch_path: Optional[str] = None, health_path: Optional[str] = None):
+        self.url = url
+        self.batch_url = urljoin(url, batch_path) if batch_path else None
+        self.health_url = urljoin(url, health_path) if health_path else url
+
+        self.outstanding = 0
+        self.ewma_s: Optional[float] = None
+        self.samples: "deque[float]" = deque(maxlen=200)
+
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.tripped = False           # 연속 실패가 임계값에 도달 (성공 1건이면 해제)
+        self.open_until = 0.0          # 서킷 open 만료 시각 (monotonic)
+        self.half_open_busy = False    # half-open 상태에서 시험 요청 진행 중
+
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # ---------------------------
+    # 서킷
+    # ---------------------------
+    def state(self, now: float) -> str:
+        if not self.tripped:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def available(self, now: float) -> bool:
+        if not self.healthy:
+            return False
+        st = self.state(now)
+        if st == "open":
+            return False
+        if st == "half_open" and self.half_open_busy:
+            return False
+        return True
+
+    def record_success(self, wall_s: float):
+        self.samples.append(wall_s)
+        self.ewma_s = wall_s if self.ewma_s is None else 0.8 * self.ewma_s + 0.2 * wall_s
+        self.consecutive_failures = 0
+        self.tripped = False
+        self.open_until = 0.0
+        self.healthy = True
+
+    def record_failure(self, threshold: int, cooldown_s: float):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= threshold:
+            self.tripped = True
+            # 연속 실패가 길어질수록 제외 시간 증가 (최대 8배)
+            factor = min(8, 2 ** (self.consecutive_failures - threshold))
+            self.open_until = time.monotonic() + cooldown_s * factor
+
+    def reserve(self, now: float) -> "_Slot":
+        """선택 즉시 자리 예약 (half-open이면 시험 요청 자리)"""
+        trial = self.state(now) == "half_open"
+        if trial:
+            self.half_open_busy = True
+        self.outstanding += 1
+        return _Slot(self, trial)
+
+    # ---------------------------
+    # 지연 통계
+    # ---------------------------
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        data = sorted(self.samples)
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def load_score(self, policy: str) -> float:
+        if policy == "latency":
+            return (self.outstanding + 1) * (self.ewma_s if self.ewma_s is not None else 0.0)
+        return float(self.outstanding)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.percentile(0.95)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "circuit": self.state(time.monotonic()),
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma_s * 1000.0, 1) if self.ewma_s is not None else None,
+            "p95_ms": round(p95 * 1000.0, 1) if p95 is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class _Slot:
+    """pick()이 잡아 둔 백엔드 자리 1개. release()는 여러 번 불러도 1회만 반영"""
+    __slots__ = ("backend", "trial", "released", "sent_at")
+
+    def __init__(self, backend: WhisperBackend, trial: bool):
+        self.backend = backend
+        self.trial = trial
+        self.released = False
+        self.sent_at: Optional[float] = None  # 로컬 세마포어 통과 시각 (monotonic) — 헤지 시계 기준
+
+    def release(self, *_):
+        if self.released:
+            return
+        self.released = True
+        self.backend.outstanding -= 1
+        if self.trial:
+            self.backend.half_open_busy = False
+
+
+# ==============================
+# 클라이언트
+# ==============================
+class WhisperClient:
+    """
+    공유 커넥션 풀 기반 Whisper HTTP 클라이언트.
+    start()/close()는 FastAPI lifespan에서 호출한다.
+    """
+
+    def __init__(
+        self,
+        urls,
+        timeout: float = 90.0,
+        max_concurrency: int = 8,
+        pool_size: int = 16,
+        disconnect_poll_s: float = 0.5,
+        policy: str = "least_outstanding",
+        batch_path: Optional[str] = None,
+        health_path: Optional[str] = None,
+        health_interval_s: float = 5.0,
+        failure_threshold: int = 3,
+        cooldown_s: float = 10.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        hedge_min_delay_s: float = 0.2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if isinstance(urls, str):
+            urls = [urls]
+        urls = [u.strip() for u in urls if u and u.strip()]
+        if not urls:
+            raise ValueError("at least one Whisper URL is required")
+        self.backends: List[WhisperBackend] = [WhisperBackend(u, batch_path, health_path) for u in urls]
+        self.url = urls[0]
+
+        self.timeout = float(timeout)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.pool_size = max(self.max_concurrency, int(pool_size))
+        self.disconnect_poll_s = disconnect_poll_s
+
+        self.policy = policy if policy in ("least_outstanding", "latency") else "least_outstanding"
+        self.health_interval_s = float(health_interval_s)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_s = float(cooldown_s)
+        self.hedge = bool(hedge) and len(self.backends) > 1
+        self.hedge_min_samples = int(hedge_min_samples)
+        self.hedge_min_delay_s = float(hedge_min_delay_s)
+
+        self.transport = transport  # 테스트/사이드카용 (None이면 기본 HTTP 전송)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._health_task: Optional["asyncio.Task"] = None
+        self.in_flight = 0
+
+    @property
+    def supports_batch(self) -> bool:
+        return all(b.batch_url for b in self.backends)
+
+    # ---------------------------
+    # 수명 주기
+    # ---------------------------
+    async def start(self):
+        if self._client is not None:
+            return
+        # Semaphore는 실행 중인 루프 안에서 생성해야 함 (py3.8 호환)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+            transport=self.transport,
+        )
+        if self.health_interval_s > 0:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------------------------
+    # 헬스 체크
+    # ---------------------------
+    async def _probe(self, backend: WhisperBackend):
+        try:
+            resp = await self._client.get(backend.health_url, timeout=min(5.0, self.timeout))
+            ok = resp.status_code < 500  # GET /stt → 405도 "살아 있음"
+        except httpx.HTTPError:
+            ok = False
+        backend.healthy = ok
+        if ok and backend.state(time.monotonic()) == "open":
+            backend.open_until = 0.0  # 조기 half-open: 다음 실제 요청 1건으로 확인
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*[self._probe(b) for b in self.backends], return_exceptions=True)
+            await asyncio.sleep(self.health_interval_s)
+
+    # ---------------------------
+    # 백엔드 선택
+    # ---------------------------
+    def pick(self, exclude: Sequence[WhisperBackend] = ()) -> Optional[_Slot]:
+        """
+        부하가 가장 낮은 사용 가능 백엔드를 골라 자리를 예약 (없으면 None).
+        예약은 _send가 끝날 때(또는 시작 전에 취소된 작업의 done 콜백에서) 해제
+        """
+        now = time.monotonic()
+        cands = [b for b in self.backends if b not in exclude and b.available(now)]
+        if not cands:
+            return None
+        return min(cands, key=lambda b: b.load_score(self.policy)).reserve(now)
+
+    def _launch(self, slot: _Slot, content, filename: str) -> "asyncio.Future":
+        task = asyncio.ensure_future(self._post(slot, content, filename))
+        task.add_done_callback(slot.release)  # 시작 전에 취소돼도 자리 반환
+        return task
+
+    def hedge_delay(self, backend: WhisperBackend) -> Optional[float]:
+        if not self.hedge or len(backend.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay_s, backend.percentile(0.95))
+
+    # ---------------------------
+    # 호출
+    # ---------------------------
+    @staticmethod
+    def _parse_result(payload, wall: float) -> Dict[str, Any]:
+        if not isinstance(payload, dict) or not isinstance(payload.get("text"), str):
+            raise WhisperRequestFailed("upstream response without text")
+        stt_time = payload.get("elapsed_s")
+        if stt_time is None:
+            stt_time = round(wall, 3)
+        return {"text": payload["text"], "stt_s": float(stt_time)}
+
+    async def _send(self, slot: _Slot, url: str, files) -> Tuple[httpx.Response, float]:
+        assert self._client is not None and self._sem is not None, "WhisperClient.start() 호출 필요"
+        backend = slot.backend
+        try:
+            async with self._sem:
+                self.in_flight += 1
+                backend.requests += 1
+                try:
+                    t0 = time.time()
+                    slot.sent_at = time.monotonic()
+                    try:
+                        resp = await self._client.post(url, files=files)
+                        # 429/503(부하 차단) 포함 2xx가 아니면 서킷 실패 — 지연 EWMA/p95에는 넣지 않음
+                        if not 200 <= resp.status_code < 300:
+                            raise WhisperStatusError(resp.status_code)
+                    except (httpx.HTTPError, WhisperRequestFailed):
+                        backend.record_failure(self.failure_threshold, self.cooldown_s)
+                        raise
+                    wall = time.time() - t0
+                    backend.record_success(wall)
+                    return resp, wall
+                finally:
+                    self.in_flight -= 1
+        finally:
+            slot.release()
+
+    async def _post(self, slot: _Slot, content, filename: str) -> Dict[str, Any]:
+        resp, wall = await self._send(slot, slot.backend.url, {"file": (filename, content, "audio/wav")})
+        try:
+            payload = resp.json()
+        except ValueError:
+            # JSON이 아닌 응답은 원문 텍스트 그대로 (stt_s 없음)
+            return {"text": resp.text, "stt_s": None}
+        return self._parse_result(payload, wall)
+
+    async def _post_with_failover(self, content, filename: str) -> Dict[str, Any]:
+        """
+        1차 백엔드로 전송. 연결 실패/429/5xx면 다른 백엔드로 즉시 재시도,
+        헤지 지연(p95)이 지나도 응답이 없으면 다른 백엔드로 중복 전송 → 먼저 성공한 결과 사용.
+        헤지 시계는 로컬 세마포어를 통과한 시점부터 (대기열 시간은 백엔드 지연이 아님),
+        세마포어가 꽉 차 있으면 헤지하지 않음 (중복 전송이 대기열만 늘림)
+        """
+        slot = self.pick()
+        if slot is None:
+            raise WhisperUnavailable("no whisper backend available")
+        primary = slot.backend
+        attempts = {self._launch(slot, content, filename): primary}
+        hedge_after = self.hedge_delay(primary)
+        wait_s = hedge_after
+        hedged = False
+        retried = False
+        last_error: Optional[BaseException] = None
+
+        try:
+            while attempts:
+                done, _ = await asyncio.wait(
+                    set(attempts), timeout=None if hedged else wait_s, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    sent_at = slot.sent_at
+                    if sent_at is None:
+                        continue  # 아직 로컬 대기열 — 전송 후부터 다시 잼
+                    remain = sent_at + hedge_after - time.monotonic()
+                    if remain > 0:
+                        wait_s = remain
+                        continue
+                    # 전송 후 p95 초과 → 헤지 (1회)
+                    hedged = True
+                    if self._sem.locked():
+                        continue
+                    alt = self.pick(exclude=list(attempts.values()))
+                    if alt is not None:
+                        primary.hedges += 1
+                        attempts[self._launch(alt, _fresh(content), filename)] = alt.backend
+                    continue
+
+                for t in done:
+                    backend = attempts.pop(t)
+                    if t.exception() is None:
+                        if backend is not primary:
+                            primary.hedge_wins += 1
+                        return t.result()
+                    last_error = t.exception()
+
+                # 연결 실패/429/5xx (타임아웃, 429 외 4xx 제외)면 다른 백엔드로 1회 재시도
+                retryable = isinstance(last_error, (httpx.HTTPError, WhisperRequestFailed)) \
+                    and not isinstance(last_error, httpx.TimeoutException) \
+                    and not (isinstance(last_error, WhisperStatusError)
+                             and 400 <= last_error.status < 500 and last_error.status != 429)
+                if not attempts and not retried and retryable:
+                    retried = True
+                    alt = self.pick(exclude=[primary])
+                    if alt is not None:
+                        attempts[self._launch(alt, _fresh(content), filename)] = alt.backend
+        finally:
+            for t in attempts:
+                t.cancel()
+
+        raise last_error if last_error is not None else WhisperRequestFailed("no result")
+
+    async def _post_batch(self, contents: List[Any]) -> List[Dict[str, Any]]:
+        """
+        배치 엔드포인트: multipart "files" 여러 개 → {"results": [{"text", "elapsed_s"}, ...]} (입력 순서)
+        """
+        slot = self.pick()
+        if slot is None:
+            raise WhisperUnavailable("no whisper batch backend available")
+        if not slot.backend.batch_url:
+            slot.release()
+            raise WhisperRequestFailed("no whisper batch backend available")
+        files = [("files", (f"chunk{i}.wav", c, "audio/wav")) for i, c in enumerate(contents)]
+        resp, wall = await self._send(slot, slot.backend.batch_url, files)
+        try:
+            results = resp.json().get("results")
+        except (ValueError, AttributeError):
+            results = None
+        if not isinstance(results, list) or len(results) != len(contents):
+            raise WhisperRequestFailed(f"invalid batch response (status {resp.status_code})")
+        # elapsed_s가 없으면 배치 전체 시간을 균등 분배 (text 없는 항목이 있으면 배치 전체 실패)
+        return [self._parse_result(r, wall / len(contents)) for r in results]
+
+    async def transcribe_batch(self, contents: List[Any], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """여러 청크를 한 번의 배치 요청으로 전사 (데드라인 = timeout 또는 self.timeout)"""
+        deadline = self.timeout if timeout is None else float(timeout)
+        try:
+            return await asyncio.wait_for(self._post_batch(contents), timeout=deadline)
+        except asyncio.TimeoutError as e:
+            raise WhisperTimeout("whisper_http_timeout") from e
+        except httpx.TimeoutException as e:
+            raise WhisperTimeout("whisper_http_timeout") from e
+        except httpx.HTTPError as e:
+            raise WhisperRequestFailed(str(e)) from e
+
+    async def transcribe(
+        self,
+        content,
+        filename: str = "chunk.wav",
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        WAV 바이트를 Whisper로 전달하고 {"text", "stt_s"} 반환.
+        - timeout: 대기열 + 업스트림 전체에 적용되는 데드라인 (기본 self.timeout)
+        - is_disconnected: Request.is_disconnected 등 → True가 되면 호출 취소
+        """
+        deadline = self.timeout if timeout is None else float(timeout)
+        task = asyncio.ensure_future(self._post_with_failover(content, filename))
+        watcher = None
+        if is_disconnected is not None:
+            watcher = asyncio.ensure_future(watch_disconnect(is_disconnected, self.disconnect_poll_s))
+
+        try:
+            waiters = {task} if watcher is None else {task, watcher}
+            done, _ = await asyncio.wait(waiters, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+
+            if task in done:
+                return task.result()
+            if watcher is not None and watcher in done:
+                raise ClientDisconnected("client disconnected")
+            raise WhisperTimeout("whisper_http_timeout")
+
+        except httpx.TimeoutException as e:
+            raise WhisperTimeout("whisper_http_timeout") from e
+        except httpx.HTTPError as e:
+            raise WhisperRequestFailed(str(e)) from e
+        finally:
+            for t in (task, watcher):
+                if t is not None and not t.done():
+                    t.cancel()
+
+    # ---------------------------
+    # 상태
+    # ---------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "pool_size": self.pool_size,
+            "policy": self.policy,
+            "hedge": self.hedge,
+            "backends": [b.stats() for b in self.backends],
+        }